@@ -2,11 +2,30 @@ from django.contrib import admin
 from django.shortcuts import render, redirect
 from django.urls import path
 from django.contrib import messages
-from .models import License, Document
+from .models import License, LicensePolygon, Document, ImportRun, LicenseOverlap
+from .archives import archive_errors, is_archive, load_archive
+from .profiling import ImportProfile, stage
+from .snapshots import schedule_snapshot
 from .utils import GeoJSONImporter
+from . import perf
 import json
 
 
+class LicensePolygonInline(admin.TabularInline):
+    model = LicensePolygon
+    fields = ['position', 'area_km2', 'min_lon', 'min_lat', 'max_lon', 'max_lat', 'content_hash']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def get_queryset(self, request):
+        # Координаты в таблице не показываются - не читаем их из базы
+        return super().get_queryset(request).defer('coordinates')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(License)
 class LicenseAdmin(admin.ModelAdmin):
     list_display = ['license_number', 'owner', 'license_type', 'region', 'status', 'issue_date']
@@ -14,13 +33,15 @@ class LicenseAdmin(admin.ModelAdmin):
     search_fields = ['license_number', 'owner', 'region', 'mineral_type']
     date_hierarchy = 'issue_date'
     ordering = ['-created_at']
+    readonly_fields = ['area_km2']
+    inlines = [LicensePolygonInline]
     
     fieldsets = (
         ('Основная информация', {
             'fields': ('license_number', 'license_type', 'owner', 'status')
         }),
         ('Территория', {
-            'fields': ('region', 'area', 'latitude', 'longitude')
+            'fields': ('region', 'area', 'area_km2', 'latitude', 'longitude')
         }),
         ('Даты', {
             'fields': ('issue_date', 'expiry_date')
@@ -30,10 +51,25 @@ class LicenseAdmin(admin.ModelAdmin):
         }),
     )
     
+    # Снимок реестра для веб-сервера пересобирается после изменений (licenses.snapshots)
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        schedule_snapshot()
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        schedule_snapshot()
+    
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        schedule_snapshot()
+    
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
             path('import-geojson/', self.admin_site.admin_view(self.import_geojson_view), name='licenses_import_geojson'),
+            path('perf-report/', self.admin_site.admin_view(self.perf_report_view), name='licenses_perf_report'),
+            path('map-benchmark/', self.admin_site.admin_view(self.map_benchmark_view), name='licenses_map_benchmark'),
         ]
         return custom_urls + urls
     
@@ -45,20 +81,51 @@ class LicenseAdmin(admin.ModelAdmin):
             
             geojson_file = request.FILES['geojson_file']
             
-            if not geojson_file.name.endswith('.geojson') and not geojson_file.name.endswith('.json'):
-                messages.error(request, 'Неверный формат файла. Поддерживаются только .geojson и .json')
+            if (not geojson_file.name.endswith('.geojson') and not geojson_file.name.endswith('.json')
+                    and not is_archive(geojson_file.name)):
+                messages.error(request, 'Неверный формат файла. Поддерживаются только .geojson, .json и .zip')
                 return redirect('..')
             
+            profile = ImportProfile() if request.POST.get('profile') else None
             try:
-                file_content = geojson_file.read().decode('utf-8')
-                importer = GeoJSONImporter()
+                members = []
+                if profile is not None:
+                    profile.start()
+                with stage(profile, 'read'):
+                    if is_archive(geojson_file.name):
+                        file_content, members = load_archive(geojson_file)
+                    else:
+                        file_content = geojson_file.read().decode('utf-8')
+                importer = GeoJSONImporter(check_overlaps=bool(request.POST.get('check_overlaps')), profile=profile)
                 result = importer.import_from_file(file_content)
+                result['errors'] = archive_errors(members) + result['errors']
+                schedule_snapshot()
+                
+                if profile is not None:
+                    profile.stop()
+                    return render(request, 'admin/licenses/import_profile.html', {
+                        'title': 'Профиль импорта',
+                        'site_title': 'Администрирование',
+                        'has_permission': True,
+                        'file_name': geojson_file.name,
+                        'result': result,
+                        'profile': profile.report(),
+                    })
                 
                 messages.success(
                     request,
-                    f'Импорт завершён! Создано: {result["imported"]}, Обновлено: {result["updated"]}, Пропущено: {result["skipped"]}'
+                    f'Импорт завершён! Создано: {result["imported"]}, Обновлено: {result["updated"]}, '
+                    f'Без изменений: {result["unchanged"]}, Пропущено: {result["skipped"]}'
+                    + (f', файлов в архиве: {len(members)}' if members else '')
                 )
                 
+                if result.get('overlaps'):
+                    messages.warning(
+                        request,
+                        f'Найдено пересечений контуров с реестром: {len(result["overlaps"])} '
+                        f'(см. раздел «Пересечения лицензий»)'
+                    )
+                
                 if result['errors']:
                     for error in result['errors'][:5]:
                         messages.warning(request, error)
@@ -71,6 +138,9 @@ class LicenseAdmin(admin.ModelAdmin):
             except Exception as e:
                 messages.error(request, f'Ошибка при обработке файла: {str(e)}')
                 return redirect('..')
+            finally:
+                if profile is not None:
+                    profile.stop()
         
         context = {
             'title': 'Импорт GeoJSON',
@@ -78,11 +148,45 @@ class LicenseAdmin(admin.ModelAdmin):
             'has_permission': True,
         }
         return render(request, 'admin/licenses/import_geojson.html', context)
+    
+    def perf_report_view(self, request):
+        if request.method == 'POST' and 'reset' in request.POST:
+            perf.rolling_stats.reset()
+            messages.success(request, 'Статистика производительности сброшена')
+            return redirect('.')
+        
+        context = {
+            'title': 'Производительность запросов',
+            'site_title': 'Администрирование',
+            'has_permission': True,
+            'report': perf.build_report(),
+        }
+        return render(request, 'admin/licenses/perf_report.html', context)
+    
+    def map_benchmark_view(self, request):
+        """Замер отрисовки и фильтрации слоя лицензий карты на синтетическом реестре (в браузере)"""
+        from django.conf import settings
+        from .synthetic import LICENSE_TYPES, REGION_CENTERS
+        
+        context = {
+            'title': 'Бенчмарк карты',
+            'site_title': 'Администрирование',
+            'has_permission': True,
+            'yandex_maps_api_key': settings.YANDEX_MAPS_API_KEY,
+            'sizes': [1000, 10000, 50000],
+            'synthetic': {'region_centers': REGION_CENTERS, 'license_types': LICENSE_TYPES},
+        }
+        return render(request, 'admin/licenses/map_benchmark.html', context)
 
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
     list_display = ['title', 'license', 'file_type', 'uploaded_at', 'uploaded_by']
+    # Document.__str__ и колонки списка обращаются к связанным объектам -
+    # подгружаем их одним JOIN вместо запроса на каждую строку
+    list_select_related = ['license', 'uploaded_by']
+    # Выпадающий список из всех лицензий в форме слишком тяжёл для большого реестра
+    autocomplete_fields = ['license']
     list_filter = ['file_type', 'uploaded_at']
     search_fields = ['title', 'license__license_number']
     date_hierarchy = 'uploaded_at'
@@ -100,3 +204,47 @@ class DocumentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(LicenseOverlap)
+class LicenseOverlapAdmin(admin.ModelAdmin):
+    list_display = ['license_a', 'license_b', 'area_km2', 'share_a_percent', 'share_b_percent', 'detected_at']
+    list_select_related = ['license_a', 'license_b']
+    list_filter = ['detected_at', 'license_a__region', 'license_a__status', 'license_b__status']
+    search_fields = ['license_a__license_number', 'license_b__license_number',
+                     'license_a__owner', 'license_b__owner']
+    date_hierarchy = 'detected_at'
+    ordering = ['-area_km2']
+    readonly_fields = ['license_a', 'license_b', 'area_km2', 'share_a', 'share_b', 'geometry', 'detected_at']
+
+    def has_add_permission(self, request):
+        # Записи создаются только командой detect_overlaps и проверкой при импорте
+        return False
+
+    @admin.display(description='Доля А, %', ordering='share_a')
+    def share_a_percent(self, obj):
+        return None if obj.share_a is None else round(obj.share_a * 100, 1)
+
+    @admin.display(description='Доля Б, %', ordering='share_b')
+    def share_b_percent(self, obj):
+        return None if obj.share_b is None else round(obj.share_b * 100, 1)
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'source', 'status', 'progress', 'imported', 'updated', 'unchanged', 'skipped',
+                    'started_at', 'updated_at']
+    list_filter = ['status', 'started_at']
+    search_fields = ['source']
+    ordering = ['-started_at']
+    
+    def has_add_permission(self, request):
+        # Запуски создаёт команда import_geojson
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    @admin.display(description='Прогресс')
+    def progress(self, obj):
+        return f'{obj.next_index} / {obj.total}'
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LicensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'licenses'
+
+    def ready(self):
+        # Регистрация обработчиков сигналов (версия данных, пространственный индекс)
+        from licenses import signals  # noqa: F401
@@ -0,0 +1,108 @@
+"""
+Импорт ZIP-архивов с несколькими GeoJSON файлами.
+
+Файлы архива читаются пулом потоков ограниченного размера
+(IMPORT_ARCHIVE_WORKERS). Параллельно идут в основном чтение и
+распаковка (zlib отпускает GIL); json.loads держит GIL, так что разбор
+JSON фактически последовательный. Запись в базу одна: объекты всех
+файлов объединяются в порядке имён файлов и передаются GeoJSONImporter,
+который группирует их по номеру лицензии. Поэтому результат слияния
+лицензии, встречающейся в нескольких файлах, не зависит от того, какой
+поток закончил первым, а прерванный импорт архива продолжается по
+--resume, как импорт файла.
+
+Архив целиком разбирается в память процесса (объекты Python в несколько
+раз больше JSON), а загрузка на сайте ждёт окончания импорта. Поэтому
+суммарный размер распакованных файлов ограничен IMPORT_ARCHIVE_MAX_SIZE;
+большие реестры загружайте командой import_geojson по частям.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+ARCHIVE_EXTENSIONS = ('.zip',)
+MEMBER_EXTENSIONS = ('.geojson', '.json')
+
+
+def is_archive(file_name):
+    """Является ли файл архивом для импорта (по расширению)"""
+    return file_name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _geojson_members(archive):
+    """GeoJSON файлы архива в порядке имён (без служебных файлов macOS)"""
+    members = []
+    for info in archive.infolist():
+        name = info.filename
+        base = name.rsplit('/', 1)[-1]
+        if info.is_dir() or name.startswith('__MACOSX/') or base.startswith('.'):
+            continue
+        if name.lower().endswith(MEMBER_EXTENSIONS):
+            members.append(info)
+    return sorted(members, key=lambda info: info.filename)
+
+
+def _load_member(archive, info):
+    report = {'name': info.filename, 'size': info.file_size, 'features': 0, 'error': None}
+    try:
+        data = json.loads(archive.read(info).decode('utf-8'))
+        features = data.get('features') if isinstance(data, dict) else None
+        if not isinstance(features, list):
+            raise ValueError('нет списка features')
+    except (ValueError, UnicodeDecodeError) as e:
+        report['error'] = f'файл не является корректным GeoJSON ({e})'
+        return report, []
+    report['features'] = len(features)
+    return report, features
+
+
+def load_archive(file_obj, workers=None, max_size=None):
+    """
+    Читает GeoJSON файлы ZIP-архива параллельно
+
+    Args:
+        file_obj: файл архива (путь или файловый объект)
+        workers: размер пула потоков (по умолчанию IMPORT_ARCHIVE_WORKERS)
+        max_size: предел суммарного размера распакованных файлов в байтах
+            (по умолчанию IMPORT_ARCHIVE_MAX_SIZE)
+
+    Returns:
+        (данные GeoJSON со всеми объектами архива, отчёт по файлам архива:
+        список словарей name, size, features, error)
+
+    Raises:
+        ValueError: файл не является ZIP-архивом, в нём нет GeoJSON файлов
+            или распакованные файлы слишком велики
+    """
+    import zipfile
+
+    try:
+        archive = zipfile.ZipFile(file_obj)
+    except zipfile.BadZipFile:
+        raise ValueError('Файл не является ZIP-архивом')
+    with archive:
+        members = _geojson_members(archive)
+        if not members:
+            raise ValueError('В архиве нет файлов .geojson или .json')
+        max_size = max_size or settings.IMPORT_ARCHIVE_MAX_SIZE
+        if sum(info.file_size for info in members) > max_size:
+            raise ValueError(
+                f'Распакованные файлы архива превышают допустимый размер ({max_size // (1024 * 1024)} МБ)')
+
+        workers = workers or settings.IMPORT_ARCHIVE_WORKERS
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(members)))) as pool:
+            # map возвращает результаты в порядке файлов, а не завершения потоков
+            loaded = list(pool.map(lambda info: _load_member(archive, info), members))
+
+    features = []
+    reports = []
+    for report, member_features in loaded:
+        features.extend(member_features)
+        reports.append(report)
+    return {'type': 'FeatureCollection', 'features': features}, reports
+
+
+def archive_errors(reports):
+    """Сообщения об ошибках файлов архива для отчёта об импорте"""
+    return [f'{report["name"]}: {report["error"]}' for report in reports if report['error']]
@@ -0,0 +1,188 @@
+"""
+Кластеры меток лицензий для мелких масштабов карты.
+
+Центры лицензий (latitude/longitude) группируются по сетке в проекции
+Web Mercator (как у тайлов Яндекс.Карт): на масштабе z мир делится на
+2**z * 256 / CELL_SIZE_PX ячеек по каждой оси, и все лицензии одной
+ячейки образуют кластер - с числом лицензий по статусам, средним
+положением и охватом. Сетка привязана к миру, а не к окну карты, поэтому
+при сдвиге карты кластеры не перестраиваются.
+
+Кластеры всех масштабов 0..MAX_CLUSTER_ZOOM рассчитываются разом одним
+запросом к базе и хранятся в памяти процесса до смены версии данных
+(licenses.versioning). На масштабах крупнее MAX_CLUSTER_ZOOM API отдаёт
+отдельные лицензии.
+"""
+import math
+import threading
+
+import numpy as np
+
+from licenses.versioning import get_data_version
+
+# Размер ячейки сетки в пикселях экрана
+CELL_SIZE_PX = 64
+
+# Самый крупный масштаб, на котором лицензии объединяются в кластеры
+MAX_CLUSTER_ZOOM = 11
+
+# Предел широты проекции Web Mercator
+MAX_LATITUDE = 85.05112878
+
+
+class ZoomClusters:
+    """Кластеры одного масштаба в виде массивов NumPy"""
+
+    def __init__(self, lon, lat, count, bbox, statuses, first_id, first_number, first_status):
+        self.lon = lon
+        self.lat = lat
+        self.count = count
+        self.bbox = bbox
+        self.statuses = statuses
+        self.first_id = first_id
+        self.first_number = first_number
+        self.first_status = first_status
+
+    def __len__(self):
+        return len(self.count)
+
+    def select(self, min_lon, min_lat, max_lon, max_lat):
+        """Номера кластеров, положение которых попадает в прямоугольник"""
+        in_lat = (self.lat >= min_lat) & (self.lat <= max_lat)
+        if min_lon > max_lon:
+            # Прямоугольник через 180-й меридиан
+            in_lon = (self.lon >= min_lon) | (self.lon <= max_lon)
+        else:
+            in_lon = (self.lon >= min_lon) & (self.lon <= max_lon)
+        return np.flatnonzero(in_lat & in_lon)
+
+
+def mercator_xy(lon, lat):
+    """Координаты в долях мира Web Mercator: x слева направо, y сверху вниз (0..1)"""
+    lat = np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE)
+    x = (lon + 180.0) / 360.0
+    sin_lat = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def build_zoom(zoom, ids, numbers, lon, lat, status_codes, status_names, x, y):
+    """Кластеры масштаба zoom по сетке ячеек CELL_SIZE_PX"""
+    cells = int(2 ** zoom * 256 / CELL_SIZE_PX)
+    cx = np.minimum((x * cells).astype(np.int64), cells - 1)
+    cy = np.minimum((y * cells).astype(np.int64), cells - 1)
+    keys, inverse = np.unique(cx * cells + cy, return_inverse=True)
+    size = len(keys)
+
+    count = np.bincount(inverse, minlength=size)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(count)[:-1]])
+    sorted_lon = lon[order]
+    sorted_lat = lat[order]
+    bbox = np.column_stack([
+        np.minimum.reduceat(sorted_lon, starts),
+        np.minimum.reduceat(sorted_lat, starts),
+        np.maximum.reduceat(sorted_lon, starts),
+        np.maximum.reduceat(sorted_lat, starts),
+    ])
+    statuses = np.bincount(
+        inverse * len(status_names) + status_codes, minlength=size * len(status_names),
+    ).reshape(size, len(status_names))
+    first = order[starts]
+    return ZoomClusters(
+        lon=np.bincount(inverse, weights=lon, minlength=size) / count,
+        lat=np.bincount(inverse, weights=lat, minlength=size) / count,
+        count=count,
+        bbox=bbox,
+        statuses=statuses,
+        first_id=ids[first],
+        first_number=numbers[first],
+        first_status=status_codes[first],
+    )
+
+
+class ClusterIndex:
+    """Кластеры всех масштабов для текущей версии данных (в памяти процесса)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.zooms = []
+        self.status_names = []
+
+    def reset(self):
+        with self._lock:
+            self.version = None
+            self.zooms = []
+
+    def rebuild(self, version):
+        from licenses.models import License
+
+        rows = list(License.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+            'id', 'license_number', 'longitude', 'latitude', 'status'))
+        status_names = sorted({row[4] for row in rows})
+        status_index = {name: index for index, name in enumerate(status_names)}
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        numbers = np.array([row[1] for row in rows], dtype=object)
+        lon = np.array([float(row[2]) for row in rows], dtype=float)
+        lat = np.array([float(row[3]) for row in rows], dtype=float)
+        status_codes = np.array([status_index[row[4]] for row in rows], dtype=np.int64)
+        if rows:
+            x, y = mercator_xy(lon, lat)
+            zooms = [
+                build_zoom(zoom, ids, numbers, lon, lat, status_codes, status_names, x, y)
+                for zoom in range(MAX_CLUSTER_ZOOM + 1)
+            ]
+        else:
+            zooms = []
+        self.status_names = status_names
+        self.zooms = zooms
+        self.version = version
+
+    def sync(self):
+        """Пересчитывает кластеры, если версия данных изменилась"""
+        version = get_data_version()
+        if self.version == version:
+            return
+        with self._lock:
+            if self.version != version:
+                self.rebuild(version)
+
+    def clusters(self, zoom, bbox=None):
+        """
+        Кластеры масштаба zoom (не крупнее MAX_CLUSTER_ZOOM) в прямоугольнике
+
+        Returns:
+            список dict: lon, lat, count, statuses {статус: число}, bbox;
+            у кластеров из одной лицензии также id, license_number, status
+        """
+        self.sync()
+        with self._lock:
+            zooms, status_names = self.zooms, self.status_names
+        if not zooms:
+            return []
+        level = zooms[min(zoom, MAX_CLUSTER_ZOOM)]
+        selected = level.select(*bbox) if bbox else np.arange(len(level))
+
+        result = []
+        for index in selected.tolist():
+            count = int(level.count[index])
+            item = {
+                'lon': round(float(level.lon[index]), 6),
+                'lat': round(float(level.lat[index]), 6),
+                'count': count,
+                'statuses': {
+                    status_names[code]: int(value)
+                    for code, value in enumerate(level.statuses[index].tolist()) if value
+                },
+                'bbox': [round(value, 6) for value in level.bbox[index].tolist()],
+            }
+            if count == 1:
+                item['id'] = int(level.first_id[index])
+                item['license_number'] = level.first_number[index]
+                item['status'] = status_names[level.first_status[index]]
+            result.append(item)
+        return result
+
+
+cluster_index = ClusterIndex()
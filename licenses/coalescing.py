@@ -0,0 +1,138 @@
+"""
+Объединение одновременных одинаковых запросов (single-flight).
+
+Когда в начале смены десятки пользователей разом открывают карту, каждый
+запрос /api/licenses/all/ сам читает всю таблицу и сериализует её. С
+single_flight одинаковые запросы (одно представление, одни параметры,
+одна версия данных) делят одно вычисление:
+
+- внутри процесса: первый поток вычисляет ответ, остальные ждут его
+  результата (threading.Event);
+- между процессами: вычисляет тот воркер, который взял замок в общем кеше
+  Django (cache.add), остальные ждут появления результата в кеше. Замок
+  надёжен, только если cache.add атомарен (Redis, Memcached). У файлового
+  кеша add - это проверка и запись без блокировки, поэтому с ним
+  объединение работает только внутри процесса.
+
+Это не кеш ответов: результат попадает в общий кеш, только если его
+ждут другие воркеры, и живёт там SHARED_RESULT_SECONDS - чтобы его
+успели забрать. Ключ включает версию данных (licenses.versioning), так
+что после изменения реестра запросы вычисляются заново. Если
+вычисляющий упал или завис дольше LOCK_TIMEOUT, ожидающие вычисляют
+ответ сами.
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+# Максимальное время вычисления; после него замок истекает сам
+LOCK_TIMEOUT = 60
+
+# Сколько секунд результат доступен ожидающим воркерам
+SHARED_RESULT_SECONDS = 5
+
+# Как часто ожидающий воркер проверяет кеш
+POLL_INTERVAL = 0.05
+
+KEY_PREFIX = 'licenses:flight:'
+
+# Кеши без атомарного add (или без хранения вовсе) - замок между воркерами невозможен
+NON_ATOMIC_CACHES = (FileBasedCache, DummyCache)
+
+
+class _Flight:
+    """Вычисление, которого ждут потоки текущего процесса"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def request_key(request, version):
+    """Ключ запроса: путь, отсортированные параметры и версия данных"""
+    params = '&'.join(f'{name}={value}' for name, value in sorted(request.GET.items()))
+    raw = f'{request.path}?{params}#{version}'
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def single_flight(key, compute, timeout=LOCK_TIMEOUT):
+    """
+    Результат compute(), общий для одновременных вызовов с тем же ключом
+
+    Args:
+        key: ключ запроса (см. request_key)
+        compute: функция без аргументов; результат должен сохраняться в кеше
+            (bytes, str, dict), None считается отсутствием результата
+        timeout: сколько секунд ждать чужого вычисления
+
+    Returns:
+        результат compute() - своего или вычисленного другим потоком/воркером
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if flight.done.wait(timeout) and not flight.failed:
+            return flight.result
+        return compute()
+
+    try:
+        if isinstance(caches['default'], NON_ATOMIC_CACHES):
+            # Замок в таком кеше не атомарен - объединяем только потоки процесса
+            flight.result = compute()
+        else:
+            flight.result = _shared(key, compute, timeout)
+        return flight.result
+    except BaseException:
+        flight.failed = True
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _shared(key, compute, timeout):
+    """Вычисление одним воркером под замком в общем кеше"""
+    result_key = KEY_PREFIX + key
+    lock_key = result_key + ':lock'
+    waiting_key = result_key + ':waiting'
+
+    result = cache.get(result_key)
+    if result is not None:
+        return result
+
+    deadline = time.monotonic() + timeout
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        # Вычисляющий воркер сохранит результат для ожидающих
+        cache.set(waiting_key, 1, LOCK_TIMEOUT)
+        time.sleep(POLL_INTERVAL)
+        result = cache.get(result_key)
+        if result is not None:
+            return result
+        if time.monotonic() > deadline:
+            return compute()
+
+    try:
+        # Другой воркер мог закончить между проверкой результата и замком
+        result = cache.get(result_key)
+        if result is None:
+            result = compute()
+            if cache.get(waiting_key):
+                cache.set(result_key, result, SHARED_RESULT_SECONDS)
+                cache.delete(waiting_key)
+        return result
+    finally:
+        cache.delete(lock_key)
@@ -0,0 +1,210 @@
+"""
+Колоночный снимок реестра в памяти процесса.
+
+Реестр без контуров занимает единицы мегабайт, поэтому каждый воркер
+держит его копию в виде столбцов NumPy, а не моделей ORM:
+
+- status, region, license_type, mineral_type - словарное кодирование:
+  отсортированный список значений и массив кодов int32;
+- даты - порядковые номера дней (date.toordinal), 0 - даты нет;
+- координаты, охват и площадь - float64, NaN - значения нет;
+- номер, недропользователь, участок и описание - массивы строк для
+  ответа API, плюс строка поиска «номер + недропользователь» в нижнем
+  регистре.
+
+Отбор, сводка по значениям фильтров и постраничная выдача считаются
+векторными операциями над столбцами без обращения к базе. Снимок
+пересобирается одним запросом при первом обращении после смены версии
+данных (licenses.versioning), как индексы licenses.spatial и
+licenses.clusters. Строки хранятся в порядке License.Meta.ordering.
+"""
+import threading
+from datetime import date
+
+import numpy as np
+
+from licenses.versioning import get_data_version
+
+# Поля со словарным кодированием
+CATEGORY_FIELDS = ('status', 'region', 'license_type', 'mineral_type')
+
+# Строковые поля ответа API
+TEXT_FIELDS = ('license_number', 'owner', 'area', 'description')
+
+DATE_FIELDS = ('issue_date', 'expiry_date')
+
+FLOAT_FIELDS = ('latitude', 'longitude', 'area_km2', 'min_lon', 'min_lat', 'max_lon', 'max_lat')
+
+# Строки поиска переменной длины (NumPy 2)
+SEARCH_DTYPE = np.dtypes.StringDType()
+
+# Параметры запроса -> поля словарного кодирования (как в экспорте в Excel)
+FILTER_PARAMS = {
+    'status': 'status',
+    'region': 'region',
+    'type': 'license_type',
+    'mineral': 'mineral_type',
+}
+
+
+class Category:
+    """Столбец со словарным кодированием: names[codes[i]] - значение строки i"""
+
+    def __init__(self, values):
+        self.names = sorted(set(values))
+        self.index = {name: code for code, name in enumerate(self.names)}
+        self.codes = np.fromiter((self.index[value] for value in values), dtype=np.int32, count=len(values))
+
+    def code(self, value):
+        """Код значения или -1, если такого значения в реестре нет"""
+        return self.index.get(value, -1)
+
+    def counts(self, positions):
+        """Число строк positions по каждому значению (в порядке names)"""
+        return np.bincount(self.codes[positions], minlength=len(self.names))
+
+
+class Columns:
+    """Неизменяемый снимок столбцов реестра одной версии данных"""
+
+    def __init__(self, rows):
+        fields = ('id',) + CATEGORY_FIELDS + TEXT_FIELDS + DATE_FIELDS + FLOAT_FIELDS
+        columns = dict(zip(fields, zip(*rows))) if rows else {field: () for field in fields}
+        self.size = len(rows)
+        self.ids = np.array(columns['id'], dtype=np.int64)
+        self.categories = {field: Category(columns[field]) for field in CATEGORY_FIELDS}
+        self.texts = {field: np.array(columns[field], dtype=object) for field in TEXT_FIELDS}
+        self.dates = {
+            field: np.fromiter(
+                (value.toordinal() if value else 0 for value in columns[field]), dtype=np.int32, count=self.size)
+            for field in DATE_FIELDS
+        }
+        self.floats = {
+            field: np.array([np.nan if value is None else float(value) for value in columns[field]], dtype=float)
+            for field in FLOAT_FIELDS
+        }
+        # Строки переменной длины: массив <U занимал бы на каждую строку
+        # ширину самой длинной, то есть десятки мегабайт из-за одного названия
+        self.search_keys = np.array(
+            [f'{number}\n{owner}'.lower() for number, owner in zip(columns['license_number'], columns['owner'])],
+            dtype=SEARCH_DTYPE)
+
+    def has_overdue(self, today=None):
+        """Есть ли действующие лицензии с истекшим сроком (их статус пора обновить)"""
+        today = (today or date.today()).toordinal()
+        status = self.categories['status']
+        expiry = self.dates['expiry_date']
+        return bool(np.any((status.codes == status.code('active')) & (expiry > 0) & (expiry < today)))
+
+    def select(self, filters=None, search='', bbox=None):
+        """
+        Номера строк, подходящих под фильтры, в порядке реестра
+
+        Args:
+            filters: {поле словарного кодирования: значение} - точное совпадение
+            search: подстрока номера или недропользователя без учёта регистра
+            bbox: (min_lon, min_lat, max_lon, max_lat) - как LicenseQuerySet.in_bbox
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for field, value in (filters or {}).items():
+            category = self.categories[field]
+            mask &= category.codes == category.code(value)
+        if search:
+            mask &= np.strings.find(self.search_keys, search.lower()) >= 0
+        if bbox is not None:
+            mask &= self.bbox_mask(*bbox)
+        return np.flatnonzero(mask)
+
+    def bbox_mask(self, min_lon, min_lat, max_lon, max_lat):
+        """Строки, охват (или точка, если контура нет) которых пересекается с прямоугольником"""
+        if min_lon > max_lon:
+            # Прямоугольник через 180-й меридиан
+            return self.bbox_mask(min_lon, min_lat, 180.0, max_lat) | self.bbox_mask(-180.0, min_lat, max_lon, max_lat)
+        f = self.floats
+        # Сравнения с NaN (нет охвата или координат) дают False
+        box = (f['min_lon'] <= max_lon) & (f['max_lon'] >= min_lon) & (f['min_lat'] <= max_lat) & (f['max_lat'] >= min_lat)
+        point = (
+            np.isnan(f['min_lon'])
+            & (f['longitude'] >= min_lon) & (f['longitude'] <= max_lon)
+            & (f['latitude'] >= min_lat) & (f['latitude'] <= max_lat)
+        )
+        return box | point
+
+    def stats(self, positions):
+        """
+        Сводка по строкам positions в формате snapshots.registry_stats:
+        total и число лицензий по каждому значению status, region,
+        license_type и mineral_type (значения по алфавиту, без нулевых)
+        """
+        stats = {'total': int(len(positions))}
+        for field, category in self.categories.items():
+            counts = category.counts(positions)
+            stats[field] = {name: int(count) for name, count in zip(category.names, counts.tolist()) if count}
+        return stats
+
+    def rows(self, positions):
+        """Строки positions в формате views.license_data (без контуров)"""
+        categories, texts, dates, floats = self.categories, self.texts, self.dates, self.floats
+        result = []
+        for i in np.asarray(positions).tolist():
+            latitude = floats['latitude'][i]
+            longitude = floats['longitude'][i]
+            area_km2 = floats['area_km2'][i]
+            expiry = dates['expiry_date'][i]
+            result.append({
+                'id': int(self.ids[i]),
+                'license_number': texts['license_number'][i],
+                'license_type': categories['license_type'].names[categories['license_type'].codes[i]],
+                'owner': texts['owner'][i],
+                # Как в license_data: нулевая координата отдаётся как null
+                'latitude': float(latitude) if latitude and not np.isnan(latitude) else None,
+                'longitude': float(longitude) if longitude and not np.isnan(longitude) else None,
+                'region': categories['region'].names[categories['region'].codes[i]],
+                'area': texts['area'][i],
+                'area_km2': None if np.isnan(area_km2) else float(area_km2),
+                'issue_date': date.fromordinal(int(dates['issue_date'][i])).isoformat(),
+                'expiry_date': date.fromordinal(int(expiry)).isoformat() if expiry else None,
+                'mineral_type': categories['mineral_type'].names[categories['mineral_type'].codes[i]],
+                'status': categories['status'].names[categories['status'].codes[i]],
+                'description': texts['description'][i],
+            })
+        return result
+
+
+class RegistryColumns:
+    """Колоночный снимок реестра для текущей версии данных (в памяти процесса)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.columns = Columns([])
+
+    def reset(self):
+        with self._lock:
+            self.version = None
+            self.columns = Columns([])
+
+    def rebuild(self, version):
+        from licenses.models import License
+
+        fields = ('id',) + CATEGORY_FIELDS + TEXT_FIELDS + DATE_FIELDS + FLOAT_FIELDS
+        self.columns = Columns(list(License.objects.values_list(*fields)))
+        self.version = version
+
+    def sync(self):
+        """Пересобирает снимок, если версия данных изменилась"""
+        version = get_data_version()
+        if self.version == version:
+            return
+        with self._lock:
+            if self.version != version:
+                self.rebuild(version)
+
+    def snapshot(self):
+        """Актуальный снимок; запросы работают с ним целиком, даже если рядом идёт пересборка"""
+        self.sync()
+        with self._lock:
+            return self.columns
+
+
+registry_columns = RegistryColumns()
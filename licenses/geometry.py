@@ -0,0 +1,334 @@
+"""
+Геометрические расчёты для контуров лицензий: площадь, центр масс, охват.
+
+Все кольца геометрии обрабатываются одним массивом NumPy: формула площади
+Гаусса (shoelace) считается векторно для всех рёбер сразу, а суммы по
+кольцам собираются через np.add.reduceat. Координаты - долгота/широта
+в градусах (как в GeoJSON), площадь пересчитывается в кв. км через
+локальную равнопромежуточную проекцию по широте центра каждого полигона,
+чего достаточно для участков размером до сотен километров.
+"""
+import hashlib
+import math
+
+import numpy as np
+
+# Длина одного градуса дуги меридиана, км
+KM_PER_DEGREE = 6371.0088 * math.pi / 180
+
+
+def iter_polygons(geometry):
+    """Возвращает список полигонов (список колец) для Polygon и MultiPolygon"""
+    if not geometry or not geometry.get('coordinates'):
+        return []
+    geom_type = geometry.get('type', 'Polygon')
+    if geom_type == 'MultiPolygon':
+        return [polygon for polygon in geometry['coordinates'] if polygon]
+    if geom_type == 'Polygon':
+        return [geometry['coordinates']]
+    return []
+
+
+def polygon_hash(polygon):
+    """
+    SHA-256 полигона (списка колец) в каноническом виде
+
+    Координаты округляются до 1e-9 градуса, высота отбрасывается, кольца
+    замыкаются, вырожденные кольца (меньше трёх точек) пропускаются.
+    Хешируются двоичные массивы NumPy - без поэлементной работы в Python.
+    """
+    digest = hashlib.sha256()
+    for ring in polygon or []:
+        if not ring or len(ring) < 3:
+            continue
+        # + 0.0 превращает -0.0 в 0.0, иначе их байты различаются
+        points = np.round(np.asarray(ring, dtype='<f8')[:, :2], 9) + 0.0
+        if not np.array_equal(points[0], points[-1]):
+            points = np.vstack([points, points[:1]])
+        digest.update(len(points).to_bytes(8, 'little'))
+        digest.update(points.tobytes())
+    return digest.hexdigest()
+
+
+def _clean_ring(ring, precision):
+    """
+    Кольцо после квантования: без повторяющихся подряд вершин и вершин на
+    одной прямой с соседями (включая «иглы» туда-обратно), замкнутое.
+    Возвращает массив (n, 2) или None, если от кольца ничего не осталось
+    """
+    points = np.round(np.asarray(ring, dtype=float)[:, :2], precision) + 0.0
+    # Замыкающая точка снимается и добавляется обратно в конце
+    if len(points) > 1 and np.array_equal(points[0], points[-1]):
+        points = points[:-1]
+    tolerance = (10.0 ** -precision) ** 2 / 2
+    while len(points) >= 3:
+        previous = np.roll(points, 1, axis=0)
+        following = np.roll(points, -1, axis=0)
+        duplicate = np.all(points == previous, axis=1)
+        cross = ((points[:, 0] - previous[:, 0]) * (following[:, 1] - previous[:, 1])
+                 - (points[:, 1] - previous[:, 1]) * (following[:, 0] - previous[:, 0]))
+        redundant = duplicate | (np.abs(cross) <= tolerance)
+        if not redundant.any():
+            break
+        if redundant.all():
+            return None
+        # Удаляем по одной вершине из каждой пары соседних лишних, чтобы
+        # не потерять угол, соседний с удалённой вершиной
+        redundant &= ~np.roll(redundant, 1)
+        points = points[~redundant]
+    if len(points) < 3:
+        return None
+    return np.vstack([points, points[:1]])
+
+
+def _signed_area(points):
+    x, y = points[:, 0], points[:, 1]
+    return float((x[:-1] * y[1:] - x[1:] * y[:-1]).sum()) / 2
+
+
+def clean_polygon(polygon, precision=6):
+    """
+    Приводит полигон к компактному правильному виду
+
+    Координаты округляются до precision знаков, удаляются повторяющиеся
+    и лежащие на одной прямой вершины, кольца замыкаются, внешний контур
+    ориентируется против часовой стрелки, дыры - по часовой (RFC 7946).
+    Вырожденные кольца отбрасываются.
+
+    Returns:
+        список колец или None, если от внешнего контура ничего не осталось
+    """
+    rings = []
+    for index, ring in enumerate(polygon or []):
+        if not ring or len(ring) < 3:
+            if index == 0:
+                return None
+            continue
+        points = _clean_ring(ring, precision)
+        if points is None:
+            if index == 0:
+                return None
+            continue
+        area = _signed_area(points)
+        if (area < 0) == (index == 0):
+            points = points[::-1]
+        rings.append(points.tolist())
+    return rings or None
+
+
+def clean_geometry(geometry, precision=6):
+    """
+    clean_polygon для каждого полигона Polygon или MultiPolygon
+
+    Пустые полигоны удаляются. Returns: геометрия того же типа или None,
+    если полигонов не осталось; прочие типы геометрии возвращаются как есть
+    """
+    if not geometry or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+        return geometry
+    polygons = [cleaned for cleaned in (clean_polygon(p, precision) for p in iter_polygons(geometry)) if cleaned]
+    if not polygons:
+        return None
+    if geometry['type'] == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+
+def _pack_rings(polygons):
+    """
+    Склеивает все кольца в один массив точек (N, 2)
+
+    Незамкнутые кольца замыкаются. Возвращает массив точек, индексы начала
+    каждого кольца, номер полигона для каждого кольца и признак внешнего контура.
+    """
+    chunks = []
+    starts = []
+    polygon_ids = []
+    is_outer = []
+    offset = 0
+    for polygon_index, polygon in enumerate(polygons):
+        for ring_index, ring in enumerate(polygon):
+            if not ring or len(ring) < 3:
+                continue
+            points = np.asarray(ring, dtype=float)[:, :2]
+            if not np.array_equal(points[0], points[-1]):
+                points = np.vstack([points, points[:1]])
+            chunks.append(points)
+            starts.append(offset)
+            polygon_ids.append(polygon_index)
+            is_outer.append(ring_index == 0)
+            offset += len(points)
+    if not chunks:
+        return None
+    return (
+        np.concatenate(chunks),
+        np.asarray(starts),
+        np.asarray(polygon_ids),
+        np.asarray(is_outer),
+    )
+
+
+def measure(geometry):
+    """
+    Площадь, центр масс и охват (bbox) полигона или мультиполигона
+
+    Дыры (внутренние кольца) вычитаются из площади и учитываются в центре.
+    Для вырожденной геометрии (нулевая площадь) центром считается среднее
+    вершин без повторяющейся замыкающей точки.
+
+    Args:
+        geometry: GeoJSON геометрия (Polygon или MultiPolygon)
+
+    Returns:
+        dict с ключами center ([lon, lat]), area_km2 и bbox
+        ([min_lon, min_lat, max_lon, max_lat]) или None для пустой геометрии
+    """
+    packed = _pack_rings(iter_polygons(geometry))
+    if packed is None:
+        return None
+    points, starts, polygon_ids, is_outer = packed
+    x = points[:, 0]
+    y = points[:, 1]
+
+    # Векторное произведение для каждой пары соседних точек; пары на стыке
+    # двух колец (последняя точка кольца -> первая следующего) обнуляются
+    cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+    boundary = starts[1:] - 1
+    cross[boundary] = 0.0
+    cx_terms = (x[:-1] + x[1:]) * cross
+    cy_terms = (y[:-1] + y[1:]) * cross
+
+    ring_cross = np.add.reduceat(cross, starts)
+    ring_cx = np.add.reduceat(cx_terms, starts)
+    ring_cy = np.add.reduceat(cy_terms, starts)
+
+    # Ориентация колец в исходных данных произвольная: внешний контур
+    # всегда добавляет площадь, внутренний - вычитает
+    sign = np.where(is_outer, 1.0, -1.0) * np.sign(ring_cross)
+    ring_area = sign * ring_cross / 2
+    ring_mx = sign * ring_cx / 6
+    ring_my = sign * ring_cy / 6
+
+    polygon_count = int(polygon_ids.max()) + 1
+    poly_area = np.bincount(polygon_ids, ring_area, polygon_count)
+    poly_mx = np.bincount(polygon_ids, ring_mx, polygon_count)
+    poly_my = np.bincount(polygon_ids, ring_my, polygon_count)
+
+    bbox = [float(x.min()), float(y.min()), float(x.max()), float(y.max())]
+
+    valid = poly_area > 0
+    if not valid.any():
+        # Вырожденная геометрия: среднее вершин без замыкающих точек
+        ends = np.append(starts[1:], len(points)) - 1
+        mask = np.ones(len(points), dtype=bool)
+        mask[ends] = False
+        return {
+            'center': [float(x[mask].mean()), float(y[mask].mean())],
+            'area_km2': 0.0,
+            'bbox': bbox,
+        }
+
+    poly_cx = poly_mx[valid] / poly_area[valid]
+    poly_cy = poly_my[valid] / poly_area[valid]
+    # Площадь каждого полигона в кв. км по масштабу на широте его центра
+    poly_km2 = poly_area[valid] * np.cos(np.radians(poly_cy)) * KM_PER_DEGREE ** 2
+    total_km2 = float(poly_km2.sum())
+
+    return {
+        'center': [
+            float((poly_cx * poly_km2).sum() / total_km2),
+            float((poly_cy * poly_km2).sum() / total_km2),
+        ],
+        'area_km2': total_km2,
+        'bbox': bbox,
+    }
+
+
+def combine(first, second):
+    """
+    Объединяет результаты measure() двух геометрий без пересчёта вершин
+
+    Центр - средневзвешенный по площади, охват - объединение охватов.
+    """
+    if not first:
+        return second
+    if not second:
+        return first
+    total = first['area_km2'] + second['area_km2']
+    if total > 0:
+        w1 = first['area_km2'] / total
+        w2 = second['area_km2'] / total
+    else:
+        w1 = w2 = 0.5
+    return {
+        'center': [
+            first['center'][0] * w1 + second['center'][0] * w2,
+            first['center'][1] * w1 + second['center'][1] * w2,
+        ],
+        'area_km2': total,
+        'bbox': [
+            min(first['bbox'][0], second['bbox'][0]),
+            min(first['bbox'][1], second['bbox'][1]),
+            max(first['bbox'][2], second['bbox'][2]),
+            max(first['bbox'][3], second['bbox'][3]),
+        ],
+    }
+
+
+def _local_xy(ring, lon0, lat0):
+    """Координаты кольца в км относительно точки (lon0, lat0)"""
+    points = np.asarray(ring, dtype=float)[:, :2]
+    if not np.array_equal(points[0], points[-1]):
+        points = np.vstack([points, points[:1]])
+    # Разность долгот через 180-й меридиан берём кратчайшую
+    dlon = (points[:, 0] - lon0 + 180) % 360 - 180
+    x = dlon * math.cos(math.radians(lat0)) * KM_PER_DEGREE
+    y = (points[:, 1] - lat0) * KM_PER_DEGREE
+    return x, y
+
+
+def distance_km(geometry, lon, lat):
+    """
+    Расстояние в км от точки до полигона или мультиполигона
+
+    Для точки внутри полигона (с учётом дыр) возвращает 0. Расстояние
+    считается в локальной проекции вокруг точки, поэтому точно на
+    расстояниях до нескольких сотен километров.
+
+    Returns:
+        float или None для пустой геометрии
+    """
+    best = None
+    for polygon in iter_polygons(geometry):
+        crossings = 0
+        for ring in polygon:
+            if not ring or len(ring) < 3:
+                continue
+            x, y = _local_xy(ring, lon, lat)
+            x1, y1, x2, y2 = x[:-1], y[:-1], x[1:], y[1:]
+
+            # Луч из точки (0, 0) вдоль оси X: правило чёт-нечет по всем
+            # кольцам полигона учитывает дыры
+            straddles = (y1 > 0) != (y2 > 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = x1 + (0 - y1) * (x2 - x1) / (y2 - y1)
+            crossings += int(np.count_nonzero(straddles & (x_cross > 0)))
+
+            # Минимальное расстояние до рёбер кольца
+            dx = x2 - x1
+            dy = y2 - y1
+            length2 = dx * dx + dy * dy
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = np.where(length2 > 0, -(x1 * dx + y1 * dy) / length2, 0.0)
+            t = np.clip(t, 0.0, 1.0)
+            edge_distance = float(np.hypot(x1 + t * dx, y1 + t * dy).min())
+            if best is None or edge_distance < best:
+                best = edge_distance
+
+        if crossings % 2 == 1:
+            return 0.0
+    return best
+
+
+def contains_point(geometry, lon, lat):
+    """Лежит ли точка внутри полигона или мультиполигона (с учётом дыр)"""
+    return distance_km(geometry, lon, lat) == 0.0
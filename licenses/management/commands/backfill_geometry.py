@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from licenses import geometry as geo
+from licenses.models import License
+from licenses.versioning import registry_changed
+
+
+GEOMETRY_FIELDS = ['latitude', 'longitude', 'area_km2', 'min_lon', 'min_lat', 'max_lon', 'max_lat', 'updated_at',
+                   'change_seq']
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает центр, площадь и охват полигонов для существующих лицензий'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать все лицензии (по умолчанию - только без рассчитанной площади)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Размер пачки для сохранения (по умолчанию 500)',
+        )
+
+    def handle(self, *args, **options):
+        licenses = License.objects.filter(polygon_data__isnull=False)
+        if not options['all']:
+            licenses = licenses.filter(area_km2__isnull=True)
+        
+        total = licenses.count()
+        self.stdout.write(f'Лицензий для пересчёта: {total}')
+        
+        batch = []
+        updated = 0
+        empty = 0
+        batch_size = max(options['batch_size'], 1)
+        
+        for license in licenses.only('id', 'polygon_data', *GEOMETRY_FIELDS).iterator(chunk_size=batch_size):
+            stats = geo.measure(license.polygon_data)
+            if stats is None:
+                empty += 1
+                continue
+            license.apply_geometry_stats(stats)
+            license.updated_at = timezone.now()
+            license.change_seq = None
+            batch.append(license)
+            if len(batch) >= batch_size:
+                License.objects.bulk_update(batch, GEOMETRY_FIELDS)
+                updated += len(batch)
+                batch = []
+                self.stdout.write(f'  обработано {updated}/{total}')
+        
+        if batch:
+            License.objects.bulk_update(batch, GEOMETRY_FIELDS)
+            updated += len(batch)
+        
+        if updated:
+            registry_changed()
+        
+        self.stdout.write(self.style.SUCCESS(f'Обновлено лицензий: {updated}'))
+        if empty:
+            self.stdout.write(self.style.WARNING(f'Пропущено с пустой геометрией: {empty}'))
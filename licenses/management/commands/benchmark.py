@@ -0,0 +1,277 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from io import StringIO
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from licenses import perf, views
+from licenses.models import License
+from licenses.synthetic import generate_feature_collection, create_documents
+
+BENCHMARKS = [
+    'import_geojson',
+    'update_license_statuses',
+    'licenses_json',
+    'licenses_all_json',
+    'license_detail',
+    'export_excel',
+    'export_pdf',
+]
+
+
+class Rollback(Exception):
+    """Откат транзакции после прогона одного размера реестра"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк импорта, API, экспорта и обновления статусов на синтетическом реестре. '
+        'Все данные создаются в транзакции и откатываются после прогона.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Размеры реестра (по умолчанию 1000 10000 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Повторов для операций только на чтение (по умолчанию 3)',
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            choices=BENCHMARKS,
+            help='Запустить только указанные бенчмарки',
+        )
+        parser.add_argument(
+            '--skip',
+            nargs='+',
+            choices=BENCHMARKS,
+            default=[],
+            help='Пропустить указанные бенчмарки (например, export_pdf на 100k)',
+        )
+        parser.add_argument(
+            '--detail-samples',
+            type=int,
+            default=100,
+            help='Сколько лицензий запрашивать в license_detail (по умолчанию 100)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора синтетического реестра',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='benchmark_results.json',
+            help='Файл для результатов (по умолчанию benchmark_results.json)',
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='Файл с результатами предыдущего релиза для сравнения',
+        )
+
+    def handle(self, *args, **options):
+        if License.objects.exists():
+            self.stdout.write(self.style.WARNING(
+                'В базе уже есть лицензии - результаты будут искажены. '
+                'Рекомендуется запускать бенчмарк на пустой базе.'
+            ))
+
+        enabled = [name for name in (options['only'] or BENCHMARKS) if name not in options['skip']]
+        self.factory = RequestFactory()
+        self.repeat = max(options['repeat'], 1)
+        results = []
+
+        for size in options['sizes']:
+            self.stdout.write(self.style.SUCCESS(f'\n=== Реестр: {size} лицензий ==='))
+            try:
+                with transaction.atomic():
+                    results.extend(self.run_size(size, enabled, options))
+                    raise Rollback()
+            except Rollback:
+                pass
+
+        report = {
+            'meta': self.collect_meta(),
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'\nРезультаты сохранены в {options["output"]}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def run_size(self, size, enabled, options):
+        results = []
+        data = generate_feature_collection(size, seed=options['seed'])
+
+        with tempfile.NamedTemporaryFile('w', suffix='.geojson', encoding='utf-8', delete=False) as f:
+            json.dump(data, f, ensure_ascii=False)
+            geojson_path = f.name
+        del data
+
+        try:
+            if 'import_geojson' in enabled:
+                results.append(self.measure(
+                    'import_geojson', size, 1,
+                    lambda: call_command('import_geojson', geojson_path, stdout=StringIO()),
+                ))
+            else:
+                call_command('import_geojson', geojson_path, stdout=StringIO())
+        finally:
+            os.unlink(geojson_path)
+
+        create_documents(License.objects.only('id', 'license_number').iterator(), seed=options['seed'])
+        user = User.objects.create_user('benchmark', password=None, is_staff=True)
+
+        # Статусы обновляются до бенчмарков API, иначе их выполнит первый же запрос
+        if 'update_license_statuses' in enabled:
+            results.append(self.measure(
+                'update_license_statuses', size, 1,
+                lambda: call_command('update_license_statuses', stdout=StringIO()),
+            ))
+
+        if 'licenses_json' in enabled:
+            results.append(self.measure_view('licenses_json', size, views.licenses_json, '/api/licenses/?page=2&geometry=1'))
+        if 'licenses_all_json' in enabled:
+            results.append(self.measure_view('licenses_all_json', size, views.licenses_all_json, '/api/licenses/all/?geometry=1'))
+        if 'license_detail' in enabled:
+            ids = list(License.objects.order_by('?').values_list('id', flat=True)[:options['detail_samples']])
+
+            def run_details():
+                total = 0
+                for license_id in ids:
+                    request = self.factory.get(f'/api/licenses/{license_id}/')
+                    total += len(views.license_detail(request, license_id).content)
+                return total
+
+            result = self.measure('license_detail', size, self.repeat, run_details)
+            result['calls'] = len(ids)
+            result['median_per_call_ms'] = round(result['median_s'] * 1000 / max(len(ids), 1), 3)
+            results.append(result)
+        if 'export_excel' in enabled:
+            results.append(self.measure_view(
+                'export_excel', size, views.export_licenses_excel, '/api/licenses/export/excel/', user=user,
+            ))
+        if 'export_pdf' in enabled:
+            results.append(self.measure_view(
+                'export_pdf', size, views.export_licenses_pdf, '/api/licenses/export/pdf/', user=user,
+            ))
+        return results
+
+    def measure_view(self, name, size, view, path, user=None):
+        def run():
+            request = self.factory.get(path)
+            if user is not None:
+                request.user = user
+            return len(view(request).content)
+        return self.measure(name, size, self.repeat, run)
+
+    def measure(self, name, size, repeat, func):
+        """
+        Выполняет func repeat раз и собирает время, число SQL-запросов и размер ответа
+
+        func может вернуть количество байт ответа
+        """
+        timings = []
+        queries = 0
+        sql_ms = 0.0
+        response_bytes = None
+        for _ in range(repeat):
+            metrics, token = perf.start_request()
+            try:
+                with connection.execute_wrapper(perf.sql_timer):
+                    started = time.perf_counter()
+                    returned = func()
+                    timings.append(time.perf_counter() - started)
+            finally:
+                perf.finish_request(token)
+            queries = metrics['sql_count']
+            sql_ms = metrics['sql_ms']
+            if isinstance(returned, int):
+                response_bytes = returned
+
+        median = statistics.median(timings)
+        result = {
+            'name': name,
+            'size': size,
+            'runs': repeat,
+            'min_s': round(min(timings), 4),
+            'median_s': round(median, 4),
+            'queries': queries,
+            'sql_s': round(sql_ms / 1000, 4),
+            'rows_per_s': round(size / median, 1) if median else None,
+        }
+        if response_bytes is not None:
+            result['bytes'] = response_bytes
+
+        self.stdout.write(
+            f'  {name:<25} median {result["median_s"]:>9.4f} s   '
+            f'min {result["min_s"]:>9.4f} s   SQL {queries:>7}'
+        )
+        return result
+
+    def collect_meta(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'machine': platform.machine(),
+        }
+
+    def compare(self, path, results):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise CommandError(f'Не удалось прочитать {path}: {e}')
+
+        baseline = {(r['name'], r['size']): r for r in previous.get('results', [])}
+        commit = previous.get('meta', {}).get('commit') or path
+        self.stdout.write(self.style.SUCCESS(f'\n=== Сравнение с {commit} ==='))
+        for result in results:
+            old = baseline.get((result['name'], result['size']))
+            if not old or not old.get('median_s'):
+                continue
+            ratio = result['median_s'] / old['median_s']
+            line = (
+                f'  {result["name"]:<25} {result["size"]:>7}   '
+                f'{old["median_s"]:>9.4f} s -> {result["median_s"]:>9.4f} s   x{ratio:.2f}'
+            )
+            if ratio > 1.1:
+                self.stdout.write(self.style.ERROR(line))
+            elif ratio < 0.9:
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
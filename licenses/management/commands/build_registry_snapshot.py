@@ -0,0 +1,32 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from licenses.snapshots import build_snapshot, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Собирает снимок реестра (JSON со сжатыми вариантами и манифест) для отдачи веб-сервером'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-outdated',
+            action='store_true',
+            help='Собирать, только если снимок отстал от текущей версии данных',
+        )
+
+    def handle(self, *args, **options):
+        manifest = refresh_snapshot() if options['if_outdated'] else build_snapshot()
+        if manifest is None:
+            self.stdout.write(self.style.SUCCESS('Снимок реестра актуален'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок реестра собран в {settings.REGISTRY_SNAPSHOT_ROOT} (версия данных {manifest["version"]})'))
+        for dataset, url in manifest['files'].items():
+            path = os.path.join(str(settings.REGISTRY_SNAPSHOT_ROOT), os.path.basename(url))
+            sizes = [f'{manifest["sizes"][dataset] / 1024:.1f} КБ']
+            for suffix in ('.gz', '.br'):
+                if os.path.exists(path + suffix):
+                    sizes.append(f'{suffix}: {os.path.getsize(path + suffix) / 1024:.1f} КБ')
+            self.stdout.write(f'  {url} ({", ".join(sizes)})')
@@ -0,0 +1,111 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from licenses import geometry as geo
+from licenses.models import License, LicensePolygon
+from licenses.utils import GeoJSONImporter
+from licenses.versioning import registry_changed
+
+
+GEOMETRY_FIELDS = ['polygon_data', 'latitude', 'longitude', 'area_km2',
+                   'min_lon', 'min_lat', 'max_lon', 'max_lat', 'updated_at', 'change_seq']
+
+
+def count_vertices(geometry):
+    return sum(len(ring) for polygon in geo.iter_polygons(geometry) for ring in polygon)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжимает контуры существующих лицензий так же, как импорт: округляет координаты, '
+        'удаляет повторяющиеся и лишние вершины, исправляет замыкание и ориентацию колец'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--precision',
+            type=int,
+            default=settings.GEOMETRY_PRECISION,
+            help=f'Знаков после запятой в координатах (по умолчанию {settings.GEOMETRY_PRECISION})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать экономию, не сохраняя изменения',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Размер пачки для сохранения (по умолчанию 500)',
+        )
+
+    def handle(self, *args, **options):
+        importer = GeoJSONImporter()
+        importer.precision = options['precision']
+        batch_size = max(options['batch_size'], 1)
+
+        totals = {'licenses': 0, 'changed': 0, 'bytes_before': 0, 'bytes_after': 0,
+                  'vertices_before': 0, 'vertices_after': 0}
+        batch = []
+        licenses = License.objects.filter(polygon_data__isnull=False).only('id', *GEOMETRY_FIELDS)
+        for license_obj in licenses.iterator(chunk_size=batch_size):
+            before = json.dumps(license_obj.polygon_data, separators=(',', ':'))
+            parts = importer.split_polygons(license_obj.polygon_data)
+            compacted = importer.assemble_geometry(license_obj.polygon_data, parts) if parts else None
+            after = json.dumps(compacted, separators=(',', ':'))
+
+            totals['licenses'] += 1
+            totals['bytes_before'] += len(before.encode())
+            totals['vertices_before'] += count_vertices(license_obj.polygon_data)
+            totals['bytes_after'] += len(after.encode()) if compacted else 0
+            totals['vertices_after'] += count_vertices(compacted)
+            if after == before:
+                continue
+
+            totals['changed'] += 1
+            license_obj.polygon_data = compacted
+            stats = None
+            for part in parts:
+                stats = geo.combine(stats, part.stats)
+            license_obj.apply_geometry_stats(stats)
+            license_obj.updated_at = timezone.now()
+            license_obj.change_seq = None
+            batch.append((license_obj, parts))
+            if len(batch) >= batch_size:
+                self.save(batch, options['dry_run'])
+                batch = []
+        if batch:
+            self.save(batch, options['dry_run'])
+
+        if totals['changed'] and not options['dry_run']:
+            registry_changed()
+
+        saved = totals['bytes_before'] - totals['bytes_after']
+        percent = saved * 100 / totals['bytes_before'] if totals['bytes_before'] else 0
+        self.stdout.write(f'Лицензий с контуром: {totals["licenses"]}, изменено: {totals["changed"]}')
+        self.stdout.write(f'Вершин: {totals["vertices_before"]} -> {totals["vertices_after"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Объём контуров: {totals["bytes_before"] / 1024:.1f} КБ -> {totals["bytes_after"] / 1024:.1f} КБ '
+            f'(экономия {saved / 1024:.1f} КБ, {percent:.1f}%)'
+        ))
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Режим --dry-run: изменения не сохранены'))
+
+    def save(self, batch, dry_run):
+        if dry_run:
+            return
+        with transaction.atomic():
+            License.objects.bulk_update([license_obj for license_obj, parts in batch], GEOMETRY_FIELDS)
+            # Полигоны лицензии пересоздаются: меняются их координаты и хеши
+            LicensePolygon.objects.filter(license_id__in=[license_obj.id for license_obj, parts in batch]).delete()
+            polygons = []
+            for license_obj, parts in batch:
+                for position, part in enumerate(parts):
+                    part.license = license_obj
+                    part.position = position
+                    polygons.append(part)
+            LicensePolygon.objects.bulk_create(polygons, batch_size=1000)
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from licenses.models import License
+from licenses.overlaps import MIN_AREA_KM2, detect_overlaps, save_overlaps
+
+
+class Command(BaseCommand):
+    help = 'Поиск пересечений контуров лицензий по всему реестру'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'license_numbers',
+            nargs='*',
+            help='Проверить только эти лицензии (по умолчанию - весь реестр)',
+        )
+        parser.add_argument(
+            '--min-area',
+            type=float,
+            default=MIN_AREA_KM2,
+            help=f'Минимальная площадь пересечения, кв.км (по умолчанию {MIN_AREA_KM2})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только вывести найденные пересечения, не сохраняя их',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько крупнейших пересечений вывести (по умолчанию 20)',
+        )
+
+    def handle(self, *args, **options):
+        license_ids = None
+        if options['license_numbers']:
+            found = dict(License.objects.filter(
+                license_number__in=options['license_numbers']).values_list('license_number', 'id'))
+            missing = set(options['license_numbers']) - set(found)
+            if missing:
+                raise CommandError(f'Лицензии не найдены: {", ".join(sorted(missing))}')
+            license_ids = list(found.values())
+
+        started = time.perf_counter()
+        overlaps = detect_overlaps(license_ids, min_area_km2=options['min_area'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Найдено пересечений: {len(overlaps)} ({elapsed:.2f} с)')
+
+        if overlaps and options['limit']:
+            numbers = dict(License.objects.filter(
+                id__in={o.license_a_id for o in overlaps} | {o.license_b_id for o in overlaps},
+            ).values_list('id', 'license_number'))
+            for overlap in sorted(overlaps, key=lambda o: -o.area_km2)[:options['limit']]:
+                self.stdout.write(
+                    f'  {numbers[overlap.license_a_id]} ∩ {numbers[overlap.license_b_id]}: '
+                    f'{overlap.area_km2:.3f} кв.км'
+                )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Режим --dry-run: результаты не сохранены'))
+            return
+        save_overlaps(overlaps, license_ids)
+        self.stdout.write(self.style.SUCCESS('Результаты сохранены'))
@@ -0,0 +1,73 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from licenses.models import License
+from licenses.synthetic import generate_feature_collection, create_documents
+from licenses.utils import GeoJSONImporter
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетический реестр лицензий (GeoJSON файл или записи в базе)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help='Количество лицензий')
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Записать GeoJSON в файл вместо загрузки в базу',
+        )
+        parser.add_argument(
+            '--documents',
+            type=int,
+            default=2,
+            help='Документов на лицензию при загрузке в базу (по умолчанию 2)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора (одинаковый seed - одинаковый реестр)',
+        )
+        parser.add_argument(
+            '--max-vertices',
+            type=int,
+            default=200,
+            help='Максимум вершин в контуре полигона (по умолчанию 200)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count <= 0:
+            raise CommandError('Количество лицензий должно быть положительным')
+        
+        data = generate_feature_collection(
+            count,
+            seed=options['seed'],
+            max_vertices=max(options['max_vertices'], 20),
+        )
+        
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Записано объектов: {count} -> {options["output"]}'))
+            return
+        
+        self.stdout.write(f'Загрузка {count} синтетических лицензий в базу...')
+        importer = GeoJSONImporter()
+        result = importer.import_from_file(data)
+        
+        numbers = [
+            importer.parse_description(feature['properties']['description'])['license_number']
+            for feature in data['features']
+        ]
+        documents = 0
+        # Пачками, чтобы не упереться в лимит параметров запроса
+        for start in range(0, len(numbers), 5000):
+            licenses = License.objects.filter(
+                license_number__in=numbers[start:start + 5000]
+            ).only('id', 'license_number')
+            documents += create_documents(licenses, per_license=options['documents'], seed=options['seed'] + start)
+        
+        self.stdout.write(self.style.SUCCESS(f'Создано лицензий: {result["imported"]}'))
+        self.stdout.write(self.style.SUCCESS(f'Обновлено: {result["updated"]}'))
+        self.stdout.write(self.style.WARNING(f'Пропущено: {result["skipped"]}'))
+        self.stdout.write(self.style.SUCCESS(f'Создано документов: {documents}'))
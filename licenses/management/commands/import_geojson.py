@@ -1,43 +1,224 @@
+import hashlib
 import json
-from django.core.management.base import BaseCommand
-from licenses.utils import GeoJSONImporter
+import os
+from io import BytesIO
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from licenses.archives import archive_errors, is_archive, load_archive
+from licenses.models import ImportRun
+from licenses.profiling import ImportProfile, stage
+from licenses.snapshots import refresh_snapshot
+from licenses.utils import IMPORT_BATCH_SIZE, GeoJSONImporter
 
 
 class Command(BaseCommand):
     help = 'Импорт лицензий из GeoJSON файла'
 
     def add_arguments(self, parser):
-        parser.add_argument('geojson_file', type=str, help='Путь к GeoJSON файлу')
+        parser.add_argument(
+            'geojson_file',
+            type=str,
+            nargs='?',
+            help='Путь к GeoJSON файлу или ZIP-архиву GeoJSON файлов '
+                 '(при --resume по умолчанию - файл прерванного запуска)',
+        )
+        parser.add_argument(
+            '--resume',
+            type=int,
+            metavar='RUN_ID',
+            help='Продолжить прерванный импорт с последней зафиксированной пачки',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f'Объектов в одной транзакции (по умолчанию {IMPORT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--check-overlaps',
+            action='store_true',
+            help='Проверить пересечения импортированных контуров с реестром',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, какие лицензии будут созданы, изменены или отсутствуют в файле',
+        )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Замерить этапы импорта (время, SQL-запросы, пиковая память) и вывести сводку',
+        )
+        parser.add_argument(
+            '--profile-output',
+            metavar='FILE',
+            help='Сохранить сводку профиля в JSON файл (включает --profile)',
+        )
+        parser.add_argument(
+            '--no-trace-memory',
+            action='store_true',
+            help='Не замерять пиковую память при профилировании (tracemalloc искажает времена этапов)',
+        )
 
     def handle(self, *args, **options):
-        geojson_file = options['geojson_file']
+        run = None
+        if options['resume']:
+            try:
+                run = ImportRun.objects.get(pk=options['resume'])
+            except ImportRun.DoesNotExist:
+                raise CommandError(f'Запуск импорта #{options["resume"]} не найден')
+            if run.status == 'completed':
+                self.stdout.write(self.style.WARNING(f'Импорт #{run.pk} уже завершён'))
+                return
+        geojson_file = options['geojson_file'] or (run.source if run else None)
+        if not geojson_file:
+            raise CommandError('Укажите путь к GeoJSON файлу')
         
         self.stdout.write(self.style.SUCCESS(f'Загрузка данных из {geojson_file}...'))
         
+        profile = None
+        if options['profile'] or options['profile_output']:
+            profile = ImportProfile(trace_memory=not options['no_trace_memory'])
+        if profile is not None:
+            profile.start()
         try:
-            with open(geojson_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with stage(profile, 'read'):
+                with open(geojson_file, 'rb') as f:
+                    raw = f.read()
+                digest = hashlib.sha256(raw).hexdigest()
+            members = []
+            if is_archive(geojson_file):
+                try:
+                    with stage(profile, 'read'):
+                        data, members = load_archive(BytesIO(raw))
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.print_members(members)
+            else:
+                with stage(profile, 'json'):
+                    data = json.loads(raw.decode('utf-8'))
             
             features = data.get('features', [])
             self.stdout.write(f'Найдено объектов: {len(features)}')
             
-            importer = GeoJSONImporter()
-            result = importer.import_from_file(data)
+            importer = GeoJSONImporter(check_overlaps=options['check_overlaps'], profile=profile)
+            if options['dry_run']:
+                self.print_diff(importer.diff(data))
+                return
+            
+            if run is None:
+                run = ImportRun.objects.create(
+                    source=os.path.abspath(geojson_file),
+                    source_size=len(raw),
+                    source_hash=digest,
+                    total=len(features),
+                    batch_size=max(options['batch_size'], 1),
+                )
+                self.stdout.write(f'Запуск импорта #{run.pk}')
+            else:
+                if run.source_hash != digest:
+                    raise CommandError(
+                        f'Файл {geojson_file} отличается от импортировавшегося в запуске #{run.pk}')
+                run.status = 'running'
+                run.error_message = ''
+                run.save(update_fields=['status', 'error_message', 'updated_at'])
+                self.stdout.write(f'Продолжение импорта #{run.pk} с объекта {run.next_index + 1} из {run.total}')
+            
+            try:
+                result = importer.import_from_file(data, run=run)
+            except BaseException as e:
+                # Прогресс последней зафиксированной пачки уже сохранён в run
+                run.status = 'failed'
+                run.error_message = str(e) or type(e).__name__
+                run.save(update_fields=['status', 'error_message', 'updated_at'])
+                self.stdout.write(self.style.ERROR(
+                    f'Импорт прерван после объекта {run.next_index} из {run.total}. '
+                    f'Продолжить: python manage.py import_geojson --resume {run.pk}'
+                ))
+                raise
+            run.status = 'completed'
+            run.finished_at = timezone.now()
+            run.save(update_fields=['status', 'finished_at', 'updated_at'])
+            result['errors'] = archive_errors(members) + result['errors']
             
             self.stdout.write(self.style.SUCCESS(f'\n=== Итоги импорта ==='))
             self.stdout.write(self.style.SUCCESS(f'Создано новых: {result["imported"]}'))
             self.stdout.write(self.style.SUCCESS(f'Обновлено: {result["updated"]}'))
+            self.stdout.write(f'Без изменений: {result["unchanged"]}')
             self.stdout.write(self.style.WARNING(f'Пропущено: {result["skipped"]}'))
             self.stdout.write(self.style.SUCCESS(f'Всего обработано: {result["total"]}'))
             
+            if 'overlaps' in result:
+                overlaps = result['overlaps']
+                style = self.style.WARNING if overlaps else self.style.SUCCESS
+                self.stdout.write(style(f'Пересечений с реестром: {len(overlaps)}'))
+                for overlap in overlaps[:20]:
+                    self.stdout.write(style(
+                        f'  - {overlap["license_a"]} ∩ {overlap["license_b"]}: {overlap["area_km2"]} кв.км'
+                    ))
+            
             if result['errors']:
                 self.stdout.write(self.style.WARNING(f'\nВозникли предупреждения:'))
                 for error in result['errors']:
                     self.stdout.write(self.style.WARNING(f'  - {error}'))
+            
+            if settings.REGISTRY_SNAPSHOTS and refresh_snapshot():
+                self.stdout.write(self.style.SUCCESS('Снимок реестра обновлён'))
+            
+            if profile is not None:
+                profile.stop()
+                self.print_profile(profile, geojson_file, len(raw), options['profile_output'])
                     
+        except CommandError:
+            raise
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f'Файл не найден: {geojson_file}'))
         except json.JSONDecodeError:
             self.stdout.write(self.style.ERROR('Файл не является корректным JSON'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Ошибка при обработке файла: {str(e)}'))
+        finally:
+            if profile is not None:
+                profile.stop()
+
+    def print_profile(self, profile, source, size, output=None):
+        self.stdout.write(self.style.SUCCESS('\n=== Профиль импорта ==='))
+        for line in profile.format_lines():
+            self.stdout.write(line)
+        if output:
+            report = profile.report()
+            report.update({
+                'source': os.path.abspath(source),
+                'source_size': size,
+                'created_at': timezone.now().isoformat(),
+            })
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Профиль сохранён в {output}'))
+
+    def print_members(self, members):
+        self.stdout.write(f'Файлов в архиве: {len(members)}')
+        for member in members:
+            if member['error']:
+                self.stdout.write(self.style.ERROR(f'  - {member["name"]}: {member["error"]}'))
+            else:
+                self.stdout.write(f'  - {member["name"]}: объектов {member["features"]}')
+
+    def print_diff(self, diff):
+        self.stdout.write(self.style.SUCCESS('\n=== Сравнение с реестром (без записи) ==='))
+        for key, label, style in (
+            ('new', 'Новые', self.style.SUCCESS),
+            ('changed', 'Изменённые', self.style.WARNING),
+            ('unchanged', 'Без изменений', self.style.SUCCESS),
+            ('removed', 'Нет в файле', self.style.ERROR),
+        ):
+            numbers = diff[key]
+            self.stdout.write(style(f'{label}: {len(numbers)}'))
+            if key != 'unchanged':
+                for number in numbers[:20]:
+                    self.stdout.write(f'  - {number}')
+                if len(numbers) > 20:
+                    self.stdout.write(f'  ... и ещё {len(numbers) - 20}')
+        if diff['skipped']:
+            self.stdout.write(self.style.WARNING(f'Объектов без номера лицензии: {diff["skipped"]}'))
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from licenses.snapshots import refresh_snapshot
+from licenses.spreadsheets import TABLE_BATCH_SIZE, RegistryTableImporter
+
+
+class Command(BaseCommand):
+    help = 'Импорт атрибутов лицензий из таблицы Excel (.xlsx) или CSV в формате выгрузки реестра'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table_file', type=str, help='Путь к файлу .xlsx или .csv')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TABLE_BATCH_SIZE,
+            help=f'Строк в одной транзакции (по умолчанию {TABLE_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        table_file = options['table_file']
+        self.stdout.write(self.style.SUCCESS(f'Загрузка данных из {table_file}...'))
+
+        importer = RegistryTableImporter(batch_size=max(options['batch_size'], 1))
+        started = time.perf_counter()
+        try:
+            with open(table_file, 'rb') as f:
+                result = importer.import_file(f, table_file)
+        except FileNotFoundError:
+            raise CommandError(f'Файл не найден: {table_file}')
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Итоги импорта ({elapsed:.2f} с) ==='))
+        self.stdout.write(self.style.SUCCESS(f'Создано новых: {result["imported"]}'))
+        self.stdout.write(self.style.SUCCESS(f'Обновлено: {result["updated"]}'))
+        self.stdout.write(f'Без изменений: {result["unchanged"]}')
+        self.stdout.write(self.style.WARNING(f'Пропущено: {result["skipped"]}'))
+        self.stdout.write(self.style.SUCCESS(f'Всего строк: {result["total"]}'))
+
+        if result['errors']:
+            self.stdout.write(self.style.WARNING('\nВозникли предупреждения:'))
+            for error in result['errors']:
+                self.stdout.write(self.style.WARNING(f'  - {error}'))
+
+        if settings.REGISTRY_SNAPSHOTS and refresh_snapshot():
+            self.stdout.write(self.style.SUCCESS('Снимок реестра обновлён'))
@@ -0,0 +1,47 @@
+import json
+from django.core.management.base import BaseCommand
+from licenses import perf
+
+
+class Command(BaseCommand):
+    help = 'Отчёт о производительности запросов (перцентили времени, SQL, размер ответа)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько самых медленных представлений показать (по умолчанию 20)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести отчёт в формате JSON',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Сбросить накопленную статистику после вывода отчёта',
+        )
+
+    def handle(self, *args, **options):
+        report = perf.build_report()[:options['limit']]
+        
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        elif not report:
+            self.stdout.write(self.style.WARNING('Статистика пока пуста'))
+        else:
+            header = f'{"Представление":<40} {"N":>6} {"p50":>8} {"p95":>8} {"p99":>8} {"SQL":>6} {"SQL p95":>8} {"JSON p95":>9} {"Байт":>10}'
+            self.stdout.write(self.style.SUCCESS(header))
+            self.stdout.write('-' * len(header))
+            for row in report:
+                self.stdout.write(
+                    f'{row["view"][:40]:<40} {row["count"]:>6} {row["p50_ms"]:>8} {row["p95_ms"]:>8} '
+                    f'{row["p99_ms"]:>8} {row["avg_sql_count"]:>6} {row["p95_sql_ms"]:>8} '
+                    f'{row["p95_serialize_ms"]:>9} {row["avg_bytes"]:>10}'
+                )
+        
+        if options['reset']:
+            perf.rolling_stats.reset()
+            self.stdout.write(self.style.SUCCESS('Статистика сброшена'))
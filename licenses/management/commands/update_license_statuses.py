@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from licenses.models import License
+from licenses.snapshots import refresh_snapshot
+from licenses.sync import DELETION_LOG_DAYS, prune_deletion_log
 from datetime import date
 
 
@@ -32,7 +35,7 @@ class Command(BaseCommand):
         for license in active_licenses:
             if license.expiry_date and license.expiry_date < today:
                 license.status = 'expired'
-                license.save(update_fields=['status'])
+                license.save(update_fields=['status', 'updated_at'])
                 updated_count += 1
                 
                 if verbose:
@@ -69,3 +72,12 @@ class Command(BaseCommand):
         self.stdout.write(f'  Приостановленные: {stats["suspended"]}')
         self.stdout.write(f'  Прекращенные: {stats["terminated"]}')
         self.stdout.write(f'  Всего: {all_licenses.count()}')
+
+        # Журнал удалений нужен только для синхронизации клиентов (?since=)
+        pruned = prune_deletion_log()
+        if pruned:
+            self.stdout.write(f'\nУдалено записей журнала удалений старше {DELETION_LOG_DAYS} дн.: {pruned}')
+
+        # Снимок реестра для веб-сервера - с новыми статусами
+        if settings.REGISTRY_SNAPSHOTS and refresh_snapshot():
+            self.stdout.write(self.style.SUCCESS('Снимок реестра обновлён'))
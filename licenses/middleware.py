@@ -0,0 +1,69 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import perf
+
+logger = logging.getLogger('licenses.perf')
+
+
+class PerformanceMiddleware:
+    """
+    Инструментирование запросов: количество и время SQL, время этапов
+    (perf.stage), размер ответа.
+
+    Результаты попадают в заголовок Server-Timing, в лог 'licenses.perf'
+    (одна JSON-строка на запрос) и в скользящую статистику perf.rolling_stats,
+    которую читают команда perf_report и страница в админке.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics, token = perf.start_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(perf.sql_timer))
+                response = self.get_response(request)
+        finally:
+            perf.finish_request(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+        view_name = match.view_name
+
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        serialize_ms = metrics['stages'].get('serialize', 0.0)
+
+        timings = [f'sql;dur={metrics["sql_ms"]:.1f};desc="{metrics["sql_count"]} queries"']
+        timings += [f'{name};dur={ms:.1f}' for name, ms in metrics['stages'].items()]
+        timings.append(f'total;dur={total_ms:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+
+        logger.info(json.dumps({
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'sql_count': metrics['sql_count'],
+            'sql_ms': round(metrics['sql_ms'], 2),
+            'stages': {name: round(ms, 2) for name, ms in metrics['stages'].items()},
+            'bytes': size,
+        }, ensure_ascii=False))
+
+        perf.rolling_stats.add(view_name, (
+            total_ms, metrics['sql_count'], metrics['sql_ms'], serialize_ms, size,
+        ))
+        return response
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0002_license_polygon_data_alter_license_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='license',
+            name='area_km2',
+            field=models.FloatField(blank=True, null=True, verbose_name='Площадь полигона, кв.км'),
+        ),
+        migrations.AddField(
+            model_name='license',
+            name='max_lat',
+            field=models.FloatField(blank=True, null=True, verbose_name='Охват: макс. широта'),
+        ),
+        migrations.AddField(
+            model_name='license',
+            name='max_lon',
+            field=models.FloatField(blank=True, null=True, verbose_name='Охват: макс. долгота'),
+        ),
+        migrations.AddField(
+            model_name='license',
+            name='min_lat',
+            field=models.FloatField(blank=True, null=True, verbose_name='Охват: мин. широта'),
+        ),
+        migrations.AddField(
+            model_name='license',
+            name='min_lon',
+            field=models.FloatField(blank=True, null=True, verbose_name='Охват: мин. долгота'),
+        ),
+    ]
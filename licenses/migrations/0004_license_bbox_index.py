@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+BBOX_GIST_SQL = (
+    'CREATE INDEX IF NOT EXISTS license_bbox_gist ON licenses_license '
+    'USING gist (box(point(min_lon, min_lat), point(max_lon, max_lat)))'
+)
+
+
+def create_gist_index(apps, schema_editor):
+    # В PostgreSQL пересечение прямоугольников ищется через GiST-индекс
+    # по встроенному типу box (PostGIS не требуется)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(BBOX_GIST_SQL)
+
+
+def drop_gist_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS license_bbox_gist')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0003_license_geometry_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='license',
+            index=models.Index(fields=['min_lat', 'max_lat', 'min_lon', 'max_lon'], name='license_bbox_idx'),
+        ),
+        migrations.RunPython(create_gist_index, drop_gist_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0004_license_bbox_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicenseOverlap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area_km2', models.FloatField(verbose_name='Площадь пересечения, кв.км')),
+                ('share_a', models.FloatField(blank=True, null=True, verbose_name='Доля площади лицензии А')),
+                ('share_b', models.FloatField(blank=True, null=True, verbose_name='Доля площади лицензии Б')),
+                ('geometry', models.JSONField(blank=True, null=True, verbose_name='Контур пересечения (GeoJSON)')),
+                ('detected_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата обнаружения')),
+                ('license_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overlaps_as_a', to='licenses.license', verbose_name='Лицензия А')),
+                ('license_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overlaps_as_b', to='licenses.license', verbose_name='Лицензия Б')),
+            ],
+            options={
+                'verbose_name': 'Пересечение лицензий',
+                'verbose_name_plural': 'Пересечения лицензий',
+                'ordering': ['-area_km2'],
+                'constraints': [models.UniqueConstraint(fields=('license_a', 'license_b'), name='unique_license_overlap')],
+            },
+        ),
+    ]
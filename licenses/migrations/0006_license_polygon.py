@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:58
+
+import hashlib
+
+import django.db.models.deletion
+import numpy as np
+from django.db import migrations, models
+
+
+# Копии licenses.geometry.iter_polygons и polygon_hash: миграция должна
+# записывать те же хеши, что и при её создании, как бы ни менялся код
+# приложения. Хеш совпадает с тем, что считает импорт; если алгоритм
+# хеша изменится, старые хеши пересчитывает новая миграция данных
+
+def iter_polygons(geometry):
+    if not geometry or not geometry.get('coordinates'):
+        return []
+    geom_type = geometry.get('type', 'Polygon')
+    if geom_type == 'MultiPolygon':
+        return [polygon for polygon in geometry['coordinates'] if polygon]
+    if geom_type == 'Polygon':
+        return [geometry['coordinates']]
+    return []
+
+
+def polygon_hash(polygon):
+    digest = hashlib.sha256()
+    for ring in polygon or []:
+        if not ring or len(ring) < 3:
+            continue
+        points = np.round(np.asarray(ring, dtype='<f8')[:, :2], 9) + 0.0
+        if not np.array_equal(points[0], points[-1]):
+            points = np.vstack([points, points[:1]])
+        digest.update(len(points).to_bytes(8, 'little'))
+        digest.update(points.tobytes())
+    return digest.hexdigest()
+
+
+def split_polygons(apps, schema_editor):
+    # Раскладываем контуры существующих лицензий по полигонам. Повторы,
+    # накопленные прежними повторными импортами, удаляются из polygon_data
+    from licenses import geometry as geo
+
+    License = apps.get_model('licenses', 'License')
+    LicensePolygon = apps.get_model('licenses', 'LicensePolygon')
+    batch = []
+    licenses = License.objects.filter(polygon_data__isnull=False).only('id', 'polygon_data')
+    for license_obj in licenses.iterator(chunk_size=500):
+        unique = []
+        seen = set()
+        for polygon in iter_polygons(license_obj.polygon_data):
+            content_hash = polygon_hash(polygon)
+            if content_hash in seen:
+                continue
+            seen.add(content_hash)
+            stats = geo.measure({'type': 'Polygon', 'coordinates': polygon})
+            unique.append(polygon)
+            batch.append(LicensePolygon(
+                license_id=license_obj.id,
+                position=len(unique) - 1,
+                coordinates=polygon,
+                content_hash=content_hash,
+                area_km2=stats['area_km2'] if stats else None,
+                min_lon=stats['bbox'][0] if stats else None,
+                min_lat=stats['bbox'][1] if stats else None,
+                max_lon=stats['bbox'][2] if stats else None,
+                max_lat=stats['bbox'][3] if stats else None,
+            ))
+        if len(unique) < len(iter_polygons(license_obj.polygon_data)):
+            geometry = {'type': 'MultiPolygon', 'coordinates': unique}
+            stats = geo.measure(geometry)
+            fields = {'polygon_data': geometry}
+            if stats:
+                fields.update(
+                    longitude=round(stats['center'][0], 6),
+                    latitude=round(stats['center'][1], 6),
+                    area_km2=stats['area_km2'],
+                    min_lon=stats['bbox'][0], min_lat=stats['bbox'][1],
+                    max_lon=stats['bbox'][2], max_lat=stats['bbox'][3],
+                )
+            License.objects.filter(id=license_obj.id).update(**fields)
+        if len(batch) >= 1000:
+            LicensePolygon.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        LicensePolygon.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0005_license_overlap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicensePolygon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0, verbose_name='Порядковый номер в контуре')),
+                ('coordinates', models.JSONField(verbose_name='Кольца полигона (GeoJSON)')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='Хеш содержимого')),
+                ('area_km2', models.FloatField(blank=True, null=True, verbose_name='Площадь, кв.км')),
+                ('min_lon', models.FloatField(blank=True, null=True, verbose_name='Охват: мин. долгота')),
+                ('min_lat', models.FloatField(blank=True, null=True, verbose_name='Охват: мин. широта')),
+                ('max_lon', models.FloatField(blank=True, null=True, verbose_name='Охват: макс. долгота')),
+                ('max_lat', models.FloatField(blank=True, null=True, verbose_name='Охват: макс. широта')),
+                ('license', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='polygons', to='licenses.license', verbose_name='Лицензия')),
+            ],
+            options={
+                'verbose_name': 'Полигон лицензии',
+                'verbose_name_plural': 'Полигоны лицензий',
+                'ordering': ['license', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('license', 'content_hash'), name='unique_license_polygon')],
+            },
+        ),
+        migrations.RunPython(split_polygons, migrations.RunPython.noop),
+    ]
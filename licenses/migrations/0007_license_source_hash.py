@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0006_license_polygon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='license',
+            name='source_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хеш источника'),
+        ),
+    ]
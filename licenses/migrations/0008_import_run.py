@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0007_license_source_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, verbose_name='Файл')),
+                ('source_size', models.BigIntegerField(blank=True, null=True, verbose_name='Размер файла, байт')),
+                ('source_hash', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 файла')),
+                ('status', models.CharField(choices=[('running', 'Выполняется'), ('completed', 'Завершён'), ('failed', 'Ошибка')], default='running', max_length=20, verbose_name='Статус')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Объектов в файле')),
+                ('next_index', models.PositiveIntegerField(default=0, verbose_name='Обработано объектов')),
+                ('batch_size', models.PositiveIntegerField(default=500, verbose_name='Размер пачки')),
+                ('imported', models.PositiveIntegerField(default=0, verbose_name='Создано')),
+                ('updated', models.PositiveIntegerField(default=0, verbose_name='Обновлено')),
+                ('unchanged', models.PositiveIntegerField(default=0, verbose_name='Без изменений')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='Пропущено')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Предупреждения и ошибки')),
+                ('error_message', models.TextField(blank=True, verbose_name='Причина остановки')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Начат')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Последняя контрольная точка')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершён')),
+            ],
+            options={
+                'verbose_name': 'Запуск импорта',
+                'verbose_name_plural': 'Запуски импорта',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0008_import_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicenseDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('license_id', models.BigIntegerField(verbose_name='ID лицензии')),
+                ('license_number', models.CharField(max_length=100, verbose_name='Номер лицензии')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удалённая лицензия',
+                'verbose_name_plural': 'Удалённые лицензии',
+                'ordering': ['-deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='license',
+            index=models.Index(fields=['updated_at'], name='license_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:02
+
+import time
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    # Начинаем с отметки времени, чтобы версия не повторила значения,
+    # которые раньше хранились только в кеше
+    DataVersion = apps.get_model('licenses', 'DataVersion')
+    DataVersion.objects.get_or_create(pk=1, defaults={'value': int(time.time() * 1000)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0009_license_deletion_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия данных',
+                'verbose_name_plural': 'Версия данных',
+            },
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
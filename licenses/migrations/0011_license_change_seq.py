@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:18
+
+from django.db import migrations, models
+
+
+def stamp_existing(apps, schema_editor):
+    # Существующие лицензии относятся к текущей версии данных
+    DataVersion = apps.get_model('licenses', 'DataVersion')
+    License = apps.get_model('licenses', 'License')
+    version = DataVersion.objects.values_list('value', flat=True).filter(pk=1).first()
+    if version is not None:
+        License.objects.update(change_seq=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0010_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='license',
+            name='change_seq',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Номер изменения'),
+        ),
+        migrations.RunPython(stamp_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:21
+
+from django.db import migrations, models
+
+
+def start_deletion_log(apps, schema_editor):
+    # Записи журнала до миграции без номеров: синхронизация от более ранних
+    # версий (и от отметок времени прежних клиентов) отдаёт весь реестр
+    DataVersion = apps.get_model('licenses', 'DataVersion')
+    LicenseDeletion = apps.get_model('licenses', 'LicenseDeletion')
+    version = DataVersion.objects.values_list('value', flat=True).filter(pk=1).first()
+    if version is not None:
+        DataVersion.objects.filter(pk=1).update(pruned_value=version)
+        LicenseDeletion.objects.update(change_seq=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0011_license_change_seq'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='license',
+            name='license_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='dataversion',
+            name='pruned_value',
+            field=models.BigIntegerField(default=0, verbose_name='Журнал удалений очищен до версии'),
+        ),
+        migrations.AddField(
+            model_name='licensedeletion',
+            name='change_seq',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Номер изменения'),
+        ),
+        migrations.RunPython(start_deletion_log, migrations.RunPython.noop),
+    ]
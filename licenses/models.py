@@ -1,5 +1,60 @@
+from datetime import date
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from licenses.versioning import registry_changed
+
+
+class LicenseQuerySet(models.QuerySet):
+    """
+    QuerySet лицензий с массовыми операциями
+    """
+
+    def expire_overdue(self):
+        """
+        Переводит в статус 'expired' все действующие лицензии с истекшим сроком
+        одним UPDATE-запросом (вместо сохранения каждой записи по отдельности)
+
+        Returns:
+            количество обновлённых лицензий
+        """
+        updated = self.filter(status='active', expiry_date__lt=date.today()).update(
+            status='expired', updated_at=timezone.now(), change_seq=None)
+        if updated:
+            registry_changed()
+        return updated
+
+    def in_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """
+        Лицензии, охват которых пересекается с прямоугольником карты
+
+        Если min_lon > max_lon, прямоугольник пересекает 180-й меридиан
+        (Чукотка) и проверяется как два прямоугольника. Лицензии без
+        полигона отбираются по точке latitude/longitude.
+        """
+        from django.db import connection
+
+        if min_lon > max_lon:
+            return self.in_bbox(min_lon, min_lat, 180.0, max_lat) | self.in_bbox(-180.0, min_lat, max_lon, max_lat)
+
+        point_filter = models.Q(
+            min_lon__isnull=True,
+            longitude__gte=min_lon, longitude__lte=max_lon,
+            latitude__gte=min_lat, latitude__lte=max_lat,
+        )
+        if connection.vendor == 'postgresql':
+            # Выражение совпадает с GiST-индексом license_bbox_gist (миграция 0004)
+            box_match = self.extra(
+                where=['box(point(min_lon, min_lat), point(max_lon, max_lat)) && box(point(%s, %s), point(%s, %s))'],
+                params=[min_lon, min_lat, max_lon, max_lat],
+            )
+            return box_match | self.filter(point_filter)
+        return self.filter(
+            models.Q(min_lon__lte=max_lon, max_lon__gte=min_lon, min_lat__lte=max_lat, max_lat__gte=min_lat)
+            | point_filter
+        )
 
 
 class License(models.Model):
@@ -17,6 +72,13 @@ class License(models.Model):
     # Полигон (контур лицензии) в формате GeoJSON
     polygon_data = models.JSONField(verbose_name="Данные полигона (GeoJSON)", null=True, blank=True)
     
+    # Вычисляется по полигону (см. licenses.geometry.measure)
+    area_km2 = models.FloatField(verbose_name="Площадь полигона, кв.км", null=True, blank=True)
+    min_lon = models.FloatField(verbose_name="Охват: мин. долгота", null=True, blank=True)
+    min_lat = models.FloatField(verbose_name="Охват: мин. широта", null=True, blank=True)
+    max_lon = models.FloatField(verbose_name="Охват: макс. долгота", null=True, blank=True)
+    max_lat = models.FloatField(verbose_name="Охват: макс. широта", null=True, blank=True)
+    
     # Информация о территории
     region = models.CharField(max_length=200, verbose_name="Регион")
     area = models.CharField(max_length=300, verbose_name="Участок недр", blank=True)
@@ -42,14 +104,37 @@ class License(models.Model):
     
     description = models.TextField(verbose_name="Описание", blank=True)
     
+    # Хеш объектов GeoJSON, из которых лицензия загружена последним импортом
+    # (см. GeoJSONImporter.plan); совпадение означает, что загружать нечего
+    source_hash = models.CharField(max_length=64, verbose_name="Хеш источника", blank=True, editable=False)
+    
+    # Версия данных, в которой лицензия изменилась последний раз. Пустое
+    # значение - изменение ещё не учтено: номер проставляет
+    # licenses.versioning.bump_data_version после фиксации транзакции
+    change_seq = models.BigIntegerField(
+        verbose_name="Номер изменения", null=True, blank=True, db_index=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания записи")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления записи")
+
+    objects = LicenseQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Лицензия"
         verbose_name_plural = "Лицензии"
         ordering = ['-created_at']
+        indexes = [
+            # Запросы по охвату карты (?bbox=), см. LicenseQuerySet.in_bbox
+            models.Index(fields=['min_lat', 'max_lat', 'min_lon', 'max_lon'], name='license_bbox_idx'),
+        ]
     
+    def save(self, *args, **kwargs):
+        self.change_seq = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            kwargs['update_fields'] = {*update_fields, 'change_seq'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         # Извлекаем вид лицензии (последние 2 символа после пробела)
         license_type_code = ""
@@ -62,20 +147,166 @@ class License(models.Model):
         else:
             return f"{self.license_number} - {self.owner}"
 
+    def apply_geometry_stats(self, stats):
+        """
+        Записывает в поля модели результат licenses.geometry.measure():
+        центр, площадь и охват полигона
+        """
+        if not stats:
+            self.latitude = None
+            self.longitude = None
+            self.area_km2 = None
+            self.min_lon = self.min_lat = self.max_lon = self.max_lat = None
+            return
+        self.longitude = round(stats['center'][0], 6)
+        self.latitude = round(stats['center'][1], 6)
+        self.area_km2 = stats['area_km2']
+        self.min_lon, self.min_lat, self.max_lon, self.max_lat = stats['bbox']
+
+    def geometry_stats(self):
+        """
+        Сохранённые центр, площадь и охват в формате licenses.geometry.measure()
+        или None, если они ещё не рассчитаны
+        """
+        if self.area_km2 is None or self.latitude is None or self.min_lon is None:
+            return None
+        return {
+            'center': [float(self.longitude), float(self.latitude)],
+            'area_km2': self.area_km2,
+            'bbox': [self.min_lon, self.min_lat, self.max_lon, self.max_lat],
+        }
+
     def update_status_if_expired(self):
         """
         Проверяет и обновляет статус лицензии, если срок действия истек
         """
-        from datetime import date
-        
         if self.expiry_date and self.expiry_date < date.today():
             if self.status == 'active':
                 self.status = 'expired'
-                self.save(update_fields=['status'])
+                self.save(update_fields=['status', 'updated_at'])
         
         return self.status
 
 
+class LicensePolygon(models.Model):
+    """
+    Отдельный полигон контура лицензии
+
+    License.polygon_data хранит весь контур одним MultiPolygon для карты,
+    а здесь - каждый полигон с хешем содержимого, площадью и охватом.
+    По хешу повторный импорт того же полигона распознаётся без сравнения
+    координат и не дублирует его в контуре.
+    """
+    license = models.ForeignKey(
+        License,
+        on_delete=models.CASCADE,
+        related_name='polygons',
+        verbose_name="Лицензия"
+    )
+    position = models.PositiveIntegerField(default=0, verbose_name="Порядковый номер в контуре")
+    coordinates = models.JSONField(verbose_name="Кольца полигона (GeoJSON)")
+    content_hash = models.CharField(max_length=64, verbose_name="Хеш содержимого")
+    area_km2 = models.FloatField(verbose_name="Площадь, кв.км", null=True, blank=True)
+    min_lon = models.FloatField(verbose_name="Охват: мин. долгота", null=True, blank=True)
+    min_lat = models.FloatField(verbose_name="Охват: мин. широта", null=True, blank=True)
+    max_lon = models.FloatField(verbose_name="Охват: макс. долгота", null=True, blank=True)
+    max_lat = models.FloatField(verbose_name="Охват: макс. широта", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Полигон лицензии"
+        verbose_name_plural = "Полигоны лицензий"
+        ordering = ['license', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['license', 'content_hash'], name='unique_license_polygon'),
+        ]
+
+    def __str__(self):
+        return f"{self.license_id} #{self.position}"
+
+    @classmethod
+    def build(cls, polygon, stats, **kwargs):
+        """
+        Несохранённый полигон с хешем и характеристиками
+
+        Args:
+            polygon: список колец GeoJSON
+            stats: результат licenses.geometry.measure() для этого полигона
+        """
+        from licenses import geometry as geo
+
+        obj = cls(coordinates=polygon, content_hash=geo.polygon_hash(polygon), **kwargs)
+        if stats:
+            obj.area_km2 = stats['area_km2']
+            obj.min_lon, obj.min_lat, obj.max_lon, obj.max_lat = stats['bbox']
+        return obj
+
+
+class LicenseDeletion(models.Model):
+    """
+    Журнал удалённых лицензий
+
+    Запись создаётся при удалении лицензии (сигнал post_delete) в той же
+    транзакции. По журналу API синхронизации (?since=) сообщает клиентам
+    с локальной копией реестра, какие лицензии убрать. Записи старше
+    DELETION_LOG_DAYS удаляются командой update_license_statuses.
+    """
+    license_id = models.BigIntegerField(verbose_name="ID лицензии")
+    license_number = models.CharField(max_length=100, verbose_name="Номер лицензии")
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата удаления")
+    # Версия данных, в которой лицензия удалена (как License.change_seq)
+    change_seq = models.BigIntegerField(
+        verbose_name="Номер изменения", null=True, blank=True, db_index=True, editable=False)
+
+    class Meta:
+        verbose_name = "Удалённая лицензия"
+        verbose_name_plural = "Удалённые лицензии"
+        ordering = ['-deleted_at']
+
+    def __str__(self):
+        return f"{self.license_number} (#{self.license_id})"
+
+
+class ImportRun(models.Model):
+    """
+    Запуск импорта GeoJSON с контрольными точками
+
+    Объекты файла обрабатываются пачками, каждая - в своей транзакции.
+    После фиксации пачки next_index указывает на первый необработанный
+    объект, поэтому прерванный импорт продолжается с этого места
+    (import_geojson --resume <id>).
+    """
+    STATUS_CHOICES = [
+        ('running', 'Выполняется'),
+        ('completed', 'Завершён'),
+        ('failed', 'Ошибка'),
+    ]
+
+    source = models.CharField(max_length=500, verbose_name="Файл")
+    source_size = models.BigIntegerField(verbose_name="Размер файла, байт", null=True, blank=True)
+    source_hash = models.CharField(max_length=64, verbose_name="SHA-256 файла", blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running', verbose_name="Статус")
+    total = models.PositiveIntegerField(default=0, verbose_name="Объектов в файле")
+    next_index = models.PositiveIntegerField(default=0, verbose_name="Обработано объектов")
+    batch_size = models.PositiveIntegerField(default=500, verbose_name="Размер пачки")
+    imported = models.PositiveIntegerField(default=0, verbose_name="Создано")
+    updated = models.PositiveIntegerField(default=0, verbose_name="Обновлено")
+    unchanged = models.PositiveIntegerField(default=0, verbose_name="Без изменений")
+    skipped = models.PositiveIntegerField(default=0, verbose_name="Пропущено")
+    errors = models.JSONField(default=list, blank=True, verbose_name="Предупреждения и ошибки")
+    error_message = models.TextField(blank=True, verbose_name="Причина остановки")
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="Начат")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Последняя контрольная точка")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершён")
+
+    class Meta:
+        verbose_name = "Запуск импорта"
+        verbose_name_plural = "Запуски импорта"
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"#{self.pk} {self.source} ({self.get_status_display()})"
+
+
 class Document(models.Model):
     """
     Модель для хранения документов, связанных с лицензиями
@@ -114,3 +345,59 @@ class Document(models.Model):
     
     def __str__(self):
         return f"{self.title} ({self.license.license_number})"
+
+
+class LicenseOverlap(models.Model):
+    """
+    Пересечение контуров двух лицензий (см. licenses.overlaps)
+
+    Пара хранится один раз: license_a - лицензия с меньшим id.
+    """
+    license_a = models.ForeignKey(
+        License,
+        on_delete=models.CASCADE,
+        related_name='overlaps_as_a',
+        verbose_name="Лицензия А"
+    )
+    license_b = models.ForeignKey(
+        License,
+        on_delete=models.CASCADE,
+        related_name='overlaps_as_b',
+        verbose_name="Лицензия Б"
+    )
+    area_km2 = models.FloatField(verbose_name="Площадь пересечения, кв.км")
+    share_a = models.FloatField(verbose_name="Доля площади лицензии А", null=True, blank=True)
+    share_b = models.FloatField(verbose_name="Доля площади лицензии Б", null=True, blank=True)
+    geometry = models.JSONField(verbose_name="Контур пересечения (GeoJSON)", null=True, blank=True)
+    detected_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата обнаружения")
+
+    class Meta:
+        verbose_name = "Пересечение лицензий"
+        verbose_name_plural = "Пересечения лицензий"
+        ordering = ['-area_km2']
+        constraints = [
+            models.UniqueConstraint(fields=['license_a', 'license_b'], name='unique_license_overlap'),
+        ]
+
+    def __str__(self):
+        return f"{self.license_a.license_number} ∩ {self.license_b.license_number}"
+
+
+class DataVersion(models.Model):
+    """
+    Счётчик версии данных реестра (см. licenses.versioning) - одна строка
+
+    Увеличивается атомарным UPDATE в базе, поэтому одновременные изменения
+    в разных воркерах всегда получают разные номера версий.
+    """
+    value = models.BigIntegerField(verbose_name="Версия")
+    # Журнал удалений очищен до этой версии включительно: клиенту с более
+    # ранней версией нельзя отдать только изменения (см. licenses.sync)
+    pruned_value = models.BigIntegerField(default=0, verbose_name="Журнал удалений очищен до версии")
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версия данных"
+
+    def __str__(self):
+        return str(self.value)
@@ -0,0 +1,164 @@
+"""
+Поиск пересечений контуров лицензий.
+
+Кандидаты в пары отбираются по охватам (bbox) через STR-дерево
+(licenses.spatial.STRTree), поэтому полный перебор O(n²) не нужен:
+точное пересечение считается только для пар с пересекающимися охватами.
+Пересечения вычисляются в Shapely пачками (векторные функции shapely 2),
+площадь - тем же способом, что и площадь лицензий (licenses.geometry.measure).
+"""
+import numpy as np
+import shapely
+from django.db import transaction
+from django.db.models import Q
+from shapely.geometry import mapping, shape
+
+from licenses import geometry as geo
+from licenses.models import License, LicenseOverlap
+from licenses.spatial import STRTree
+
+# Пересечения меньше этой площади (общая граница, погрешность оцифровки)
+# не считаются конфликтом
+MIN_AREA_KM2 = 0.001
+
+# Сколько пар обрабатывается за один запрос полигонов к базе
+PAIR_BATCH_SIZE = 500
+
+# Сколько разобранных контуров держать в памяти между пачками пар
+SHAPE_CACHE_SIZE = 5000
+
+
+def candidate_pairs(license_ids=None):
+    """
+    Пары лицензий (id_a < id_b), охваты которых пересекаются
+
+    Args:
+        license_ids: проверить только эти лицензии (против всего реестра);
+            None - весь реестр
+    """
+    rows = list(License.objects.filter(min_lon__isnull=False).values_list(
+        'id', 'min_lon', 'min_lat', 'max_lon', 'max_lat'))
+    if not rows:
+        return []
+    data = np.asarray(rows, dtype=float)
+    ids = data[:, 0].astype(np.int64)
+    boxes = data[:, 1:]
+    tree = STRTree(ids, boxes)
+
+    if license_ids is None:
+        selected = np.arange(len(ids))
+    else:
+        selected = np.flatnonzero(np.isin(ids, np.fromiter(license_ids, dtype=np.int64)))
+
+    pairs = set()
+    for index in selected:
+        license_id = int(ids[index])
+        for other in tree.query(*boxes[index]).tolist():
+            if other == license_id:
+                continue
+            # При проверке всего реестра каждая пара найдётся дважды
+            if license_ids is None and other < license_id:
+                continue
+            pairs.add((min(license_id, other), max(license_id, other)))
+    return sorted(pairs)
+
+
+def _to_shape(geometry):
+    """Shapely-геометрия из GeoJSON; самопересекающиеся контуры исправляются"""
+    polygon = shape(geometry)
+    if not polygon.is_valid:
+        # Метод structure объединяет перекрывающиеся части мультиполигона
+        # и на порядок быстрее метода linework по умолчанию
+        polygon = shapely.make_valid(polygon, method='structure')
+    return polygon
+
+
+def _polygonal(intersection):
+    """Оставляет только площадные части пересечения (без общих рёбер и точек)"""
+    if intersection.geom_type in ('Polygon', 'MultiPolygon'):
+        return intersection
+    if intersection.geom_type == 'GeometryCollection':
+        parts = [part for part in intersection.geoms if part.geom_type in ('Polygon', 'MultiPolygon')]
+        if parts:
+            return shapely.union_all(parts)
+    return None
+
+
+def detect_overlaps(license_ids=None, min_area_km2=MIN_AREA_KM2):
+    """
+    Находит пересечения контуров лицензий
+
+    Args:
+        license_ids: проверить только эти лицензии; None - весь реестр
+        min_area_km2: минимальная площадь пересечения
+
+    Returns:
+        список несохранённых LicenseOverlap
+    """
+    pairs = candidate_pairs(license_ids)
+    overlaps = []
+    # Пары отсортированы по первой лицензии, поэтому соседние пачки
+    # в основном используют одни и те же контуры
+    shapes = {}
+    areas = {}
+    for start in range(0, len(pairs), PAIR_BATCH_SIZE):
+        batch = pairs[start:start + PAIR_BATCH_SIZE]
+        needed = {license_id for pair in batch for license_id in pair}
+        if len(areas) > SHAPE_CACHE_SIZE:
+            shapes = {key: value for key, value in shapes.items() if key in needed}
+            areas = {key: value for key, value in areas.items() if key in needed}
+        missing = needed - set(areas)
+        for license_id, polygon_data, area_km2 in License.objects.filter(id__in=missing).values_list(
+                'id', 'polygon_data', 'area_km2'):
+            areas[license_id] = area_km2
+            if geo.iter_polygons(polygon_data):
+                shapes[license_id] = _to_shape(polygon_data)
+
+        batch = [(a, b) for a, b in batch if a in shapes and b in shapes]
+        if not batch:
+            continue
+        left = np.array([shapes[a] for a, b in batch], dtype=object)
+        right = np.array([shapes[b] for a, b in batch], dtype=object)
+        intersects = shapely.intersects(left, right)
+        intersections = shapely.intersection(left[intersects], right[intersects])
+        hits = [pair for pair, hit in zip(batch, intersects) if hit]
+
+        for (a, b), intersection in zip(hits, intersections):
+            polygonal = _polygonal(intersection)
+            if polygonal is None or polygonal.is_empty:
+                continue
+            geometry = mapping(polygonal)
+            stats = geo.measure(geometry)
+            if not stats or stats['area_km2'] < min_area_km2:
+                continue
+            area = stats['area_km2']
+            area_a = areas[a]
+            area_b = areas[b]
+            overlaps.append(LicenseOverlap(
+                license_a_id=a,
+                license_b_id=b,
+                area_km2=area,
+                share_a=min(area / area_a, 1.0) if area_a else None,
+                share_b=min(area / area_b, 1.0) if area_b else None,
+                geometry=geometry,
+            ))
+    return overlaps
+
+
+def save_overlaps(overlaps, license_ids=None):
+    """
+    Заменяет сохранённые результаты проверки
+
+    Args:
+        overlaps: результат detect_overlaps()
+        license_ids: какие лицензии проверялись; удаляются только их
+            прежние пересечения. None - весь реестр
+    """
+    with transaction.atomic():
+        stale = LicenseOverlap.objects.all()
+        if license_ids is not None:
+            license_ids = list(license_ids)
+            stale = stale.filter(Q(license_a_id__in=license_ids) | Q(license_b_id__in=license_ids))
+        stale.delete()
+        LicenseOverlap.objects.bulk_create(overlaps, batch_size=1000)
+    return len(overlaps)
@@ -0,0 +1,163 @@
+"""
+Сбор метрик производительности запросов: SQL, этапы обработки, размер ответа.
+
+Метрики текущего запроса копятся в contextvar (заполняется
+PerformanceMiddleware), а скользящая статистика по представлениям хранится
+в кеше Django, чтобы её могли прочитать админ-страница и команда perf_report
+из другого процесса. Для нескольких воркеров gunicorn кеш должен быть общим
+(файловый кеш по умолчанию, Redis/Memcached в продакшене).
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Метрики текущего запроса: {'sql_count': int, 'sql_ms': float, 'stages': {name: ms}}
+_current = contextvars.ContextVar('licenses_perf_current', default=None)
+
+STATS_CACHE_KEY = 'licenses:perf:stats'
+
+# Поля одного замера в порядке хранения
+SAMPLE_FIELDS = ('total_ms', 'sql_count', 'sql_ms', 'serialize_ms', 'bytes')
+
+
+def get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def start_request():
+    """Начинает сбор метрик для нового запроса"""
+    metrics = {'sql_count': 0, 'sql_ms': 0.0, 'stages': {}}
+    token = _current.set(metrics)
+    return metrics, token
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def stage(name):
+    """
+    Замеряет длительность этапа обработки текущего запроса.
+
+    Пример:
+        with perf.stage('serialize'):
+            response = JsonResponse(data)
+    Вне запроса (команды, тесты) ничего не делает.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        metrics['stages'][name] = metrics['stages'].get(name, 0.0) + elapsed
+
+
+def sql_timer(execute, sql, params, many, context):
+    """Обёртка connection.execute_wrapper: считает запросы и их время"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics['sql_count'] += 1
+        metrics['sql_ms'] += (time.perf_counter() - started) * 1000
+
+
+class RollingStats:
+    """
+    Скользящее окно последних замеров по каждому представлению.
+
+    Замеры копятся в памяти процесса и периодически (раз в
+    PERF_FLUSH_INTERVAL секунд) сливаются в общий кеш, чтобы не писать
+    в кеш на каждый запрос. Слияние не атомарно: при одновременной записи
+    из нескольких воркеров часть замеров может потеряться, для
+    статистики это допустимо.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def add(self, view_name, sample):
+        with self._lock:
+            self._pending.setdefault(view_name, []).append(sample)
+            due = time.monotonic() - self._last_flush >= get_setting('PERF_FLUSH_INTERVAL', 5)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        window = get_setting('PERF_STATS_WINDOW', 500)
+        stats = cache.get(STATS_CACHE_KEY) or {}
+        for view_name, samples in pending.items():
+            stats[view_name] = (stats.get(view_name, []) + samples)[-window:]
+        cache.set(STATS_CACHE_KEY, stats, None)
+
+    def reset(self):
+        with self._lock:
+            self._pending = {}
+        cache.delete(STATS_CACHE_KEY)
+
+
+rolling_stats = RollingStats()
+
+
+def percentile(sorted_values, pct):
+    """Процентиль методом ближайшего ранга по отсортированному списку"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def build_report():
+    """
+    Сводка по представлениям, отсортированная по p95 общего времени
+
+    Returns:
+        список dict: view, count, p50/p95/p99 времени, средние SQL и размер ответа
+    """
+    rolling_stats.flush()
+    stats = cache.get(STATS_CACHE_KEY) or {}
+    report = []
+    for view_name, samples in stats.items():
+        if not samples:
+            continue
+        columns = {field: [s[i] for s in samples] for i, field in enumerate(SAMPLE_FIELDS)}
+        total = sorted(columns['total_ms'])
+        count = len(samples)
+        report.append({
+            'view': view_name,
+            'count': count,
+            'p50_ms': round(percentile(total, 50), 1),
+            'p95_ms': round(percentile(total, 95), 1),
+            'p99_ms': round(percentile(total, 99), 1),
+            'max_ms': round(total[-1], 1),
+            'avg_sql_count': round(sum(columns['sql_count']) / count, 1),
+            'p95_sql_ms': round(percentile(sorted(columns['sql_ms']), 95), 1),
+            'p95_serialize_ms': round(percentile(sorted(columns['serialize_ms']), 95), 1),
+            'avg_bytes': int(sum(columns['bytes']) / count),
+        })
+    report.sort(key=lambda row: row['p95_ms'], reverse=True)
+    return report
@@ -0,0 +1,164 @@
+"""
+Профиль импорта GeoJSON по этапам.
+
+ImportProfile замеряет время этапов импорта (чтение файла, разбор JSON,
+разбор описаний, хеши, очистка полигонов, слияние контуров, работа ORM),
+количество и время SQL-запросов, пиковую память (tracemalloc) и скорость
+в объектах в секунду. Этапы размечаются в GeoJSONImporter через stage()
+и могут быть вложенными: в этап засчитывается только его собственное
+время, без вложенных этапов и SQL-запросов, поэтому доли этапов в сумме
+не превышают 100%. Время вне этапов и SQL выводится как «прочее».
+
+Используется командой import_geojson --profile и импортом в админке.
+tracemalloc замедляет импорт в несколько раз (сильнее всего - ORM и
+разбор JSON), поэтому сравнивать между собой стоит только профили,
+снятые в одном режиме; точные времена этапов - с trace_memory=False.
+"""
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from django.db import connection
+
+# Этапы в порядке вывода
+STAGES = [
+    ('read', 'Чтение и распаковка файла'),
+    ('json', 'Разбор JSON'),
+    ('parse_description', 'Разбор описаний (parse_description)'),
+    ('hashing', 'Хеши содержимого'),
+    ('geometry', 'Очистка и измерение полигонов'),
+    ('merge', 'Слияние контуров (merge_polygons)'),
+    ('orm', 'ORM и сигналы (без SQL)'),
+    ('db', 'Запросы к базе данных'),
+    ('other', 'Прочее (пачки, контрольные точки)'),
+]
+
+
+def stage(profile, name):
+    """Замер этапа, если профиль включён (profile=None - ничего не делает)"""
+    return profile.stage(name) if profile is not None else nullcontext()
+
+
+class ImportProfile:
+    """Время этапов, SQL и память одного импорта"""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.features = 0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.total_seconds = 0.0
+        self.peak_memory = None
+        self._started = None
+        self._tracing = False
+        # Открытые этапы: [время вложенных этапов, SQL внутри вложенных этапов]
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        frame = [0.0, 0.0]
+        self._stack.append(frame)
+        sql_before = self.sql_seconds
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            sql = self.sql_seconds - sql_before
+            self._stack.pop()
+            own = elapsed - frame[0] - (sql - frame[1])
+            seconds, calls = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (seconds + max(own, 0.0), calls + 1)
+            if self._stack:
+                self._stack[-1][0] += elapsed
+                self._stack[-1][1] += sql
+
+    def _sql_timer(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_seconds += time.perf_counter() - started
+
+    def start(self):
+        """Начинает замер: общее время, SQL-запросы и память"""
+        if self.trace_memory:
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+        connection.execute_wrappers.append(self._sql_timer)
+        self._started = time.perf_counter()
+
+    def stop(self):
+        """Завершает замер; повторный вызов ничего не делает"""
+        if self._started is None:
+            return
+        self.total_seconds += time.perf_counter() - self._started
+        self._started = None
+        if self._sql_timer in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self._sql_timer)
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if self._tracing:
+                tracemalloc.stop()
+
+    @contextmanager
+    def measure(self):
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def report(self):
+        """
+        Сводка профиля
+
+        Returns:
+            dict: total_seconds, features, features_per_second, sql_count,
+            peak_memory_mb и stages - список dict name, label, seconds,
+            calls, share (доля общего времени, %)
+        """
+        measured = dict(self.stages)
+        measured['db'] = (self.sql_seconds, self.sql_count)
+        staged = sum(seconds for seconds, calls in measured.values())
+        measured['other'] = (max(self.total_seconds - staged, 0.0), 0)
+
+        stages = []
+        for name, label in STAGES:
+            if name not in measured:
+                continue
+            seconds, calls = measured[name]
+            stages.append({
+                'name': name,
+                'label': label,
+                'seconds': round(seconds, 3),
+                'calls': calls,
+                'share': round(seconds / self.total_seconds * 100, 1) if self.total_seconds else 0.0,
+            })
+        return {
+            'total_seconds': round(self.total_seconds, 3),
+            'features': self.features,
+            'features_per_second': round(self.features / self.total_seconds, 1) if self.total_seconds else None,
+            'sql_count': self.sql_count,
+            'peak_memory_mb': round(self.peak_memory / 1024 / 1024, 1) if self.peak_memory is not None else None,
+            'stages': stages,
+        }
+
+    def format_lines(self):
+        """Сводка профиля в виде строк для вывода в консоль"""
+        report = self.report()
+        lines = [f'{"Этап":<40} {"Время, с":>10} {"Доля":>7} {"Вызовов":>9}']
+        for row in report['stages']:
+            lines.append(
+                f'{row["label"]:<40} {row["seconds"]:>10.3f} {row["share"]:>6.1f}% {row["calls"] or "":>9}')
+        lines.append(f'{"Всего":<40} {report["total_seconds"]:>10.3f}')
+        lines.append(f'Объектов: {report["features"]}, объектов в секунду: {report["features_per_second"]}')
+        lines.append(f'SQL-запросов: {report["sql_count"]}')
+        if report['peak_memory_mb'] is not None:
+            lines.append(f'Пиковая память (tracemalloc): {report["peak_memory_mb"]} МБ')
+        return lines
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from licenses.models import License, LicenseDeletion
+from licenses.versioning import registry_changed
+
+
+@receiver(post_save, sender=License)
+def license_saved(sender, instance, **kwargs):
+    registry_changed()
+
+
+@receiver(post_delete, sender=License)
+def license_deleted(sender, instance, **kwargs):
+    # В той же транзакции, что и удаление: откат удаления откатывает и запись журнала
+    LicenseDeletion.objects.create(license_id=instance.id, license_number=instance.license_number)
+    registry_changed()
@@ -0,0 +1,221 @@
+"""
+Готовые снимки реестра для отдачи веб-сервером.
+
+Для анонимной карты /api/licenses/all/ до следующего изменения данных
+отдаёт всем одни и те же байты. Снимок - это те же ответы, заранее
+записанные в файлы с хешем содержимого в имени (registry.<хеш>.json,
+registry-geometry.<хеш>.json, stats.<хеш>.json) и сжатыми вариантами
+.gz/.br рядом, плюс небольшой manifest.json с версией данных и ссылками
+на файлы. nginx отдаёт их из REGISTRY_SNAPSHOT_ROOT по адресу /snapshots/,
+и тяжёлый ответ не занимает воркеры gunicorn.
+
+Клиентский кеш реестра (registry_cache.js) при первой загрузке читает
+манифест и, если его версия совпадает с /api/licenses/version/, берёт
+реестр из снимка; иначе - из API, как раньше.
+
+Снимок пересобирается командой build_registry_snapshot, после импорта,
+сохранения лицензии в админке и ежедневной проверки статусов
+(REGISTRY_SNAPSHOTS=true). Файлы прошлых снимков удаляются не сразу,
+чтобы клиенты, успевшие прочитать старый манифест, их дозагрузили.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from licenses.storage import compress_variants
+from licenses.versioning import get_data_version
+
+logger = logging.getLogger(__name__)
+
+# Адрес каталога снимков на веб-сервере (его же ожидает registry_cache.js)
+SNAPSHOT_URL = '/snapshots/'
+MANIFEST_NAME = 'manifest.json'
+
+# Сколько секунд хранить файлы прошлых снимков
+KEEP_SECONDS = 600
+
+# Наборы данных снимка: имя в манифесте -> префикс файла
+DATASETS = {
+    'registry': 'registry',
+    'registry_geometry': 'registry-geometry',
+    'stats': 'stats',
+}
+
+
+def snapshot_root():
+    return str(settings.REGISTRY_SNAPSHOT_ROOT)
+
+
+def read_manifest():
+    """Текущий манифест снимка или None, если снимок ещё не собирался"""
+    try:
+        with open(os.path.join(snapshot_root(), MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def registry_stats(licenses):
+    """Сводка по реестру: всего лицензий и их число по статусам, регионам, видам и полезным ископаемым"""
+    stats = {'total': len(licenses)}
+    for field in ('status', 'region', 'license_type', 'mineral_type'):
+        counts = Counter(license[field] or '' for license in licenses)
+        stats[field] = dict(sorted(counts.items()))
+    return stats
+
+
+def write_atomic(path, content):
+    """Записывает файл через временный в том же каталоге: читатели не видят его недописанным"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_hashed(root, prefix, content):
+    """Сохраняет content как <prefix>.<хеш>.json со сжатыми вариантами; возвращает имя файла"""
+    name = f'{prefix}.{hashlib.md5(content).hexdigest()[:12]}.json'
+    path = os.path.join(root, name)
+    if not os.path.exists(path):
+        for suffix, compressed in compress_variants(content).items():
+            write_atomic(path + suffix, compressed)
+        write_atomic(path, content)
+    return name
+
+
+def build_snapshot():
+    """
+    Собирает снимок реестра и обновляет манифест
+
+    Returns:
+        dict: манифест нового снимка (version, generated_at, files, sizes)
+    """
+    from licenses.models import License
+    from licenses.views import license_data
+
+    root = snapshot_root()
+    os.makedirs(root, exist_ok=True)
+
+    # Статусы обновляются до чтения версии, иначе снимок сразу устареет
+    License.objects.expire_overdue()
+    # Версия и момент снимка - до чтения данных: изменения во время сборки
+    # делают снимок устаревшим, а не теряются
+    version = get_data_version()
+    generated_at = timezone.now()
+
+    licenses = [license_data(license, include_geometry=True) for license in License.objects.all()]
+    plain = [{key: value for key, value in license.items() if key != 'polygon_data'} for license in licenses]
+    payloads = {
+        'registry': plain,
+        'registry_geometry': licenses,
+        'stats': registry_stats(plain),
+    }
+
+    files = {}
+    sizes = {}
+    for dataset, prefix in DATASETS.items():
+        content = json.dumps(payloads[dataset], cls=DjangoJSONEncoder).encode('utf-8')
+        name = write_hashed(root, prefix, content)
+        files[dataset] = SNAPSHOT_URL + name
+        sizes[dataset] = len(content)
+
+    manifest = {
+        'version': version,
+        'generated_at': generated_at.isoformat(),
+        'files': files,
+        'sizes': sizes,
+    }
+    write_atomic(os.path.join(root, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    prune_snapshots(root, {url[len(SNAPSHOT_URL):] for url in files.values()})
+    return manifest
+
+
+def prune_snapshots(root, keep, max_age=KEEP_SECONDS):
+    """Удаляет файлы прошлых снимков старше max_age секунд, кроме имён из keep"""
+    now = time.time()
+    removed = 0
+    for name in os.listdir(root):
+        base = name.removesuffix('.gz').removesuffix('.br')
+        if name == MANIFEST_NAME or base in keep or not base.endswith('.json'):
+            continue
+        if not base.startswith(tuple(prefix + '.' for prefix in DATASETS.values())):
+            continue
+        path = os.path.join(root, name)
+        if now - os.path.getmtime(path) > max_age:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def refresh_snapshot():
+    """
+    Пересобирает снимок, если он отстал от текущей версии данных
+
+    Returns:
+        dict: манифест нового снимка или None, если снимок актуален
+    """
+    manifest = read_manifest()
+    if manifest is not None and manifest.get('version') == get_data_version():
+        return None
+    return build_snapshot()
+
+
+# Фоновая пересборка в процессе веб-сервера: запросы, пришедшие во время
+# сборки, объединяются в одну следующую сборку
+_state_lock = threading.Lock()
+_dirty = False
+_worker = None
+
+
+def schedule_snapshot():
+    """
+    Пересобирает снимок в фоновом потоке после фиксации текущей транзакции
+    (сохранение в админке, загрузка файла на сайте). Ничего не делает, если
+    REGISTRY_SNAPSHOTS выключен.
+    """
+    if settings.REGISTRY_SNAPSHOTS:
+        transaction.on_commit(_start_build)
+
+
+def _start_build():
+    global _dirty, _worker
+    with _state_lock:
+        _dirty = True
+        if _worker is not None:
+            return
+        _worker = threading.Thread(target=_build_loop, name='registry-snapshot', daemon=True)
+        _worker.start()
+
+
+def _build_loop():
+    global _dirty, _worker
+    try:
+        while True:
+            with _state_lock:
+                if not _dirty:
+                    _worker = None
+                    return
+                _dirty = False
+            try:
+                refresh_snapshot()
+            except Exception:
+                logger.exception('Не удалось собрать снимок реестра')
+    finally:
+        connection.close()
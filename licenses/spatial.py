@@ -0,0 +1,327 @@
+"""
+Пространственный индекс лицензий в памяти процесса.
+
+STR-дерево (Sort-Tile-Recursive R-tree) строится по охватам (bbox) лицензий
+и хранится в массивах NumPy: каждый уровень дерева - массив прямоугольников,
+дети узла i лежат в следующем уровне подряд с позиции i * NODE_CAPACITY.
+Поиск спускается по уровням, проверяя все узлы-кандидаты уровня одной
+векторной операцией.
+
+Точная проверка (точка в полигоне, расстояние до контура) выполняется
+для кандидатов по polygon_data, загруженному одним запросом.
+
+Изменения лицензий применяются инкрементально при первом запросе после
+смены версии данных (licenses.versioning): загружаются только охваты
+лицензий с новыми номерами изменений.
+"""
+import math
+import threading
+
+import numpy as np
+from django.db.models import Q
+
+from licenses import geometry as geo
+from licenses.versioning import get_data_version
+
+NODE_CAPACITY = 16
+
+# Дерево перестраивается, когда накопленных изменений больше этой доли
+REBUILD_RATIO = 0.05
+REBUILD_MIN_CHANGES = 256
+
+
+class STRTree:
+    """Статическое R-дерево, упакованное методом STR"""
+
+    def __init__(self, ids, boxes):
+        """
+        Args:
+            ids: массив идентификаторов (n,)
+            boxes: массив охватов (n, 4): min_lon, min_lat, max_lon, max_lat
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        order = self._str_order(boxes)
+        self.ids = ids[order]
+        self.levels = [boxes[order]]
+        while len(self.levels[-1]) > NODE_CAPACITY:
+            self.levels.append(self._parent_boxes(self.levels[-1]))
+        self.levels.reverse()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _str_order(boxes):
+        """Порядок листьев: срезы по X, внутри среза - по Y"""
+        count = len(boxes)
+        if count == 0:
+            return np.arange(0)
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2
+        leaves = math.ceil(count / NODE_CAPACITY)
+        slice_size = math.ceil(math.sqrt(leaves)) * NODE_CAPACITY
+        by_x = np.argsort(cx, kind='stable')
+        slices = [by_x[start:start + slice_size] for start in range(0, count, slice_size)]
+        return np.concatenate([s[np.argsort(cy[s], kind='stable')] for s in slices])
+
+    @staticmethod
+    def _parent_boxes(boxes):
+        starts = np.arange(0, len(boxes), NODE_CAPACITY)
+        return np.column_stack([
+            np.minimum.reduceat(boxes[:, 0], starts),
+            np.minimum.reduceat(boxes[:, 1], starts),
+            np.maximum.reduceat(boxes[:, 2], starts),
+            np.maximum.reduceat(boxes[:, 3], starts),
+        ])
+
+    def query(self, min_lon, min_lat, max_lon, max_lat):
+        """Идентификаторы, охват которых пересекается с прямоугольником"""
+        if not len(self.ids):
+            return np.arange(0, dtype=np.int64)
+        candidates = np.arange(len(self.levels[0]))
+        for depth, boxes in enumerate(self.levels):
+            if depth:
+                # Раскрываем кандидатов предыдущего уровня в их детей
+                children = (candidates[:, None] * NODE_CAPACITY + np.arange(NODE_CAPACITY)).ravel()
+                candidates = children[children < len(boxes)]
+            level = boxes[candidates]
+            hit = (
+                (level[:, 0] <= max_lon) & (level[:, 2] >= min_lon)
+                & (level[:, 1] <= max_lat) & (level[:, 3] >= min_lat)
+            )
+            candidates = candidates[hit]
+            if not len(candidates):
+                break
+        return self.ids[candidates]
+
+
+def radius_bbox(lon, lat, radius_km):
+    """Прямоугольник в градусах, гарантированно содержащий круг радиуса radius_km"""
+    dlat = radius_km / geo.KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+    dlon = min(radius_km / (geo.KM_PER_DEGREE * cos_lat), 180.0)
+    return lon - dlon, max(lat - dlat, -90.0), lon + dlon, min(lat + dlat, 90.0)
+
+
+class SpatialIndex:
+    """
+    Индекс лицензий процесса: STR-дерево плюс журнал изменений после постройки
+
+    Изменённые и удалённые после постройки лицензии исключаются из
+    результатов дерева, а изменённые проверяются линейно по журналу.
+    Когда журнал разрастается, дерево перестраивается из памяти без
+    обращения к базе.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.tree = None
+        self.version = None
+        self.changed = {}
+        self.removed = set()
+
+    # --- Поддержание индекса ---
+
+    def _load_boxes(self, queryset):
+        rows = list(queryset.filter(min_lon__isnull=False).values_list(
+            'id', 'min_lon', 'min_lat', 'max_lon', 'max_lat'))
+        if not rows:
+            return np.arange(0, dtype=np.int64), np.empty((0, 4))
+        data = np.asarray(rows, dtype=float)
+        return data[:, 0].astype(np.int64), data[:, 1:]
+
+    def reset(self):
+        """Сбрасывает индекс; он будет построен заново при следующем запросе"""
+        with self._lock:
+            self.tree = None
+            self.version = None
+            self.changed = {}
+            self.removed = set()
+
+    def rebuild(self):
+        """Полная перестройка индекса из базы"""
+        from licenses.models import License
+
+        with self._lock:
+            version = get_data_version()
+            ids, boxes = self._load_boxes(License.objects.all())
+            self.tree = STRTree(ids, boxes)
+            self.changed = {}
+            self.removed = set()
+            self.version = version
+
+    def _compact(self):
+        """Перестройка дерева с учётом журнала изменений (без запросов к базе)"""
+        ids = self.tree.ids
+        boxes = self.tree.levels[-1]
+        keep = ~np.isin(ids, np.fromiter(self.removed | set(self.changed), dtype=np.int64))
+        if self.changed:
+            ids = np.concatenate([ids[keep], np.fromiter(self.changed, dtype=np.int64)])
+            boxes = np.vstack([boxes[keep], np.asarray(list(self.changed.values()), dtype=float)])
+        else:
+            ids, boxes = ids[keep], boxes[keep]
+        self.tree = STRTree(ids, boxes)
+        self.changed = {}
+        self.removed = set()
+
+    def _maybe_compact(self):
+        pending = len(self.changed) + len(self.removed)
+        if pending > max(REBUILD_MIN_CHANGES, len(self.tree) * REBUILD_RATIO):
+            self._compact()
+
+    def upsert(self, license_id, bbox):
+        """Добавляет или обновляет охват лицензии (bbox=None - лицензия без полигона)"""
+        with self._lock:
+            if self.tree is None:
+                return
+            if bbox is None or None in bbox:
+                self.changed.pop(license_id, None)
+                self.removed.add(license_id)
+            else:
+                self.changed[license_id] = [float(value) for value in bbox]
+                self.removed.discard(license_id)
+            self._maybe_compact()
+
+    def remove(self, license_id):
+        with self._lock:
+            if self.tree is None:
+                return
+            self.changed.pop(license_id, None)
+            self.removed.add(license_id)
+            self._maybe_compact()
+
+    def sync(self):
+        """Приводит индекс к текущей версии данных"""
+        from licenses.models import License
+
+        version = get_data_version()
+        if self.tree is not None and self.version == version:
+            return
+        with self._lock:
+            if self.tree is None:
+                self.rebuild()
+                return
+            if self.version == version:
+                return
+            if version < self.version:
+                # Счётчик версий ушёл назад (база восстановлена из копии):
+                # номерам изменений в ней верить нельзя
+                self.rebuild()
+                return
+            # Лицензии, изменённые после версии индекса (номер изменения
+            # больше или ещё не проставлен), и удалённые - по списку идентификаторов
+            changes = License.objects.filter(Q(change_seq__isnull=True) | Q(change_seq__gt=self.version))
+            for license_id, *bbox in changes.values_list('id', 'min_lon', 'min_lat', 'max_lon', 'max_lat'):
+                self.upsert(license_id, bbox)
+            existing = set(License.objects.values_list('id', flat=True))
+            known = (set(self.tree.ids.tolist()) - self.removed) | set(self.changed)
+            for license_id in known - existing:
+                self.remove(license_id)
+            self.version = version
+
+    # --- Поиск ---
+
+    def candidates(self, min_lon, min_lat, max_lon, max_lat):
+        """Идентификаторы лицензий, охват которых пересекается с прямоугольником"""
+        self.sync()
+        if min_lon > max_lon:
+            # Прямоугольник через 180-й меридиан
+            return (self.candidates(min_lon, min_lat, 180.0, max_lat)
+                    | self.candidates(-180.0, min_lat, max_lon, max_lat))
+        with self._lock:
+            tree, changed, removed = self.tree, dict(self.changed), set(self.removed)
+        result = set(tree.query(min_lon, min_lat, max_lon, max_lat).tolist())
+        result -= removed
+        result -= set(changed)
+        for license_id, (x1, y1, x2, y2) in changed.items():
+            if x1 <= max_lon and x2 >= min_lon and y1 <= max_lat and y2 >= min_lat:
+                result.add(license_id)
+        return result
+
+    def _with_distances(self, ids, lon, lat):
+        """Загружает полигоны кандидатов одним запросом и считает расстояния"""
+        from licenses.models import License
+
+        if not ids:
+            return []
+        licenses = License.objects.filter(id__in=ids).only(
+            'id', 'license_number', 'license_type', 'owner', 'region', 'status', 'polygon_data',
+            'latitude', 'longitude',
+        )
+        result = []
+        for license_obj in licenses:
+            distance = geo.distance_km(license_obj.polygon_data, lon, lat)
+            if distance is not None:
+                result.append((distance, license_obj))
+        return result
+
+    def at_point(self, lon, lat):
+        """Лицензии, полигон которых содержит точку"""
+        ids = self.candidates(lon, lat, lon, lat)
+        return [license_obj for distance, license_obj in self._with_distances(ids, lon, lat) if distance == 0.0]
+
+    def within_radius(self, lon, lat, radius_km):
+        """Лицензии не дальше radius_km от точки: список (расстояние, лицензия) по возрастанию"""
+        min_lon, min_lat, max_lon, max_lat = radius_bbox(lon, lat, radius_km)
+        if max_lon - min_lon >= 360:
+            ids = self.candidates(-180.0, min_lat, 180.0, max_lat)
+        else:
+            ids = self.candidates(
+                (min_lon + 180) % 360 - 180, min_lat, (max_lon + 180) % 360 - 180, max_lat)
+        found = [item for item in self._with_distances(ids, lon, lat) if item[0] <= radius_km]
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def _entries(self):
+        """Идентификаторы и охваты всех лицензий индекса с учётом журнала изменений"""
+        self.sync()
+        with self._lock:
+            tree, changed, removed = self.tree, dict(self.changed), set(self.removed)
+        keep = ~np.isin(tree.ids, np.fromiter(removed | set(changed), dtype=np.int64))
+        ids, boxes = tree.ids[keep], tree.levels[-1][keep]
+        if changed:
+            ids = np.concatenate([ids, np.fromiter(changed, dtype=np.int64)])
+            boxes = np.vstack([boxes, np.asarray(list(changed.values()), dtype=float)])
+        return ids, boxes
+
+    @staticmethod
+    def box_distances(boxes, lon, lat):
+        """
+        Расстояния в км от точки до охватов (n, 4) в той же локальной
+        проекции, что и geometry.distance_km: полигон лежит внутри своего
+        охвата, поэтому расстояние до охвата не больше расстояния до полигона
+        """
+        # Долготы краёв относительно точки, через 180-й меридиан - кратчайшие
+        west = (boxes[:, 0] - lon + 180) % 360 - 180
+        east = (boxes[:, 2] - lon + 180) % 360 - 180
+        inside = (boxes[:, 0] <= lon) & (lon <= boxes[:, 2])
+        dlon = np.where(inside, 0.0, np.minimum(np.abs(west), np.abs(east)))
+        dlat = np.maximum(np.maximum(boxes[:, 1] - lat, lat - boxes[:, 3]), 0.0)
+        return np.hypot(dlon * math.cos(math.radians(lat)), dlat) * geo.KM_PER_DEGREE
+
+    def nearest(self, lon, lat, limit=5, max_km=5000.0):
+        """
+        limit ближайших лицензий не дальше max_km: список (расстояние,
+        лицензия) по возрастанию
+
+        Кандидаты упорядочиваются по расстоянию до охвата, полигоны
+        загружаются по limit штук в этом порядке. Поиск останавливается,
+        когда limit-е найденное расстояние не больше расстояния до охвата
+        следующего кандидата - остальные лицензии заведомо дальше.
+        """
+        ids, boxes = self._entries()
+        bounds = self.box_distances(boxes, lon, lat)
+        order = np.argsort(bounds, kind='stable')
+        order = order[bounds[order] <= max_km]
+        found = []
+        for start in range(0, len(order), limit):
+            if len(found) >= limit and found[limit - 1][0] <= bounds[order[start]]:
+                break
+            chunk = ids[order[start:start + limit]].tolist()
+            found.extend(item for item in self._with_distances(chunk, lon, lat) if item[0] <= max_km)
+            found.sort(key=lambda item: item[0])
+        return found[:limit]
+
+
+spatial_index = SpatialIndex()
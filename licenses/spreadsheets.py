@@ -0,0 +1,373 @@
+"""
+Импорт реестра из таблиц Excel (.xlsx) и CSV.
+
+Столбцы те же, что у выгрузки export_licenses_excel (REGISTRY_COLUMNS),
+поэтому выгруженный файл можно поправить и загрузить обратно.
+Строки читаются потоком (openpyxl в режиме read_only, модуль csv) и
+записываются пачками: существующие лицензии одним запросом на пачку
+находятся по номеру и обновляются через bulk_update, новые создаются
+через bulk_create.
+
+Контуры лицензий таблица не меняет - они загружаются из GeoJSON.
+Координаты из таблицы записываются только лицензиям без полигона.
+"""
+import codecs
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from licenses.models import License
+from licenses.versioning import registry_changed
+
+# Столбцы выгрузки в Excel: заголовок и поле модели
+REGISTRY_COLUMNS = [
+    ('Номер лицензии', 'license_number'),
+    ('Вид пользования', 'license_type'),
+    ('Недропользователь', 'owner'),
+    ('Регион', 'region'),
+    ('Участок недр', 'area'),
+    ('Дата выдачи', 'issue_date'),
+    ('Дата окончания', 'expiry_date'),
+    ('Полезное ископаемое', 'mineral_type'),
+    ('Статус', 'status'),
+    ('Широта', 'latitude'),
+    ('Долгота', 'longitude'),
+    ('Описание', 'description'),
+]
+
+# Названия статусов в таблице
+STATUS_LABELS = dict(License._meta.get_field('status').choices)
+
+# Строк таблицы в одной транзакции
+TABLE_BATCH_SIZE = 1000
+
+# Форматы дат в текстовых ячейках и CSV
+DATE_FORMATS = ['%d.%m.%Y', '%Y-%m-%d', '%d.%m.%y', '%d/%m/%Y']
+
+# Пустая ячейка не затирает сохранённое значение, кроме этих полей
+# (пустая дата окончания - бессрочная лицензия)
+CLEARABLE_FIELDS = {'expiry_date'}
+
+# Поля, которые при обновлении лицензии с полигоном не меняются
+GEOMETRY_FIELDS = {'latitude', 'longitude'}
+
+XLSX_EXTENSIONS = ('.xlsx', '.xlsm')
+CSV_EXTENSIONS = ('.csv', '.txt')
+
+# Сколько байт CSV читать для определения кодировки и разделителя
+CSV_SAMPLE_SIZE = 64 * 1024
+
+
+def is_table_file(file_name):
+    """Поддерживается ли файл импортом таблиц (по расширению)"""
+    return file_name.lower().endswith(XLSX_EXTENSIONS + CSV_EXTENSIONS)
+
+
+def _header_key(value):
+    return ' '.join(str(value or '').split()).lower()
+
+
+HEADER_FIELDS = {_header_key(header): field for header, field in REGISTRY_COLUMNS}
+HEADER_FIELDS.update({field: field for header, field in REGISTRY_COLUMNS})
+
+
+def _xlsx_rows(file_obj):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _csv_rows(file_obj):
+    sample = file_obj.read(CSV_SAMPLE_SIZE)
+    file_obj.seek(0)
+    if isinstance(sample, str):
+        text = file_obj
+        sample_text = sample
+    else:
+        # Excel сохраняет CSV в UTF-8 с BOM или в Windows-1251
+        try:
+            sample_text = codecs.getincrementaldecoder('utf-8-sig')().decode(sample)
+            encoding = 'utf-8-sig'
+        except UnicodeDecodeError:
+            encoding = 'cp1251'
+            sample_text = sample.decode(encoding)
+        text = io.TextIOWrapper(file_obj, encoding=encoding, newline='')
+    # Разделитель определяется по строке заголовков; русский Excel пишет ';'
+    try:
+        delimiter = csv.Sniffer().sniff(sample_text.split('\n', 1)[0], delimiters=';,\t').delimiter
+    except csv.Error:
+        delimiter = ';'
+    try:
+        yield from csv.reader(text, delimiter=delimiter)
+    finally:
+        if text is not file_obj:
+            # Файл закрывает вызывающий код
+            text.detach()
+
+
+def read_rows(file_obj, file_name):
+    """
+    Строки таблицы в виде (номер строки, {поле модели: значение})
+
+    Столбцы сопоставляются по заголовку в первой строке, лишние столбцы
+    пропускаются. Значения возвращаются как есть (текст, число, дата).
+
+    Raises:
+        ValueError: неизвестный формат файла или нет столбца с номером лицензии
+    """
+    name = file_name.lower()
+    if name.endswith(XLSX_EXTENSIONS):
+        rows = _xlsx_rows(file_obj)
+    elif name.endswith(CSV_EXTENSIONS):
+        rows = _csv_rows(file_obj)
+    else:
+        raise ValueError('Неверный формат файла. Поддерживаются .xlsx и .csv')
+
+    header = next(rows, None)
+    columns = [(index, HEADER_FIELDS.get(_header_key(value))) for index, value in enumerate(header or [])]
+    columns = [(index, field) for index, field in columns if field]
+    if 'license_number' not in {field for index, field in columns}:
+        raise ValueError('В первой строке таблицы нет столбца «Номер лицензии»')
+
+    for row_number, row in enumerate(rows, start=2):
+        values = {field: row[index] if index < len(row) else None for index, field in columns}
+        if any(value not in (None, '') for value in values.values()):
+            yield row_number, values
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return _parse_date(_text(value))
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text):
+    # В реестре много одинаковых дат - strptime вызывается для каждой один раз
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f'не удалось разобрать дату «{text}»')
+
+
+def _coordinate(value, limit):
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(_text(value).replace(',', '.'))
+        if not number.is_finite():
+            raise InvalidOperation(value)
+        number = number.quantize(Decimal('0.000001'))
+    except InvalidOperation:
+        raise ValueError(f'некорректная координата «{_text(value)}»')
+    if abs(number) > limit:
+        raise ValueError(f'координата вне допустимого диапазона: {number}')
+    return number
+
+
+def _status(value):
+    text = _text(value)
+    if not text:
+        return None
+    if text in STATUS_LABELS:
+        return text
+    for code, label in STATUS_LABELS.items():
+        if label.lower() == text.lower():
+            return code
+    raise ValueError(f'неизвестный статус «{text}»')
+
+
+def parse_row(values):
+    """
+    Значения полей модели из строки таблицы
+
+    None означает пустую ячейку. Лицензия с истёкшим сроком получает
+    статус 'expired', как при импорте GeoJSON.
+
+    Raises:
+        ValueError: ячейку не удалось разобрать
+    """
+    fields = {}
+    for field, value in values.items():
+        if field in ('issue_date', 'expiry_date'):
+            fields[field] = _date(value)
+        elif field == 'latitude':
+            fields[field] = _coordinate(value, 90)
+        elif field == 'longitude':
+            fields[field] = _coordinate(value, 180)
+        elif field == 'status':
+            fields[field] = _status(value)
+        else:
+            fields[field] = _text(value) or None
+    if fields.get('status') == 'active' and fields.get('expiry_date') and fields['expiry_date'] < date.today():
+        fields['status'] = 'expired'
+    return fields
+
+
+class RegistryTableImporter:
+    """
+    Импорт лицензий из таблицы Excel/CSV с обновлением существующих
+    """
+
+    def __init__(self, batch_size=TABLE_BATCH_SIZE):
+        from licenses.utils import GeoJSONImporter
+
+        self.batch_size = batch_size
+        self.imported_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+        self.skipped_count = 0
+        self.errors = []
+        # Регион по префиксу номера - для новых лицензий без региона
+        self.extract_region = GeoJSONImporter().extract_region
+
+    def import_file(self, file_obj, file_name):
+        """
+        Импортирует таблицу
+
+        Returns:
+            словарь со статистикой импорта (как у GeoJSONImporter)
+
+        Raises:
+            ValueError: неизвестный формат файла или нет столбца с номером лицензии
+        """
+        batch = []
+        total = 0
+        for row_number, values in read_rows(file_obj, file_name):
+            total += 1
+            batch.append((row_number, values))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+
+        return {
+            'imported': self.imported_count,
+            'updated': self.updated_count,
+            'unchanged': self.unchanged_count,
+            'skipped': self.skipped_count,
+            'total': total,
+            'errors': self.errors,
+        }
+
+    def _import_batch(self, batch):
+        # Разбираем строки; при повторе номера действует последняя строка
+        rows = {}
+        for row_number, values in batch:
+            try:
+                fields = parse_row(values)
+            except ValueError as e:
+                self.skipped_count += 1
+                self.errors.append(f'Строка {row_number}: {e}')
+                continue
+            number = fields.pop('license_number', None)
+            if not number:
+                self.skipped_count += 1
+                self.errors.append(f'Строка {row_number}: не указан номер лицензии')
+                continue
+            if number in rows:
+                self.skipped_count += 1
+                self.errors.append(
+                    f'Строка {rows[number][0]}: номер {number} повторяется в строке {row_number}, '
+                    f'используются её значения'
+                )
+            rows[number] = (row_number, fields)
+
+        if rows:
+            self._write_batch({number: fields for number, (row_number, fields) in rows.items()})
+
+    def _write_batch(self, rows, retry=False):
+        """Записывает пачку разобранных строк {номер: поля} одной транзакцией"""
+        now = timezone.now()
+        columns = {field for fields in rows.values() for field in fields}
+        changed = []
+        changed_fields = set()
+        created = []
+        unchanged = 0
+        try:
+            with transaction.atomic():
+                existing = {
+                    license_obj.license_number: license_obj
+                    for license_obj in License.objects.select_for_update().filter(
+                        license_number__in=list(rows)).only('license_number', 'min_lon', *columns)
+                }
+                for number, fields in rows.items():
+                    license_obj = existing.get(number)
+                    if license_obj is None:
+                        created.append(self._new_license(number, fields, now))
+                        continue
+                    updated = self._apply(license_obj, fields)
+                    if updated:
+                        license_obj.updated_at = now
+                        license_obj.change_seq = None
+                        changed.append(license_obj)
+                        changed_fields.update(updated)
+                    else:
+                        unchanged += 1
+
+                if changed:
+                    License.objects.bulk_update(changed, sorted(changed_fields) + ['updated_at', 'change_seq'])
+                if created:
+                    License.objects.bulk_create(created)
+                if changed or created:
+                    registry_changed()
+        except IntegrityError:
+            # Лицензию с тем же номером только что создал параллельный
+            # импорт - повторяем пачку, она попадёт в обновляемые
+            if retry:
+                raise
+            return self._write_batch(rows, retry=True)
+
+        self.imported_count += len(created)
+        self.updated_count += len(changed)
+        self.unchanged_count += unchanged
+
+    def _apply(self, license_obj, fields):
+        """Переносит значения строки в лицензию; возвращает изменённые поля"""
+        updated = []
+        for field, value in fields.items():
+            if value is None and field not in CLEARABLE_FIELDS:
+                continue
+            if field in GEOMETRY_FIELDS and license_obj.min_lon is not None:
+                # Центр лицензии с полигоном рассчитывается по контуру
+                continue
+            if getattr(license_obj, field) != value:
+                setattr(license_obj, field, value)
+                updated.append(field)
+        return updated
+
+    def _new_license(self, number, fields, now):
+        values = {
+            field: value for field, value in fields.items()
+            if value is not None
+        }
+        values.setdefault('region', self.extract_region(number))
+        values.setdefault('issue_date', date.today())
+        values.setdefault('mineral_type', 'Не указано')
+        values.setdefault('license_type', '')
+        values.setdefault('owner', '')
+        return License(license_number=number, created_at=now, updated_at=now, **values)
@@ -0,0 +1,289 @@
+let allLicenses = [];
+let typeChart, regionChart, expiryChart;
+
+document.addEventListener('DOMContentLoaded', function() {
+    loadAllLicensesForAnalytics();
+
+    window.addEventListener('themeChanged', function(e) {
+        updateChartsTheme(e.detail.theme);
+    });
+});
+
+function getThemeColors() {
+    const isDark = document.documentElement.getAttribute('data-theme') === 'dark';
+    return {
+        text: isDark ? '#f1f5f9' : '#1a1a1a',
+        textMuted: isDark ? '#94a3b8' : '#666666',
+        border: isDark ? '#334155' : '#e5e5e5',
+        tooltipBg: isDark ? 'rgba(30, 41, 59, 0.95)' : 'rgba(30, 58, 138, 0.9)',
+        gridColor: isDark ? 'rgba(100, 116, 139, 0.2)' : 'rgba(0, 0, 0, 0.08)'
+    };
+}
+
+function loadAllLicensesForAnalytics() {
+    RegistryCache.load()
+        .then(data => {
+            allLicenses = data;
+            console.log('Загружено лицензий для аналитики:', allLicenses.length);
+            createAnalyticsCharts();
+            document.getElementById('loadingOverlay').classList.add('hidden');
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки данных:', error);
+            document.getElementById('loadingOverlay').innerHTML = 'Ошибка загрузки данных';
+        });
+}
+
+function createAnalyticsCharts() {
+    createTypeChart();
+    createRegionChart();
+    createExpiryChart();
+}
+
+function updateChartsTheme() {
+    createAnalyticsCharts();
+}
+
+function createTypeChart() {
+    const typeCount = {};
+    allLicenses.forEach(license => {
+        const type = license.license_type || 'Неизвестно';
+        typeCount[type] = (typeCount[type] || 0) + 1;
+    });
+
+    const ctx = document.getElementById('typeChart').getContext('2d');
+    const colors = getThemeColors();
+
+    if (typeChart) typeChart.destroy();
+    typeChart = new Chart(ctx, {
+        type: 'doughnut',
+        data: {
+            labels: Object.keys(typeCount),
+            datasets: [{
+                data: Object.values(typeCount),
+                backgroundColor: [
+                    '#93C5FD',
+                    '#BFDBFE',
+                    '#DBEAFE',
+                    '#EFF6FF',
+                    '#F0F9FF'
+                ],
+                borderWidth: 2,
+                borderColor: colors.border
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: true,
+            plugins: {
+                legend: {
+                    position: 'bottom',
+                    labels: {
+                        padding: 15,
+                        font: {
+                            family: 'Inter, system-ui, sans-serif',
+                            size: 13,
+                            weight: '600'
+                        },
+                        color: colors.text
+                    }
+                },
+                tooltip: {
+                    backgroundColor: colors.tooltipBg,
+                    titleFont: {
+                        family: 'Inter, system-ui, sans-serif',
+                        size: 14,
+                        weight: '700'
+                    },
+                    bodyFont: {
+                        family: 'Inter, system-ui, sans-serif',
+                        size: 13
+                    },
+                    padding: 12,
+                    cornerRadius: 8
+                }
+            }
+        }
+    });
+}
+
+function createRegionChart() {
+    const regionCount = {};
+    allLicenses.forEach(license => {
+        const region = license.region || 'Неизвестно';
+        regionCount[region] = (regionCount[region] || 0) + 1;
+    });
+
+    // Топ-5 регионов
+    const sorted = Object.entries(regionCount)
+        .sort((a, b) => b[1] - a[1])
+        .slice(0, 5);
+
+    const ctx = document.getElementById('regionChart').getContext('2d');
+    const colors = getThemeColors();
+
+    if (regionChart) regionChart.destroy();
+    regionChart = new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: sorted.map(item => item[0]),
+            datasets: [{
+                label: 'Количество лицензий',
+                data: sorted.map(item => item[1]),
+                backgroundColor: '#93C5FD',
+                borderRadius: 8,
+                borderWidth: 0
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: true,
+            plugins: {
+                legend: {
+                    display: false
+                },
+                tooltip: {
+                    backgroundColor: colors.tooltipBg,
+                    titleFont: {
+                        family: 'Inter, system-ui, sans-serif',
+                        size: 14,
+                        weight: '700'
+                    },
+                    bodyFont: {
+                        family: 'Inter, system-ui, sans-serif',
+                        size: 13
+                    },
+                    padding: 12,
+                    cornerRadius: 8
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    ticks: {
+                        font: {
+                            family: 'Inter, system-ui, sans-serif',
+                            size: 12
+                        },
+                        color: colors.textMuted
+                    },
+                    grid: {
+                        color: colors.gridColor
+                    }
+                },
+                x: {
+                    ticks: {
+                        font: {
+                            family: 'Inter, system-ui, sans-serif',
+                            size: 12,
+                            weight: '600'
+                        },
+                        color: colors.text
+                    },
+                    grid: {
+                        display: false
+                    }
+                }
+            }
+        }
+    });
+}
+
+function createExpiryChart() {
+    // Группируем лицензии по месяцам истечения на следующие 12 месяцев
+    const now = new Date();
+    const monthsData = [];
+    const monthLabels = [];
+
+    for (let i = 0; i < 12; i++) {
+        const monthDate = new Date(now.getFullYear(), now.getMonth() + i, 1);
+        const monthName = monthDate.toLocaleDateString('ru-RU', { month: 'short', year: 'numeric' });
+        monthLabels.push(monthName);
+
+        const count = allLicenses.filter(license => {
+            if (!license.expiry_date) return false;
+            const expiryDate = new Date(license.expiry_date);
+            return expiryDate.getFullYear() === monthDate.getFullYear() &&
+                   expiryDate.getMonth() === monthDate.getMonth();
+        }).length;
+
+        monthsData.push(count);
+    }
+
+    const ctx = document.getElementById('expiryChart').getContext('2d');
+    const colors = getThemeColors();
+
+    if (expiryChart) expiryChart.destroy();
+    expiryChart = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: monthLabels,
+            datasets: [{
+                label: 'Истекающие лицензии',
+                data: monthsData,
+                borderColor: '#93C5FD',
+                backgroundColor: 'rgba(147, 197, 253, 0.1)',
+                borderWidth: 3,
+                fill: true,
+                tension: 0.4,
+                pointBackgroundColor: '#93C5FD',
+                pointBorderColor: colors.border,
+                pointBorderWidth: 2,
+                pointRadius: 5,
+                pointHoverRadius: 7
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: true,
+            plugins: {
+                legend: {
+                    display: false
+                },
+                tooltip: {
+                    backgroundColor: colors.tooltipBg,
+                    titleFont: {
+                        family: 'Inter, system-ui, sans-serif',
+                        size: 14,
+                        weight: '700'
+                    },
+                    bodyFont: {
+                        family: 'Inter, system-ui, sans-serif',
+                        size: 13
+                    },
+                    padding: 12,
+                    cornerRadius: 8
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    ticks: {
+                        font: {
+                            family: 'Inter, system-ui, sans-serif',
+                            size: 12
+                        },
+                        color: colors.textMuted,
+                        stepSize: 1
+                    },
+                    grid: {
+                        color: colors.gridColor
+                    }
+                },
+                x: {
+                    ticks: {
+                        font: {
+                            family: 'Inter, system-ui, sans-serif',
+                            size: 12,
+                            weight: '600'
+                        },
+                        color: colors.text
+                    },
+                    grid: {
+                        display: false
+                    }
+                }
+            }
+        }
+    });
+}
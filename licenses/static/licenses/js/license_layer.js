@@ -0,0 +1,189 @@
+// Слой лицензий карты на ymaps.ObjectManager.
+//
+// Объект карты для лицензии создаётся один раз и остаётся в менеджере;
+// смена набора видимых лицензий (фильтры, область карты) применяется
+// через setFilter, без удаления и пересоздания объектов. Новые лицензии
+// добавляются одной коллекцией (FeatureCollection).
+//
+// ObjectManager не поддерживает MultiPolygon, поэтому каждый полигон
+// контура - отдельный объект с общим properties.licenseId. Полигоны
+// получают zIndex по площади: маленькие рисуются поверх больших.
+//
+// describe(license) возвращает { properties, options } объекта:
+// содержимое балуна, цвета, пресет метки.
+class LicenseLayer {
+    static SIGNATURE_FIELDS = [
+        'license_number', 'owner', 'region', 'license_type', 'status', 'area_km2', 'latitude', 'longitude',
+    ];
+
+    constructor(map, describe) {
+        this.map = map;
+        this.describe = describe;
+        this.manager = new ymaps.ObjectManager({ clusterize: false });
+        this.signatures = new Map();  // licenseId -> подпись лицензии, по которой построены объекты
+        this.sources = new Map();     // licenseId -> последний переданный объект лицензии
+        this.objectIds = new Map();   // licenseId -> идентификаторы объектов менеджера
+        this.bounds = new Map();      // licenseId -> [[minLat, minLon], [maxLat, maxLon]]
+        this.baseOptions = new Map(); // идентификатор объекта -> опции без подсветки
+        this.visible = new Set();
+        this.highlighted = null;
+        this.nextObjectId = 1;
+        map.geoObjects.add(this.manager);
+    }
+
+    static polygonArea(ring) {
+        let area = 0;
+        for (let i = 0; i < ring.length - 1; i++) {
+            area += ring[i][0] * ring[i + 1][1] - ring[i + 1][0] * ring[i][1];
+        }
+        return Math.abs(area) / 2;
+    }
+
+    // Объекты менеджера для лицензии (координаты GeoJSON [lon, lat] -> [lat, lon])
+    buildObjects(license) {
+        const { properties, options } = this.describe(license);
+        const base = { ...properties, licenseId: license.id };
+        const objects = [];
+        let minLat = Infinity, minLon = Infinity, maxLat = -Infinity, maxLon = -Infinity;
+
+        const geometry = license.polygon_data;
+        const polygons = !geometry || !geometry.coordinates ? []
+            : geometry.type === 'Polygon' ? [geometry.coordinates]
+            : geometry.type === 'MultiPolygon' ? geometry.coordinates : [];
+
+        polygons.forEach(rings => {
+            const coordinates = rings.map(ring => ring.map(([lon, lat]) => {
+                minLat = Math.min(minLat, lat); maxLat = Math.max(maxLat, lat);
+                minLon = Math.min(minLon, lon); maxLon = Math.max(maxLon, lon);
+                return [lat, lon];
+            }));
+            const area = rings[0] ? LicenseLayer.polygonArea(rings[0]) : 0;
+            objects.push({
+                type: 'Feature',
+                id: this.nextObjectId++,
+                geometry: { type: 'Polygon', coordinates },
+                properties: base,
+                options: { ...options.polygon, zIndex: Math.round(1000 - 100 * Math.log10(1 + area * 1000)) },
+            });
+        });
+
+        if (!objects.length && license.latitude && license.longitude) {
+            const lat = Number(license.latitude), lon = Number(license.longitude);
+            minLat = maxLat = lat;
+            minLon = maxLon = lon;
+            objects.push({
+                type: 'Feature',
+                id: this.nextObjectId++,
+                geometry: { type: 'Point', coordinates: [lat, lon] },
+                properties: base,
+                options: { ...options.point, zIndex: 2000 },
+            });
+        }
+        if (objects.length) {
+            this.bounds.set(license.id, [[minLat, minLon], [maxLat, maxLon]]);
+        }
+        return objects;
+    }
+
+    // Подпись лицензии без координат: поля балуна и стиля, area_km2
+    // меняется вместе с контуром. Ответы разных API сравниваются по ней
+    static signature(license) {
+        return JSON.stringify(LicenseLayer.SIGNATURE_FIELDS.map(field => license[field] ?? null))
+            + (license.polygon_data ? '#polygon' : '');
+    }
+
+    // Добавляет объекты лицензий, которых ещё нет в менеджере (или которые изменились)
+    ensure(licenses) {
+        const features = [];
+        const stale = [];
+        licenses.forEach(license => {
+            // Повторный показ тех же объектов (смена фильтров) - без подписи
+            if (this.sources.get(license.id) === license) return;
+            this.sources.set(license.id, license);
+            const signature = LicenseLayer.signature(license);
+            const known = this.signatures.get(license.id);
+            // Та же лицензия из другого ответа API (в том числе без контура,
+            // если объекты уже построены по контуру) не пересоздаётся
+            if (known === signature || (known && !license.polygon_data && known === signature + '#polygon')) {
+                return;
+            }
+            if (known) stale.push(...this.objectIds.get(license.id));
+            const objects = this.buildObjects(license);
+            this.signatures.set(license.id, signature);
+            this.objectIds.set(license.id, objects.map(object => object.id));
+            objects.forEach(object => this.baseOptions.set(object.id, object.options));
+            features.push(...objects);
+        });
+        if (stale.length) {
+            this.manager.remove(stale);
+            stale.forEach(id => this.baseOptions.delete(id));
+        }
+        if (features.length) {
+            this.manager.add({ type: 'FeatureCollection', features });
+        }
+        return features.length;
+    }
+
+    // Показывает только эти лицензии; возвращает число видимых лицензий
+    show(licenses) {
+        this.ensure(licenses);
+        this.visible = new Set(licenses.map(license => license.id));
+        const visible = this.visible;
+        this.manager.setFilter(object => visible.has(object.properties.licenseId));
+        return this.visible.size;
+    }
+
+    hide() {
+        this.visible = new Set();
+        this.manager.setFilter(() => false);
+    }
+
+    // Охват видимых лицензий для setBounds (null, если их нет)
+    getBounds(licenseIds = this.visible) {
+        let result = null;
+        licenseIds.forEach(id => {
+            const bounds = this.bounds.get(id);
+            if (!bounds) return;
+            if (!result) {
+                result = [bounds[0].slice(), bounds[1].slice()];
+                return;
+            }
+            result[0][0] = Math.min(result[0][0], bounds[0][0]);
+            result[0][1] = Math.min(result[0][1], bounds[0][1]);
+            result[1][0] = Math.max(result[1][0], bounds[1][0]);
+            result[1][1] = Math.max(result[1][1], bounds[1][1]);
+        });
+        return result;
+    }
+
+    highlight(licenseId) {
+        if (this.highlighted !== null) {
+            (this.objectIds.get(this.highlighted) || []).forEach(id => {
+                this.manager.objects.setObjectOptions(id, this.baseOptions.get(id));
+            });
+            this.highlighted = null;
+        }
+        const ids = this.objectIds.get(licenseId);
+        if (!ids) return false;
+        ids.forEach(id => {
+            this.manager.objects.setObjectOptions(id, {
+                ...this.baseOptions.get(id),
+                strokeColor: '#FFD700', // Яркий золотой цвет для выделения
+                strokeWidth: 6,
+            });
+        });
+        this.highlighted = licenseId;
+        return true;
+    }
+
+    has(licenseId) {
+        return this.visible.has(licenseId) && this.objectIds.has(licenseId);
+    }
+
+    openBalloon(licenseId) {
+        const ids = this.objectIds.get(licenseId);
+        if (ids && ids.length) {
+            this.manager.objects.balloon.open(ids[0]);
+        }
+    }
+}
@@ -0,0 +1,1313 @@
+let currentLicenseId = null;
+let myMap;
+let allLicenses = [];
+let filteredLicenses = [];
+let currentPage = 1;
+let paginationData = null;
+let currentFiltersActive = false;
+const ITEMS_PER_PAGE = 12;
+let licenseLayer = null; // Лицензии на карте (LicenseLayer, один ObjectManager)
+let clusterCollection = null; // Кластеры с сервера на мелком масштабе
+let viewportLicenses = null; // Лицензии в видимой области карты (?bbox=)
+let viewportTimer = null;
+let viewportController = null;
+// Настройки страницы из шаблона (data-атрибуты контейнера карты)
+const mapSettings = document.getElementById('map').dataset;
+
+// До этого масштаба включительно сервер отдаёт кластеры вместо лицензий
+const CLUSTER_MAX_ZOOM = Number(mapSettings.clusterMaxZoom);
+
+// Фильтры и сводка по реестру считаются в Web Worker (registry_worker.js),
+// в основной поток возвращаются только идентификаторы лицензий
+const registryWorker = new Worker(mapSettings.workerUrl);
+let licensesById = new Map();
+let registryIndexed = false;
+let filterRequestId = 0;
+let searchTimer = null;
+const SEARCH_DEBOUNCE_MS = 200;
+
+registryWorker.onmessage = function(event) {
+    const message = event.data;
+    if (message.type === 'indexed') {
+        registryIndexed = true;
+        // Реестр обновился - ранее загруженные детали могли устареть
+        licenseDetails.clear();
+        updateStatistics(message.summary);
+        generateMapLegend(message.summary.types);
+        populateFilters(message.summary);
+        // Фильтры, выбранные до загрузки реестра
+        if (hasActiveFilters()) applyFilters();
+    } else if (message.type === 'filtered' && message.requestId === filterRequestId) {
+        filteredLicenses = Array.from(message.ids, id => licensesById.get(id));
+        currentFiltersActive = true;
+        displayFilteredPage(1);
+    }
+};
+
+ymaps.ready(init);
+
+let isMapActivated = false;
+
+function init() {
+    myMap = new ymaps.Map("map", {
+        center: [55.76, 37.64],
+        zoom: 5,
+        controls: ['zoomControl', 'searchControl', 'typeSelector', 'fullscreenControl']
+    });
+
+    // Отключаем скролл-зум по умолчанию
+    myMap.behaviors.disable('scrollZoom');
+
+    licenseLayer = new LicenseLayer(myMap, describeLicense);
+    clusterCollection = new ymaps.GeoObjectCollection();
+    myMap.geoObjects.add(clusterCollection);
+
+    // При перемещении карты подгружаем только лицензии в видимой области
+    myMap.events.add('boundschange', function () {
+        clearTimeout(viewportTimer);
+        viewportTimer = setTimeout(loadLicensesInViewport, 300);
+    });
+
+    // Добавляем обработчик активации карты по клику на оверлей
+    const mapOverlay = document.getElementById('mapOverlay');
+    if (mapOverlay) {
+        mapOverlay.addEventListener('click', activateMap);
+        // Поддержка клавиатуры (Enter и Space)
+        mapOverlay.addEventListener('keydown', function(e) {
+            if (e.key === 'Enter' || e.key === ' ') {
+                e.preventDefault();
+                activateMap();
+            }
+        });
+    }
+
+    loadLicenses();
+}
+
+function activateMap() {
+    if (isMapActivated) return;
+
+    isMapActivated = true;
+
+    // Включаем скролл-зум
+    myMap.behaviors.enable('scrollZoom');
+
+    // Убираем оверлей с плавной анимацией
+    const mapOverlay = document.getElementById('mapOverlay');
+    if (mapOverlay) {
+        mapOverlay.style.opacity = '0';
+        setTimeout(() => {
+            mapOverlay.remove();
+        }, 300);
+    }
+}
+
+function loadLicenses(page = 1) {
+    currentPage = page;
+    fetch(`/api/licenses/?page=${page}&page_size=12&geometry=1`)
+        .then(response => response.json())
+        .then(data => {
+            console.log(`Загружено лицензий: ${data.results.length}`);
+
+            // Сохраняем данные пагинации
+            paginationData = data.pagination;
+
+            // Если это первая загрузка, загружаем все лицензии для статистики и фильтров
+            if (page === 1) {
+                loadAllLicensesForStats();
+            }
+
+            // Отображаем лицензии текущей страницы
+            filteredLicenses = data.results;
+            displayLicenses();
+            displayLicensesOnMap();
+            schedulePrefetch(data.results);
+
+            // Отображаем пагинацию
+            displayPagination();
+
+            // Обновляем счетчик результатов
+            updateResultsCount();
+        })
+        .catch(error => console.error('Ошибка загрузки лицензий:', error));
+}
+
+function loadAllLicensesForStats() {
+    // Загружаем ВСЕ лицензии для статистики без пагинации (через кеш в IndexedDB)
+    RegistryCache.load({ geometry: true })
+        .then(data => {
+            allLicenses = data;
+            licensesById = new Map(allLicenses.map(license => [license.id, license]));
+
+            try {
+                // Статистику, легенду и списки фильтров заполнит ответ воркера;
+                // контуры в воркер не передаются
+                registryIndexed = false;
+                registryWorker.postMessage({
+                    type: 'index',
+                    licenses: allLicenses.map(license => ({
+                        id: license.id,
+                        license_number: license.license_number,
+                        owner: license.owner,
+                        status: license.status,
+                        region: license.region,
+                        license_type: license.license_type,
+                        mineral_type: license.mineral_type,
+                    })),
+                });
+
+                // Обновляем карту, если фильтры не применены; на мелком
+                // масштабе вместо всех лицензий показываем кластеры
+                if (!currentFiltersActive) {
+                    if (myMap.getZoom() <= CLUSTER_MAX_ZOOM) {
+                        loadLicensesInViewport();
+                    } else {
+                        displayLicensesOnMap();
+                    }
+                }
+            } catch (error) {
+                console.error('Ошибка в обработке данных:', error);
+                console.error('Stack trace:', error.stack);
+            }
+        })
+        .catch(error => console.error('Ошибка загрузки статистики:', error));
+}
+
+function normalizeLongitude(lon) {
+    return ((lon + 180) % 360 + 360) % 360 - 180;
+}
+
+function loadLicensesInViewport() {
+    // При активных фильтрах на карте показываются отфильтрованные лицензии
+    if (currentFiltersActive) return;
+
+    // Яндекс возвращает [[lat, lon], [lat, lon]], API ожидает min_lon,min_lat,max_lon,max_lat
+    const bounds = myMap.getBounds();
+    const bbox = [
+        normalizeLongitude(bounds[0][1]), bounds[0][0],
+        normalizeLongitude(bounds[1][1]), bounds[1][0]
+    ].map(value => value.toFixed(5)).join(',');
+
+    // Отменяем предыдущий запрос, если карту сдвинули ещё раз
+    if (viewportController) viewportController.abort();
+    viewportController = new AbortController();
+
+    // На мелком масштабе - готовые кластеры с сервера
+    const zoom = Math.round(myMap.getZoom());
+    if (zoom <= CLUSTER_MAX_ZOOM) {
+        fetch(`/api/licenses/clusters/?zoom=${zoom}&bbox=${bbox}`, { signal: viewportController.signal })
+            .then(response => response.json())
+            .then(data => {
+                if (!currentFiltersActive && data.clustered) {
+                    viewportLicenses = null;
+                    displayClustersOnMap(data.clusters);
+                }
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    console.error('Ошибка загрузки кластеров:', error);
+                }
+            });
+        return;
+    }
+
+    fetch(`/api/licenses/all/?bbox=${bbox}&geometry=1`, { signal: viewportController.signal })
+        .then(response => response.json())
+        .then(data => {
+            viewportLicenses = data;
+            if (!currentFiltersActive) {
+                displayLicensesOnMap(false);
+            }
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Ошибка загрузки лицензий в области карты:', error);
+            }
+        });
+}
+
+function displayPagination() {
+    const container = document.getElementById('paginationContainer');
+    const pageNumbersDiv = document.getElementById('pageNumbers');
+    const paginationInfo = document.getElementById('paginationInfo');
+    const prevBtn = document.getElementById('prevBtn');
+    const nextBtn = document.getElementById('nextBtn');
+
+    if (!paginationData || paginationData.total_pages <= 1) {
+        container.style.display = 'none';
+        return;
+    }
+
+    container.style.display = 'flex';
+
+    // Обновляем кнопки Назад/Вперёд
+    prevBtn.disabled = !paginationData.has_previous;
+    nextBtn.disabled = !paginationData.has_next;
+
+    // Информация о странице
+    const start = (paginationData.current_page - 1) * 12 + 1;
+    const end = Math.min(paginationData.current_page * 12, paginationData.total_count);
+    paginationInfo.innerHTML = `Показано ${start}–${end} из ${paginationData.total_count}`;
+
+    // Генерируем номера страниц
+    pageNumbersDiv.innerHTML = '';
+    const totalPages = paginationData.total_pages;
+    const current = paginationData.current_page;
+
+    // Логика отображения страниц
+    let pages = [];
+
+    if (totalPages <= 7) {
+        // Показываем все страницы
+        for (let i = 1; i <= totalPages; i++) {
+            pages.push(i);
+        }
+    } else {
+        // Показываем первую, последнюю и соседние
+        pages.push(1);
+
+        if (current > 3) {
+            pages.push('...');
+        }
+
+        for (let i = Math.max(2, current - 1); i <= Math.min(totalPages - 1, current + 1); i++) {
+            pages.push(i);
+        }
+
+        if (current < totalPages - 2) {
+            pages.push('...');
+        }
+
+        pages.push(totalPages);
+    }
+
+    // Создаём кнопки
+    pages.forEach(page => {
+        if (page === '...') {
+            const ellipsis = document.createElement('span');
+            ellipsis.className = 'pagination-ellipsis';
+            ellipsis.textContent = '...';
+            pageNumbersDiv.appendChild(ellipsis);
+        } else {
+            const btn = document.createElement('button');
+            btn.className = 'pagination-btn' + (page === current ? ' active' : '');
+            btn.textContent = page;
+            btn.onclick = () => changePage(page);
+            pageNumbersDiv.appendChild(btn);
+        }
+    });
+}
+
+function changePage(direction) {
+    if (currentFiltersActive) {
+        // Клиентская пагинация (с фильтрами)
+        let newPage;
+
+        const totalPages = Math.ceil(filteredLicenses.length / ITEMS_PER_PAGE);
+
+        if (direction === 'prev') {
+            newPage = Math.max(1, currentPage - 1);
+        } else if (direction === 'next') {
+            newPage = Math.min(totalPages, currentPage + 1);
+        } else {
+            newPage = direction; // Номер страницы
+        }
+
+        displayFilteredPage(newPage);
+    } else {
+        // Серверная пагинация (без фильтров)
+        let newPage;
+
+        if (direction === 'prev') {
+            newPage = paginationData.previous_page;
+        } else if (direction === 'next') {
+            newPage = paginationData.next_page;
+        } else {
+            newPage = direction; // Номер страницы
+        }
+
+        if (newPage) {
+            loadLicenses(newPage);
+        }
+    }
+
+    // Прокрутка к заголовку списка лицензий с задержкой для обновления контента
+    setTimeout(() => {
+        const header = document.getElementById('licensesListHeader');
+        if (header) {
+            header.scrollIntoView({behavior: 'smooth', block: 'start'});
+        } else {
+            // Fallback на контейнер, если заголовок не найден
+            const container = document.querySelector('.licenses-content');
+            if (container) {
+                container.scrollIntoView({behavior: 'smooth', block: 'start'});
+            }
+        }
+    }, 100);
+}
+
+function updatePagination(totalItems, currentPageNum, isFiltered) {
+    const container = document.querySelector('.pagination-container');
+    const pageNumbersDiv = document.getElementById('pageNumbers');
+    const paginationInfo = document.getElementById('paginationInfo');
+    const prevBtn = document.getElementById('prevBtn');
+    const nextBtn = document.getElementById('nextBtn');
+
+    const totalPages = Math.ceil(totalItems / ITEMS_PER_PAGE);
+
+    // Скрываем пагинацию если результатов мало
+    if (totalItems <= ITEMS_PER_PAGE) {
+        container.style.display = 'none';
+        return;
+    }
+
+    container.style.display = 'flex';
+
+    // Обновляем кнопки Назад/Вперёд
+    prevBtn.disabled = currentPageNum <= 1;
+    nextBtn.disabled = currentPageNum >= totalPages;
+
+    // Информация о странице
+    const start = (currentPageNum - 1) * ITEMS_PER_PAGE + 1;
+    const end = Math.min(currentPageNum * ITEMS_PER_PAGE, totalItems);
+    paginationInfo.innerHTML = `Показано ${start}–${end} из ${totalItems}`;
+
+    // Генерируем номера страниц
+    pageNumbersDiv.innerHTML = '';
+    const current = currentPageNum;
+
+    // Определяем диапазон страниц для отображения
+    let startPage = Math.max(1, current - 2);
+    let endPage = Math.min(totalPages, current + 2);
+
+    // Корректируем диапазон, если мы близко к началу или концу
+    if (current <= 3) {
+        endPage = Math.min(5, totalPages);
+    }
+    if (current >= totalPages - 2) {
+        startPage = Math.max(1, totalPages - 4);
+    }
+
+    // Первая страница
+    if (startPage > 1) {
+        const btn = document.createElement('button');
+        btn.className = 'pagination-btn';
+        btn.textContent = '1';
+        btn.onclick = () => changePage(1);
+        pageNumbersDiv.appendChild(btn);
+
+        if (startPage > 2) {
+            const ellipsis = document.createElement('span');
+            ellipsis.className = 'pagination-ellipsis';
+            ellipsis.textContent = '...';
+            pageNumbersDiv.appendChild(ellipsis);
+        }
+    }
+
+    // Страницы в диапазоне
+    for (let i = startPage; i <= endPage; i++) {
+        const btn = document.createElement('button');
+        btn.className = `pagination-btn ${i === current ? 'active' : ''}`;
+        btn.textContent = i;
+        btn.onclick = () => changePage(i);
+        pageNumbersDiv.appendChild(btn);
+    }
+
+    // Последняя страница
+    if (endPage < totalPages) {
+        if (endPage < totalPages - 1) {
+            const ellipsis = document.createElement('span');
+            ellipsis.className = 'pagination-ellipsis';
+            ellipsis.textContent = '...';
+            pageNumbersDiv.appendChild(ellipsis);
+        }
+
+        const btn = document.createElement('button');
+        btn.className = 'pagination-btn';
+        btn.textContent = totalPages;
+        btn.onclick = () => changePage(totalPages);
+        pageNumbersDiv.appendChild(btn);
+    }
+}
+
+function updateStatistics(summary) {
+    const container = document.getElementById('statistics');
+    if (!container) return;
+
+    // Сводка по реестру из воркера
+    const totalCount = summary.total;
+    const activeCount = summary.active;
+    const uniqueRegions = summary.regions;
+    const uniqueTypes = summary.types;
+
+    // 4 фиксированные статистические карточки
+    container.innerHTML = `
+        <div class="stat-card">
+            <div class="stat-number">${totalCount}</div>
+            <div class="stat-label">Всего лицензий</div>
+        </div>
+        <div class="stat-card">
+            <div class="stat-number">${activeCount}</div>
+            <div class="stat-label">Действующие</div>
+        </div>
+        <div class="stat-card">
+            <div class="stat-number">${uniqueRegions.length}</div>
+            <div class="stat-label">Регионов</div>
+        </div>
+        <div class="stat-card">
+            <div class="stat-number">${uniqueTypes.length}</div>
+            <div class="stat-label">Типов недропользования</div>
+        </div>
+    `;
+}
+
+function updateTabCounts() {
+    // Обновляем счетчик "Все"
+    const countAllElement = document.getElementById('countAll');
+    if (countAllElement) {
+        countAllElement.textContent = allLicenses.length;
+    }
+
+    // Обновляем счетчики для каждого типа
+    const uniqueTypes = [...new Set(allLicenses.map(l => l.license_type))].sort();
+    uniqueTypes.forEach(type => {
+        const count = allLicenses.filter(l => l.license_type === type).length;
+        const countElement = document.getElementById(`count-${type}`);
+        if (countElement) {
+            countElement.textContent = count;
+        }
+    });
+}
+
+function generateLicenseTypeTabs() {
+    const container = document.getElementById('licenseTypeTabs');
+    if (!container) return;
+
+    // Получаем уникальные типы лицензий
+    const uniqueTypes = [...new Set(allLicenses.map(l => l.license_type))].sort();
+
+    // Генерируем кнопки
+    let html = `
+        <button class="tab-button active" data-type="" onclick="filterByType('')" 
+                title="Показать все лицензии" aria-label="Показать все лицензии">
+            <span class="tab-color-indicator" style="background-color: var(--accent-color);"></span>
+            Все <span class="tab-count" id="countAll">0</span>
+        </button>
+    `;
+
+    uniqueTypes.forEach(type => {
+        const description = getLicenseTypeDescription(type);
+        const color = getColorByUsageType(type);
+        html += `
+        <button class="tab-button" data-type="${type}" onclick="filterByType('${type}')"
+                title="${description}" aria-label="Фильтр: ${type} - ${description}"
+                style="--type-color: ${color};">
+            <span class="tab-color-indicator" style="background-color: ${color};"></span>
+            ${type} <span class="tab-count" id="count-${type}">0</span>
+        </button>
+        `;
+    });
+
+    container.innerHTML = html;
+}
+
+function generateMapLegend(uniqueTypes) {
+    const container = document.getElementById('legendItems');
+    if (!container) return;
+
+    // Генерируем элементы легенды
+    let html = '';
+    uniqueTypes.forEach(type => {
+        const color = getColorByUsageType(type);
+        const description = getLicenseTypeDescription(type);
+        html += `
+            <div class="legend-item">
+                <span class="legend-color" style="background-color: ${color};"></span>
+                ${type} - ${description}
+            </div>
+        `;
+    });
+
+    container.innerHTML = html;
+}
+
+function getLicenseTypeDescription(type) {
+    // Здесь можно добавить описания для известных типов
+    const descriptions = {
+        'БЭ': 'Благородные металлы, разведка и добыча',
+        'БП': 'Благородные металлы, геологическое изучение',
+        'БР': 'Благородные металлы, совмещенное пользование – для геологического изучения, разведки и добычи',
+        'ТП': 'Твердые полезные, геологическое изучение'
+    };
+    return descriptions[type] || 'Пользование недрами';
+}
+
+function filterByType(type) {
+    // Обновляем активный таб
+    document.querySelectorAll('.tab-button').forEach(btn => {
+        btn.classList.remove('active');
+    });
+    event.target.closest('.tab-button').classList.add('active');
+
+    // Устанавливаем фильтр по типу
+    document.getElementById('filterType').value = type;
+
+    // Применяем фильтры
+    applyFilters();
+}
+
+function populateFilters({ regions, types, minerals }) {
+    // Списки могут перестраиваться после синхронизации - выбранное значение сохраняется
+    const selected = ['filterRegion', 'filterType', 'filterMineral'].map(id => document.getElementById(id).value);
+
+    const regionSelect = document.getElementById('filterRegion');
+    // Очищаем старые опции, оставляя только первую ("Все регионы")
+    while (regionSelect.options.length > 1) {
+        regionSelect.remove(1);
+    }
+    regions.forEach(region => {
+        const option = document.createElement('option');
+        option.value = region;
+        option.textContent = region;
+        regionSelect.appendChild(option);
+    });
+
+    const typeSelect = document.getElementById('filterType');
+    // Очищаем старые опции, оставляя только первую ("Все виды")
+    while (typeSelect.options.length > 1) {
+        typeSelect.remove(1);
+    }
+    types.forEach(type => {
+        const option = document.createElement('option');
+        option.value = type;
+        option.textContent = type;
+        typeSelect.appendChild(option);
+    });
+
+    const mineralSelect = document.getElementById('filterMineral');
+    // Очищаем старые опции, оставляя только первую ("Все виды")
+    while (mineralSelect.options.length > 1) {
+        mineralSelect.remove(1);
+    }
+    minerals.forEach(mineral => {
+        const option = document.createElement('option');
+        option.value = mineral;
+        option.textContent = mineral;
+        mineralSelect.appendChild(option);
+    });
+
+    ['filterRegion', 'filterType', 'filterMineral'].forEach((id, index) => {
+        document.getElementById(id).value = selected[index];
+    });
+}
+
+function getFilterCriteria() {
+    return {
+        status: document.getElementById('filterStatus').value,
+        region: document.getElementById('filterRegion').value,
+        license_type: document.getElementById('filterType').value,
+        mineral_type: document.getElementById('filterMineral').value,
+        search: document.getElementById('searchText').value.toLowerCase(),
+    };
+}
+
+function hasActiveFilters() {
+    return Object.values(getFilterCriteria()).some(value => value);
+}
+
+// Поиск при наборе текста - после паузы, а не на каждое нажатие клавиши
+function scheduleSearch() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(applyFilters, SEARCH_DEBOUNCE_MS);
+}
+
+function applyFilters() {
+    clearTimeout(searchTimer);
+    // Ответы воркера на предыдущие запросы больше не нужны
+    filterRequestId++;
+
+    if (hasActiveFilters()) {
+        // Клиентская пагинация включится по ответу воркера; до загрузки
+        // реестра фильтры применятся после его индексации
+        if (registryIndexed) {
+            registryWorker.postMessage({ type: 'filter', requestId: filterRequestId, criteria: getFilterCriteria() });
+        }
+    } else {
+        // Если фильтров нет, возвращаемся к серверной пагинации
+        currentFiltersActive = false;
+        loadLicenses(1);
+    }
+}
+
+function resetFilters() {
+    document.getElementById('filterStatus').value = '';
+    document.getElementById('filterRegion').value = '';
+    document.getElementById('filterType').value = '';
+    document.getElementById('filterMineral').value = '';
+    document.getElementById('searchText').value = '';
+
+    // Сбрасываем активный таб
+    document.querySelectorAll('.tab-button').forEach(btn => {
+        btn.classList.remove('active');
+    });
+    document.querySelector('.tab-button[data-type=""]').classList.add('active');
+
+    // Возвращаемся к серверной пагинации
+    filterRequestId++;
+    currentFiltersActive = false;
+    loadLicenses(1);
+}
+
+function showExportSpinner() {
+    const spinner = document.querySelector('.export-spinner');
+    if (spinner) {
+        spinner.style.display = 'block';
+    }
+}
+
+function hideExportSpinner() {
+    const spinner = document.querySelector('.export-spinner');
+    if (spinner) {
+        spinner.style.display = 'none';
+    }
+}
+
+function exportToExcel() {
+    // Показываем индикатор загрузки
+    showExportSpinner();
+
+    // Собираем текущие параметры фильтров
+    const params = new URLSearchParams();
+
+    const statusFilter = document.getElementById('filterStatus').value;
+    const regionFilter = document.getElementById('filterRegion').value;
+    const typeFilter = document.getElementById('filterType').value;
+    const mineralFilter = document.getElementById('filterMineral').value;
+    const searchText = document.getElementById('searchText').value;
+
+    if (statusFilter) params.append('status', statusFilter);
+    if (regionFilter) params.append('region', regionFilter);
+    if (typeFilter) params.append('type', typeFilter);
+    if (mineralFilter) params.append('mineral', mineralFilter);
+    if (searchText) params.append('search', searchText);
+
+    // Формируем URL для экспорта
+    const exportUrl = `/api/licenses/export/excel/?${params.toString()}`;
+
+    // Открываем ссылку для скачивания
+    window.location.href = exportUrl;
+
+    // Скрываем индикатор через 2 секунды
+    setTimeout(hideExportSpinner, 2000);
+}
+
+function exportToPDF() {
+    // Показываем индикатор загрузки
+    showExportSpinner();
+
+    // Собираем текущие параметры фильтров
+    const params = new URLSearchParams();
+
+    const statusFilter = document.getElementById('filterStatus').value;
+    const regionFilter = document.getElementById('filterRegion').value;
+    const typeFilter = document.getElementById('filterType').value;
+    const mineralFilter = document.getElementById('filterMineral').value;
+    const searchText = document.getElementById('searchText').value;
+
+    if (statusFilter) params.append('status', statusFilter);
+    if (regionFilter) params.append('region', regionFilter);
+    if (typeFilter) params.append('type', typeFilter);
+    if (mineralFilter) params.append('mineral', mineralFilter);
+    if (searchText) params.append('search', searchText);
+
+    // Формируем URL для экспорта
+    const exportUrl = `/api/licenses/export/pdf/?${params.toString()}`;
+
+    // Открываем ссылку для скачивания
+    window.location.href = exportUrl;
+
+    // Скрываем индикатор через 2 секунды
+    setTimeout(hideExportSpinner, 2000);
+}
+
+function updateResultsCount() {
+    const count = filteredLicenses.length;
+    const total = allLicenses.length;
+    document.getElementById('resultsCount').textContent = `Найдено: ${count} из ${total}`;
+}
+
+function displayLicenses() {
+    const container = document.getElementById('licensesList');
+
+    if (filteredLicenses.length === 0) {
+        container.innerHTML = '<p class="text-muted text-center py-5">Лицензии не найдены</p>';
+        return;
+    }
+
+    container.innerHTML = filteredLicenses.map(license => `
+    <div class="license-card" onclick="showLicenseDetails(${license.id})">
+        <div class="d-flex justify-content-between align-items-start">
+            <div class="license-card-title">${license.license_number}</div>
+            <span class="status-badge status-${license.status}">${getStatusText(license.status)}</span>
+        </div>
+        <p style="color: var(--text-muted); margin: 0.5rem 0 0 0;">${license.owner}</p>
+
+        <div class="license-meta">
+            <div class="meta-item">
+                <svg class="meta-icon" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M17.657 16.657L13.414 20.9a1.998 1.998 0 01-2.827 0l-4.244-4.243a8 8 0 1111.314 0z"/>
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M15 11a3 3 0 11-6 0 3 3 0 016 0z"/>
+                </svg>
+                <div class="meta-content">
+                    <div class="meta-label">Регион</div>
+                    <div class="meta-value">${license.region}</div>
+                </div>
+            </div>
+            <div class="meta-item">
+                <svg class="meta-icon" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M7 7h.01M7 3h5c.512 0 1.024.195 1.414.586l7 7a2 2 0 010 2.828l-7 7a2 2 0 01-2.828 0l-7-7A1.994 1.994 0 013 12V7a4 4 0 014-4z"/>
+                </svg>
+                <div class="meta-content">
+                    <div class="meta-label">Тип</div>
+                    <div class="meta-value">${license.license_type}</div>
+                </div>
+            </div>
+            ${license.mineral_type ? `
+            <div class="meta-item">
+                <svg class="meta-icon" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M20 7l-8-4-8 4m16 0l-8 4m8-4v10l-8 4m0-10L4 7m8 4v10M4 7v10l8 4"/>
+                </svg>
+                <div class="meta-content">
+                    <div class="meta-label">Полезное ископаемое</div>
+                    <div class="meta-value">${license.mineral_type}</div>
+                </div>
+            </div>
+            ` : ''}
+        </div>
+    </div>
+`).join('');
+
+    updateResultsCount();
+}
+
+function displayFilteredPage(pageNum) {
+    currentPage = pageNum;
+
+    const start = (pageNum - 1) * ITEMS_PER_PAGE;
+    const end = start + ITEMS_PER_PAGE;
+    const pageData = filteredLicenses.slice(start, end);
+
+    const container = document.getElementById('licensesList');
+
+    if (filteredLicenses.length === 0) {
+        container.innerHTML = '<p class="text-muted text-center py-5">Лицензии не найдены</p>';
+        updatePagination(0, 1, true);
+        return;
+    }
+
+    container.innerHTML = pageData.map(license => `
+    <div class="license-card" onclick="showLicenseDetails(${license.id})">
+        <div class="d-flex justify-content-between align-items-start">
+            <div class="license-card-title">${license.license_number}</div>
+            <span class="status-badge status-${license.status}">${getStatusText(license.status)}</span>
+        </div>
+        <p style="color: var(--text-muted); margin: 0.5rem 0 0 0;">${license.owner}</p>
+
+        <div class="license-meta">
+            <div class="meta-item">
+                <svg class="meta-icon" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M17.657 16.657L13.414 20.9a1.998 1.998 0 01-2.827 0l-4.244-4.243a8 8 0 1111.314 0z"/>
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M15 11a3 3 0 11-6 0 3 3 0 016 0z"/>
+                </svg>
+                <div class="meta-content">
+                    <div class="meta-label">Регион</div>
+                    <div class="meta-value">${license.region}</div>
+                </div>
+            </div>
+            <div class="meta-item">
+                <svg class="meta-icon" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M7 7h.01M7 3h5c.512 0 1.024.195 1.414.586l7 7a2 2 0 010 2.828l-7 7a2 2 0 01-2.828 0l-7-7A1.994 1.994 0 013 12V7a4 4 0 014-4z"/>
+                </svg>
+                <div class="meta-content">
+                    <div class="meta-label">Тип</div>
+                    <div class="meta-value">${license.license_type}</div>
+                </div>
+            </div>
+            ${license.mineral_type ? `
+            <div class="meta-item">
+                <svg class="meta-icon" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M20 7l-8-4-8 4m16 0l-8 4m8-4v10l-8 4m0-10L4 7m8 4v10M4 7v10l8 4"/>
+                </svg>
+                <div class="meta-content">
+                    <div class="meta-label">Полезное ископаемое</div>
+                    <div class="meta-value">${license.mineral_type}</div>
+                </div>
+            </div>
+            ` : ''}
+        </div>
+    </div>
+    `).join('');
+
+    updatePagination(filteredLicenses.length, pageNum, true);
+    displayLicensesOnMap();
+    updateResultsCount();
+    schedulePrefetch(pageData);
+}
+
+// Содержимое балуна и стиль объекта лицензии для LicenseLayer
+function describeLicense(license) {
+    const color = getColorByUsageType(license.license_type);
+    return {
+        properties: {
+            balloonContentHeader: `<strong>${license.license_number}</strong>`,
+            balloonContentBody: `
+                    <div class="license-info">
+                        <p><strong>Недропользователь:</strong> ${license.owner}</p>
+                        <p><strong>Регион:</strong> ${license.region}</p>
+                        <p><strong>Вид пользования:</strong> ${license.license_type}</p>
+                        <p><strong>Статус:</strong> ${getStatusText(license.status)}</p>
+                        <button class="btn btn-sm btn-primary mt-2" onclick="showLicenseDetails(${license.id})">
+                            Подробнее
+                        </button>
+                    </div>
+                `,
+            hintContent: license.license_number
+        },
+        options: {
+            polygon: {
+                fillColor: color,
+                fillOpacity: 0.2,
+                strokeColor: color,
+                strokeWidth: 3,
+                strokeOpacity: 1.0
+            },
+            // Точка - для лицензий без контура
+            point: { preset: getPresetByUsageType(license.license_type) }
+        }
+    };
+}
+
+function displayLicensesOnMap(fitBounds = true) {
+    clusterCollection.removeAll();
+
+    // Используем лицензии видимой области (или все), если фильтры не применены,
+    // иначе только отфильтрованные. Объекты уже показанных лицензий не
+    // пересоздаются - меняется только фильтр ObjectManager
+    const licensesToDisplay = currentFiltersActive ? filteredLicenses : (viewportLicenses || allLicenses);
+    const shown = licenseLayer.show(licensesToDisplay);
+
+    console.log(`Отображено лицензий на карте: ${shown}`);
+
+    // Автоматически подстраиваем границы карты под объекты
+    // (кроме перерисовки после перемещения карты пользователем)
+    if (!fitBounds) {
+        return;
+    }
+    const bounds = licenseLayer.getBounds();
+    if (bounds) {
+        try {
+            myMap.setBounds(bounds, {
+                checkZoomRange: true,
+                zoomMargin: 100,
+                duration: 500
+            });
+        } catch (e) {
+            console.error('Ошибка установки границ:', e);
+        }
+    } else {
+        console.warn('Нет объектов для отображения на карте');
+    }
+}
+
+function displayClustersOnMap(clusters) {
+    licenseLayer.hide();
+    clusterCollection.removeAll();
+
+    clusters.forEach(cluster => {
+        let placemark;
+        if (cluster.count === 1) {
+            // Одна лицензия - обычная метка по статусу
+            placemark = new ymaps.Placemark(
+                [cluster.lat, cluster.lon],
+                { hintContent: cluster.license_number },
+                { preset: getPresetByStatus(cluster.status) }
+            );
+            placemark.events.add('click', () => showLicenseDetails(cluster.id));
+        } else {
+            const hint = Object.entries(cluster.statuses)
+                .map(([status, count]) => `${getStatusText(status)}: ${count}`)
+                .join('<br>');
+            placemark = new ymaps.Placemark(
+                [cluster.lat, cluster.lon],
+                { iconContent: cluster.count, hintContent: `Лицензий: ${cluster.count}<br>${hint}` },
+                { preset: 'islands#blueCircleIcon' }
+            );
+            // По клику приближаем карту к лицензиям кластера
+            placemark.events.add('click', () => {
+                const [minLon, minLat, maxLon, maxLat] = cluster.bbox;
+                myMap.setBounds([[minLat, minLon], [maxLat, maxLon]], {
+                    checkZoomRange: true,
+                    zoomMargin: 50,
+                    duration: 300
+                });
+            });
+        }
+        clusterCollection.add(placemark);
+    });
+
+    console.log(`Отображено кластеров на карте: ${clusters.length}`);
+}
+
+function highlightPolygon(licenseId) {
+    if (!licenseLayer.highlight(licenseId)) {
+        console.warn(`Объект на карте не найден для licenseId: ${licenseId}`);
+    }
+}
+
+function getColorByUsageType(usageType) {
+    const colors = {
+        'БЭ': '#60A5FA',
+        'БП': '#27ae60',
+        'БР': '#e67e22',
+        'ТП': '#1abc9c',
+        'ПВ': '#9b59b6',
+        'ГС': '#f39c12',
+        'КП': '#e74c3c',
+        'РП': '#16a085',
+        'СП': '#8e44ad',
+        'УВС': '#2c3e50'
+    };
+    return colors[usageType] || '#95a5a6';
+}
+
+function getColorByStatus(status) {
+    const colors = {
+        'active': '#28a745',
+        'expired': '#6c757d',
+        'suspended': '#ffc107',
+        'terminated': '#dc3545'
+    };
+    return colors[status] || '#60A5FA';
+}
+
+function getStatusText(status) {
+    const statuses = {
+        'active': 'Действующая',
+        'expired': 'Истекла',
+        'suspended': 'Приостановлена',
+        'terminated': 'Прекращена'
+    };
+    return statuses[status] || status;
+}
+
+function getPresetByUsageType(usageType) {
+    const presets = {
+        'БЭ': 'islands#blueDotIcon',
+        'БП': 'islands#greenDotIcon',
+        'БР': 'islands#orangeDotIcon',
+        'ТП': 'islands#lightBlueDotIcon',
+        'ПВ': 'islands#violetDotIcon',
+        'ГС': 'islands#yellowDotIcon',
+        'КП': 'islands#redDotIcon',
+        'РП': 'islands#darkGreenDotIcon',
+        'СП': 'islands#darkBlueDotIcon',
+        'УВС': 'islands#grayDotIcon'
+    };
+    return presets[usageType] || 'islands#grayDotIcon';
+}
+
+function getPresetByStatus(status) {
+    const presets = {
+        'active': 'islands#greenDotIcon',
+        'expired': 'islands#grayDotIcon',
+        'suspended': 'islands#yellowDotIcon',
+        'terminated': 'islands#redDotIcon'
+    };
+    return presets[status] || 'islands#blueDotIcon';
+}
+
+let currentLicense = null;
+
+// Детали лицензий (с документами, без контуров), загруженные заранее
+// для карточек текущей страницы одним запросом /api/licenses/batch/
+const licenseDetails = new Map();
+const DETAILS_BATCH_SIZE = 200;
+
+function prefetchLicenseDetails(ids) {
+    const missing = ids.filter(id => !licenseDetails.has(id));
+    for (let start = 0; start < missing.length; start += DETAILS_BATCH_SIZE) {
+        const chunk = missing.slice(start, start + DETAILS_BATCH_SIZE);
+        const request = fetch(`/api/licenses/batch/?ids=${chunk.join(',')}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                return response.json();
+            })
+            .then(data => new Map(data.licenses.map(license => [license.id, license])));
+        // До ответа в кеше лежит общее обещание: открытие карточки его дождётся
+        chunk.forEach(id => licenseDetails.set(id, request.then(details => details.get(id))));
+        request.catch(() => chunk.forEach(id => licenseDetails.delete(id)));
+    }
+}
+
+// Предзагрузка деталей в простое браузера, чтобы не мешать отрисовке
+function schedulePrefetch(licenses) {
+    const ids = licenses.map(license => license.id);
+    const run = () => prefetchLicenseDetails(ids);
+    if (window.requestIdleCallback) {
+        requestIdleCallback(run, { timeout: 2000 });
+    } else {
+        setTimeout(run, 200);
+    }
+}
+
+function loadLicenseDetails(licenseId) {
+    const cached = licenseDetails.get(licenseId);
+    const fromBatch = cached ? cached.catch(() => null) : Promise.resolve(null);
+    return fromBatch.then(license => license || fetch(`/api/licenses/${licenseId}/`).then(response => response.json()));
+}
+
+function showLicenseDetails(licenseId) {
+    currentLicenseId = licenseId;
+    loadLicenseDetails(licenseId)
+        .then(license => {
+            currentLicense = license;
+            document.getElementById('modalTitle').innerHTML = `Лицензия ${license.license_number}`;
+
+            let documentsHtml = '';
+            if (license.documents && license.documents.length > 0) {
+                documentsHtml = '<h6 class="mt-3">Документы:</h6><ul class="list-group">';
+                license.documents.forEach(doc => {
+                    documentsHtml += `
+                    <li class="list-group-item d-flex justify-content-between align-items-center">
+                        ${doc.title}
+                        <a href="/api/documents/${doc.id}/download/" class="btn btn-sm btn-outline-primary">
+                            Скачать
+                        </a>
+                    </li>
+                `;
+                });
+                documentsHtml += '</ul>';
+            } else {
+                documentsHtml = '<p class="text-muted mt-3">Нет прикрепленных документов</p>';
+            }
+
+            document.getElementById('modalBody').innerHTML = `
+            <div class="row">
+                <div class="col-md-6">
+                    <p><strong>Номер лицензии:</strong> ${license.license_number}</p>
+                    <p><strong>Недропользователь:</strong> ${license.owner}</p>
+                    <p><strong>Вид пользования:</strong> ${license.license_type}</p>
+                    <p><strong>Регион:</strong> ${license.region}</p>
+                    <p><strong>Участок недр:</strong> ${license.area || 'Не указан'}</p>
+                </div>
+                <div class="col-md-6">
+                    <p><strong>Дата выдачи:</strong> ${license.issue_date}</p>
+                    <p><strong>Дата окончания:</strong> ${license.expiry_date || 'Не указана'}</p>
+                    <p><strong>Полезное ископаемое:</strong> ${license.mineral_type || 'Не указано'}</p>
+                    <p><strong>Статус:</strong> ${getStatusText(license.status)}</p>
+                    <p><strong>Координаты:</strong> ${license.latitude}, ${license.longitude}</p>
+                </div>
+            </div>
+            <div class="row mt-3">
+                <div class="col-12">
+                    <p><strong>Описание:</strong></p>
+                    <p>${license.description || 'Нет описания'}</p>
+                </div>
+            </div>
+            ${documentsHtml}
+        `;
+
+            const modal = new bootstrap.Modal(document.getElementById('licenseModal'));
+            modal.show();
+
+            // Подсвечиваем полигон на карте
+            highlightPolygon(license.id);
+        })
+        .catch(error => console.error('Ошибка загрузки деталей лицензии:', error));
+}
+
+function showUploadForm() {
+    if (!currentLicenseId) {
+        alert('Лицензия не выбрана');
+        return;
+    }
+
+    const fileInput = document.createElement('input');
+
+    fileInput.type = 'file';
+    fileInput.accept = '.pdf,.doc,.docx,.xls,.xlsx,.jpg,.png';
+
+    fileInput.onchange = () => {
+        if (fileInput.files.length === 0) return;
+
+        const selectedFile = fileInput.files[0];
+        const defaultTitle = selectedFile.name;
+
+        const title = prompt('Название документа:', defaultTitle);
+        if (!title) return;
+
+        const formData = new FormData();
+        formData.append('file', selectedFile);
+        formData.append('title', title);
+        formData.append('file_type', 'other');
+
+        fetch(`/api/licenses/${currentLicenseId}/upload/`, {
+            method: 'POST',
+            body: formData,
+            headers: {
+                'X-CSRFToken': getCookie('csrftoken')
+            }
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    alert('Документ успешно загружен');
+                    licenseDetails.delete(currentLicenseId);
+                    showLicenseDetails(currentLicenseId);
+                } else {
+                    alert('Ошибка: ' + (data.error || 'Неизвестная ошибка'));
+                }
+            })
+            .catch(error => {
+                console.error('Ошибка загрузки документа:', error);
+                alert('Ошибка загрузки документа');
+            });
+    };
+
+    fileInput.click();
+}
+
+function showOnMap() {
+    if (!currentLicense) {
+        alert('Лицензия не загружена');
+        return;
+    }
+
+    // Закрываем модальное окно
+    const modal = bootstrap.Modal.getInstance(document.getElementById('licenseModal'));
+    modal.hide();
+
+    // Прокручиваем к карте
+    document.querySelector('.map-container').scrollIntoView({
+        behavior: 'smooth',
+        block: 'center'
+    });
+
+    // Охват лицензии, если она показана на карте
+    const onMap = licenseLayer.has(currentLicense.id);
+    const bounds = onMap ? licenseLayer.getBounds([currentLicense.id]) : null;
+
+    setTimeout(() => {
+        if (bounds) {
+            // Если есть полигон, показываем его целиком через setBounds
+            myMap.setBounds(bounds, {
+                checkZoomRange: true,
+                zoomMargin: 50,
+                duration: 500
+            });
+        } else if (currentLicense.latitude && currentLicense.longitude) {
+            // Если полигона нет, используем точку с меньшим зумом
+            myMap.setCenter([currentLicense.latitude, currentLicense.longitude], 12, {
+                checkZoomRange: true,
+                duration: 500
+            });
+        }
+
+        // Открываем балун объекта
+        setTimeout(() => {
+            if (onMap) {
+                licenseLayer.openBalloon(currentLicense.id);
+            }
+        }, 600);
+    }, 300);
+}
+
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+// Smooth scrolling for anchor links
+document.querySelectorAll('a[href^="#"]').forEach(anchor => {
+    anchor.addEventListener('click', function (e) {
+        e.preventDefault();
+        const target = document.querySelector(this.getAttribute('href'));
+        if (target) {
+            target.scrollIntoView({
+                behavior: 'smooth',
+                block: 'start'
+            });
+        }
+    });
+});
+
+// Back to top button functionality
+const backToTopButton = document.getElementById('backToTop');
+
+window.addEventListener('scroll', () => {
+    if (window.pageYOffset > 300) {
+        backToTopButton.classList.add('show');
+    } else {
+        backToTopButton.classList.remove('show');
+    }
+});
+
+backToTopButton.addEventListener('click', () => {
+    window.scrollTo({
+        top: 0,
+        behavior: 'smooth'
+    });
+});
+
+// Функция для сворачивания/разворачивания легенды
+function toggleLegend() {
+    const legend = document.getElementById('mapLegend');
+    const header = legend?.querySelector('.legend-header');
+    if (legend && header) {
+        const isCollapsed = legend.classList.toggle('collapsed');
+        header.setAttribute('aria-expanded', !isCollapsed);
+        // Обновляем подсказку
+        header.setAttribute('title', isCollapsed ? 'Нажмите, чтобы развернуть легенду' : 'Нажмите, чтобы свернуть легенду');
+    }
+}
+
+// Инициализация подсказки при загрузке
+document.addEventListener('DOMContentLoaded', function() {
+    const legendHeader = document.querySelector('.legend-header');
+    if (legendHeader) {
+        const legend = document.getElementById('mapLegend');
+        const isCollapsed = legend?.classList.contains('collapsed');
+        legendHeader.setAttribute('title', isCollapsed ? 'Нажмите, чтобы развернуть легенду' : 'Нажмите, чтобы свернуть легенду');
+    }
+});
+
+// Поддержка клавиатуры для легенды
+document.addEventListener('DOMContentLoaded', function() {
+    const legendHeader = document.querySelector('.legend-header');
+    if (legendHeader) {
+        legendHeader.addEventListener('keydown', function(e) {
+            if (e.key === 'Enter' || e.key === ' ') {
+                e.preventDefault();
+                toggleLegend();
+            }
+        });
+    }
+});
+
+// Инициализация Bootstrap tooltips
+document.addEventListener('DOMContentLoaded', function () {
+    const tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
+    tooltipTriggerList.map(function (tooltipTriggerEl) {
+        return new bootstrap.Tooltip(tooltipTriggerEl);
+    });
+});
@@ -0,0 +1,140 @@
+// Клиентский кеш реестра в IndexedDB.
+//
+// Реестр хранится вместе с версией данных сервера (/api/licenses/version/).
+// При загрузке страницы версия сверяется одним лёгким запросом: если она
+// не изменилась, данные берутся из IndexedDB без обращения к API, иначе
+// загружаются только изменения (/api/licenses/all/?since=) и
+// применяются к сохранённой копии. Копия с контурами (карта) подходит и
+// для страницы аналитики, поэтому переход между страницами не требует
+// повторной загрузки реестра. Без IndexedDB (приватный режим и т.п.)
+// реестр просто загружается целиком.
+//
+// Целиком реестр по возможности берётся из готового снимка, который
+// отдаёт веб-сервер (licenses/snapshots.py): манифест сообщает версию
+// данных снимка и адреса файлов. Если снимка нет или он отстал от
+// версии сервера, реестр загружается из API.
+const RegistryCache = (function() {
+    const DB_NAME = 'licenses-registry';
+    const DB_VERSION = 1;
+    const STORE = 'datasets';
+    const SNAPSHOT_MANIFEST_URL = '/snapshots/manifest.json';
+
+    let dbPromise = null;
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                if (!window.indexedDB) {
+                    reject(new Error('IndexedDB недоступна'));
+                    return;
+                }
+                const request = indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore(STORE, { keyPath: 'key' });
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        }
+        return dbPromise;
+    }
+
+    function read(key) {
+        return openDb().then(db => new Promise((resolve, reject) => {
+            const request = db.transaction(STORE, 'readonly').objectStore(STORE).get(key);
+            request.onsuccess = () => resolve(request.result || null);
+            request.onerror = () => reject(request.error);
+        })).catch(() => null);
+    }
+
+    function write(record) {
+        return openDb().then(db => new Promise((resolve, reject) => {
+            const transaction = db.transaction(STORE, 'readwrite');
+            transaction.objectStore(STORE).put(record);
+            transaction.oncomplete = () => resolve();
+            transaction.onerror = () => reject(transaction.error);
+        })).catch(error => console.warn('Не удалось сохранить реестр в IndexedDB:', error));
+    }
+
+    function fetchJson(url, options) {
+        return fetch(url, options).then(response => {
+            if (!response.ok) throw new Error(`HTTP ${response.status}: ${url}`);
+            return response.json();
+        });
+    }
+
+    function changesUrl(since, geometry) {
+        return `/api/licenses/all/?since=${encodeURIComponent(since)}` + (geometry ? '&geometry=1' : '');
+    }
+
+    // Весь реестр из снимка веб-сервера в формате ответа ?since=
+    // или null, если снимка нет или его версия не совпадает с версией сервера
+    async function loadSnapshot(version, geometry) {
+        if (version === null) return null;
+        try {
+            const manifest = await fetchJson(SNAPSHOT_MANIFEST_URL, { cache: 'no-cache' });
+            if (manifest.version !== version) return null;
+            const licenses = await fetchJson(manifest.files[geometry ? 'registry_geometry' : 'registry']);
+            return { licenses: licenses, deleted: [], full: true, next_since: manifest.version };
+        } catch (error) {
+            return null;
+        }
+    }
+
+    // Применяет изменения к сохранённой копии: удалённые убираются,
+    // изменённые заменяются, новые добавляются в начало (как в API)
+    function applyChanges(licenses, changes) {
+        if (changes.full) return changes.licenses;
+        const removed = new Set(changes.deleted);
+        const updated = new Map(changes.licenses.map(license => [license.id, license]));
+        const result = [];
+        licenses.forEach(license => {
+            if (removed.has(license.id)) return;
+            if (updated.has(license.id)) {
+                result.push(updated.get(license.id));
+                updated.delete(license.id);
+            } else {
+                result.push(license);
+            }
+        });
+        return Array.from(updated.values()).concat(result);
+    }
+
+    // Реестр лицензий (с контурами, если geometry) из кеша или с сервера
+    async function load({ geometry = false } = {}) {
+        const key = geometry ? 'geometry' : 'plain';
+        const versionRequest = fetchJson('/api/licenses/version/');
+
+        let record = await read(key);
+        if (!record && !geometry) {
+            record = await read('geometry');
+        }
+
+        let version = null;
+        try {
+            version = (await versionRequest).version;
+        } catch (error) {
+            console.warn('Не удалось проверить версию реестра:', error);
+            if (record) return record.licenses;
+        }
+        if (record && record.version === version) {
+            return record.licenses;
+        }
+
+        // Копии нет - весь реестр из снимка, а без снимка по since=0
+        // сервер отдаёт весь реестр и next_since
+        const changes = (!record && await loadSnapshot(version, geometry))
+            || await fetchJson(changesUrl(record ? record.nextSince : 0, record ? record.geometry : geometry));
+        const licenses = applyChanges(record ? record.licenses : [], changes);
+        write({
+            key: record ? record.key : key,
+            geometry: record ? record.geometry : geometry,
+            version: version,
+            nextSince: changes.next_since,
+            licenses: licenses,
+        });
+        return licenses;
+    }
+
+    return { load };
+})();
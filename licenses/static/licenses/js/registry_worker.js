@@ -0,0 +1,110 @@
+// Индекс реестра для фильтров карты (выполняется в Web Worker).
+//
+// Сообщение 'index' строит индекс: для полей фильтров - коды значений
+// и инвертированные списки позиций (значение -> позиции лицензий по
+// возрастанию), для поиска - заранее приведённые к нижнему регистру
+// строки «номер + недропользователь». В ответ уходит сводка для
+// статистики, легенды и списков фильтров.
+//
+// Сообщение 'filter' возвращает только идентификаторы подходящих
+// лицензий (Int32Array, передаётся без копирования) в порядке реестра.
+// Отбор начинается с самого короткого списка позиций среди выбранных
+// фильтров; если строка поиска лишь дополнилась, поиск идёт по
+// результату предыдущего запроса.
+const FIELDS = ['status', 'region', 'license_type', 'mineral_type'];
+
+let ids = new Int32Array(0);
+let searchKeys = [];
+let codes = {};      // поле -> Int32Array кодов значений по позициям
+let values = {};     // поле -> Map(значение -> код)
+let postings = {};   // поле -> массив списков позиций по коду
+let last = null;     // предыдущий запрос: критерии и найденные позиции
+
+function buildIndex(licenses) {
+    const count = licenses.length;
+    ids = new Int32Array(count);
+    searchKeys = new Array(count);
+    FIELDS.forEach(field => {
+        codes[field] = new Int32Array(count);
+        values[field] = new Map();
+        postings[field] = [];
+    });
+
+    licenses.forEach((license, position) => {
+        ids[position] = license.id;
+        searchKeys[position] = `${license.license_number || ''}\n${license.owner || ''}`.toLowerCase();
+        FIELDS.forEach(field => {
+            const value = license[field] || '';
+            let code = values[field].get(value);
+            if (code === undefined) {
+                code = values[field].size;
+                values[field].set(value, code);
+                postings[field].push([]);
+            }
+            codes[field][position] = code;
+            postings[field][code].push(position);
+        });
+    });
+    last = null;
+
+    const sortedValues = field => Array.from(values[field].keys()).sort();
+    const statusCode = values.status.get('active');
+    return {
+        total: count,
+        active: statusCode === undefined ? 0 : postings.status[statusCode].length,
+        regions: sortedValues('region'),
+        types: sortedValues('license_type'),
+        minerals: sortedValues('mineral_type').filter(mineral => mineral),
+    };
+}
+
+function filterPositions(criteria) {
+    const selected = [];
+    for (const field of FIELDS) {
+        const value = criteria[field];
+        if (!value) continue;
+        const code = values[field].get(value);
+        if (code === undefined) return [];
+        selected.push({ field, code, size: postings[field][code].length });
+    }
+    const search = criteria.search;
+
+    // Поиск внутри результата предыдущего запроса с теми же фильтрами
+    let positions = null;
+    if (last && search && last.criteria.search && search.includes(last.criteria.search)
+            && FIELDS.every(field => (last.criteria[field] || '') === (criteria[field] || ''))) {
+        positions = last.positions;
+    } else if (selected.length) {
+        selected.sort((a, b) => a.size - b.size);
+        const first = selected.shift();
+        positions = postings[first.field][first.code];
+    }
+
+    const result = [];
+    const scan = position => {
+        for (const { field, code } of selected) {
+            if (codes[field][position] !== code) return;
+        }
+        if (search && !searchKeys[position].includes(search)) return;
+        result.push(position);
+    };
+    if (positions) {
+        positions.forEach(scan);
+    } else {
+        for (let position = 0; position < ids.length; position++) scan(position);
+    }
+    return result;
+}
+
+self.onmessage = event => {
+    const message = event.data;
+    if (message.type === 'index') {
+        self.postMessage({ type: 'indexed', summary: buildIndex(message.licenses) });
+    } else if (message.type === 'filter') {
+        const positions = filterPositions(message.criteria);
+        last = { criteria: message.criteria, positions };
+        const result = new Int32Array(positions.length);
+        positions.forEach((position, index) => { result[index] = ids[position]; });
+        self.postMessage({ type: 'filtered', requestId: message.requestId, ids: result }, [result.buffer]);
+    }
+};
@@ -0,0 +1,66 @@
+const fileInput = document.getElementById('geojsonFile');
+const uploadZone = document.getElementById('uploadZone');
+const selectedFileDiv = document.getElementById('selectedFile');
+const fileNameSpan = document.getElementById('fileName');
+const submitBtn = document.getElementById('submitBtn');
+
+if (fileInput) {
+    fileInput.addEventListener('change', function (e) {
+        if (e.target.files.length > 0) {
+            const file = e.target.files[0];
+            fileNameSpan.textContent = file.name;
+            selectedFileDiv.style.display = 'block';
+            submitBtn.disabled = false;
+        }
+    });
+
+    uploadZone.addEventListener('dragover', function (e) {
+        e.preventDefault();
+        const root = document.documentElement;
+        const computedStyle = getComputedStyle(root);
+        uploadZone.style.borderColor = computedStyle.getPropertyValue('--accent-color').trim();
+        // Используем полупрозрачный акцентный цвет для hover в темной теме
+        const isDark = root.getAttribute('data-theme') === 'dark';
+        uploadZone.style.backgroundColor = isDark 
+            ? 'rgba(147, 197, 253, 0.1)' 
+            : computedStyle.getPropertyValue('--bg-section').trim();
+    });
+
+    uploadZone.addEventListener('dragleave', function (e) {
+        e.preventDefault();
+        const root = document.documentElement;
+        const computedStyle = getComputedStyle(root);
+        uploadZone.style.borderColor = computedStyle.getPropertyValue('--border-color').trim();
+        uploadZone.style.backgroundColor = computedStyle.getPropertyValue('--bg-section').trim();
+    });
+
+    uploadZone.addEventListener('drop', function (e) {
+        e.preventDefault();
+        const root = document.documentElement;
+        const computedStyle = getComputedStyle(root);
+        uploadZone.style.borderColor = computedStyle.getPropertyValue('--border-color').trim();
+        uploadZone.style.backgroundColor = computedStyle.getPropertyValue('--bg-section').trim();
+
+        if (e.dataTransfer.files.length > 0) {
+            fileInput.files = e.dataTransfer.files;
+            const file = e.dataTransfer.files[0];
+            fileNameSpan.textContent = file.name;
+            selectedFileDiv.style.display = 'block';
+            submitBtn.disabled = false;
+        }
+    });
+}
+
+function clearFile() {
+    fileInput.value = '';
+    selectedFileDiv.style.display = 'none';
+    submitBtn.disabled = true;
+}
+
+const uploadForm = document.getElementById('uploadForm');
+if (uploadForm) {
+    uploadForm.addEventListener('submit', function () {
+        submitBtn.disabled = true;
+        submitBtn.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Загрузка и обработка...';
+    });
+}
@@ -0,0 +1,258 @@
+"""
+Хранилище статических файлов для продакшена.
+
+При collectstatic скрипты и стили приложения (licenses/js, licenses/css)
+минифицируются, получают хеш содержимого в имени
+(ManifestStaticFilesStorage: map.3f2a9c1b.js) и сжимаются заранее -
+рядом с каждым файлом с хешем кладутся .gz и, если установлен пакет
+brotli, .br. Веб-сервер отдаёт готовые сжатые варианты (nginx:
+gzip_static/brotli_static) с заголовком Cache-Control: immutable, а шаблоны
+через {% static %} ссылаются на имена с хешем, поэтому после изменения
+файла браузер сразу получает новый, а при повторных загрузках страниц
+скачивает только HTML.
+
+Минификация консервативная: удаляются комментарии, отступы и пустые
+строки, строки и регулярные выражения не трогаются, переводы строк в
+скриптах сохраняются (автоматическая расстановка точек с запятой).
+"""
+import gzip
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli необязателен
+    brotli = None
+
+# Файлы, которые минифицируются перед расчётом хеша
+MINIFY_PREFIXES = ('licenses/js/', 'licenses/css/')
+
+# Файлы, для которых заранее готовятся сжатые варианты
+COMPRESS_EXTENSIONS = ('.js', '.css', '.svg', '.json', '.txt', '.map', '.html')
+
+# Сжатый вариант сохраняется, только если он заметно меньше исходного
+COMPRESS_MIN_SIZE = 256
+
+CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+# После этих символов «/» в скрипте начинает регулярное выражение, а не деление
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw', 'case', 'do', 'else'}
+
+
+def minify_css(source):
+    """Удаляет из стилей комментарии и лишние пробелы (строки в кавычках не меняются)"""
+    parts = CSS_STRING.split(source)
+    result = []
+    for index, part in enumerate(parts):
+        if index % 2:
+            result.append(part)
+            continue
+        part = CSS_COMMENT.sub('', part)
+        part = re.sub(r'\s+', ' ', part)
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        part = part.replace(';}', '}')
+        result.append(part)
+    return ''.join(result).strip()
+
+
+def minify_js(source):
+    """
+    Удаляет из скрипта комментарии, отступы и пустые строки
+
+    Строки, шаблонные строки (включая вложенные ${...}) и регулярные
+    выражения копируются без изменений. Переводы строк сохраняются,
+    поэтому смысл кода без точек с запятой не меняется.
+    """
+    out = []
+    i = 0
+    length = len(source)
+    # Глубина фигурных скобок внутри каждого открытого ${...} шаблонной строки
+    template_braces = []
+    # Последний значимый символ или слово - для отличия регулярного выражения от деления
+    last_token = ''
+
+    def space(char):
+        """Пробел между лексемами: подряд идущие сливаются, перевод строки важнее пробела"""
+        if out and out[-1] in (' ', '\n'):
+            if char == '\n':
+                out[-1] = char
+            return
+        out.append(char)
+
+    def copy_template(start):
+        """Копирует шаблонную строку с позиции start (` или }) до закрывающей ` или ${"""
+        j = start + 1
+        while j < length:
+            char = source[j]
+            if char == '\\':
+                j += 2
+                continue
+            if char == '`':
+                out.append(source[start:j + 1])
+                return j + 1, False
+            if char == '$' and source.startswith('${', j):
+                out.append(source[start:j + 2])
+                return j + 2, True
+            j += 1
+        out.append(source[start:])
+        return length, False
+
+    while i < length:
+        char = source[i]
+        if char in '"\'':
+            j = i + 1
+            while j < length and source[j] != char and source[j] != '\n':
+                j += 2 if source[j] == '\\' else 1
+            out.append(source[i:j + 1])
+            i = j + 1
+            last_token = char
+        elif char == '`':
+            i, opened = copy_template(i)
+            if opened:
+                template_braces.append(0)
+                last_token = '{'
+            else:
+                last_token = '`'
+        elif char == '{':
+            if template_braces:
+                template_braces[-1] += 1
+            out.append(char)
+            i += 1
+            last_token = char
+        elif char == '}':
+            if template_braces and template_braces[-1] == 0:
+                template_braces.pop()
+                i, opened = copy_template(i)
+                if opened:
+                    template_braces.append(0)
+                    last_token = '{'
+                else:
+                    last_token = '`'
+                continue
+            if template_braces:
+                template_braces[-1] -= 1
+            out.append(char)
+            i += 1
+            last_token = char
+        elif source.startswith('//', i):
+            while i < length and source[i] != '\n':
+                i += 1
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            space(' ')
+        elif char == '/' and (not last_token or last_token in REGEX_PRECEDERS or last_token in REGEX_KEYWORDS):
+            j = i + 1
+            in_class = False
+            while j < length and source[j] != '\n':
+                if source[j] == '\\':
+                    j += 2
+                    continue
+                if source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                elif source[j] == '/' and not in_class:
+                    break
+                j += 1
+            j += 1
+            while j < length and (source[j].isalnum() or source[j] == '_'):
+                j += 1
+            out.append(source[i:j])
+            i = j
+            last_token = '/'
+        elif char.isspace():
+            j = i
+            while j < length and source[j].isspace():
+                j += 1
+            space('\n' if '\n' in source[i:j] else ' ')
+            i = j
+        elif char.isalnum() or char in '_$':
+            j = i
+            while j < length and (source[j].isalnum() or source[j] in '_$'):
+                j += 1
+            out.append(source[i:j])
+            last_token = source[i:j]
+            i = j
+        else:
+            out.append(char)
+            i += 1
+            last_token = char
+
+    return ''.join(out).strip() + '\n'
+
+
+def minify(name, content):
+    """Минифицированное содержимое файла name или исходное, если тип не поддерживается"""
+    if name.endswith('.min.js') or name.endswith('.min.css'):
+        return content
+    if name.endswith('.js'):
+        return minify_js(content)
+    if name.endswith('.css'):
+        return minify_css(content)
+    return content
+
+
+def should_minify(name):
+    return name.replace('\\', '/').startswith(MINIFY_PREFIXES) and name.endswith(('.js', '.css'))
+
+
+class MinifyingSource:
+    """Исходное хранилище collectstatic, отдающее файлы уже минифицированными"""
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+
+    def open(self, path, mode='rb'):
+        with self.storage.open(path, mode) as source:
+            content = source.read().decode('utf-8')
+        return ContentFile(minify(self.name, content).encode('utf-8'), name=path)
+
+    def __getattr__(self, attr):
+        return getattr(self.storage, attr)
+
+
+def compress_variants(content):
+    """Сжатые варианты содержимого: {'.gz': bytes, '.br': bytes}"""
+    # mtime=0 - одинаковый результат при каждой сборке
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return variants
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage с минификацией файлов приложения и заранее
+    сжатыми вариантами (.gz, .br) файлов с хешем в имени
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        paths = {
+            name: (MinifyingSource(storage, name), path) if should_minify(name) else (storage, path)
+            for name, (storage, path) in paths.items()
+        }
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                self.compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def compress(self, name):
+        """Сохраняет сжатые варианты файла name рядом с ним"""
+        if not name.endswith(COMPRESS_EXTENSIONS):
+            return
+        with self.open(name) as source:
+            content = source.read()
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+        for suffix, compressed in compress_variants(content).items():
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
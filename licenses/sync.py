@@ -0,0 +1,103 @@
+"""
+Инкрементальная синхронизация реестра для клиентов с локальной копией.
+
+Клиент один раз загружает весь реестр, а затем запрашивает только
+изменения: /api/licenses/all/?since=<next_since из прошлого ответа>.
+next_since - версия данных (licenses.versioning), прочитанная до выборки.
+Изменённые и новые лицензии находятся по License.change_seq, удалённые -
+по журналу LicenseDeletion: отдаются записи с номером больше since или
+ещё без номера. Номера проставляются в порядке версий после фиксации
+транзакции, поэтому изменение не теряется, как бы поздно его транзакция
+ни зафиксировалась, и часы серверов ни на что не влияют.
+
+Если журнал удалений уже очищен после версии since (или since - отметка
+времени от прежней версии клиента), ответ помечается full=True и
+содержит весь реестр - клиент заменяет им свою копию.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from licenses.versioning import get_data_version
+
+# Сколько дней хранится журнал удалённых лицензий
+DELETION_LOG_DAYS = 90
+
+
+def parse_since(value):
+    """
+    Версия данных прошлой синхронизации из параметра ?since=
+
+    Возвращает номер версии (next_since из ответа API) или None для
+    отметки времени (ISO 8601 или Unix-время с дробной частью), которую
+    присылают прежние версии клиента: по ней изменения не определить.
+
+    Raises:
+        ValueError: значение не удалось разобрать
+    """
+    value = (value or '').strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        float(value)
+        return None
+    except ValueError:
+        pass
+    # В строке запроса «+» часового пояса превращается в пробел
+    if parse_datetime(value.replace(' ', '+')) is None:
+        raise ValueError(value)
+    return None
+
+
+def changes_since(licenses, since):
+    """
+    Изменения реестра после версии данных since
+
+    Args:
+        licenses: QuerySet лицензий, из которого отбираются изменённые
+        since: версия прошлой синхронизации (результат parse_since)
+
+    Returns:
+        dict: licenses - QuerySet изменённых и новых лицензий (или всех,
+        если full), deleted - отсортированный список id удалённых лицензий,
+        full - клиенту нужно заменить копию целиком, next_since - значение
+        since для следующего запроса
+    """
+    from licenses.models import DataVersion, LicenseDeletion
+
+    # Версия читается до выборки: изменения после неё попадут в следующий ответ
+    version = get_data_version()
+    pruned = DataVersion.objects.values_list('pruned_value', flat=True).filter(pk=1).first() or 0
+    # since=0 - у клиента нет копии; версия больше текущей - база восстановлена из копии
+    if not since or since < pruned or since > version:
+        return {'licenses': licenses, 'deleted': [], 'full': True, 'next_since': version}
+
+    changed = Q(change_seq__isnull=True) | Q(change_seq__gt=since)
+    deleted = sorted(set(LicenseDeletion.objects.filter(changed).values_list('license_id', flat=True)))
+    return {
+        'licenses': licenses.filter(changed),
+        'deleted': deleted,
+        'full': False,
+        'next_since': version,
+    }
+
+
+def prune_deletion_log(days=DELETION_LOG_DAYS):
+    """
+    Удаляет записи журнала удалений старше days дней; возвращает их число
+
+    Последний удалённый номер запоминается в DataVersion.pruned_value:
+    клиенты с более ранней версией получат весь реестр.
+    """
+    from licenses.models import DataVersion, LicenseDeletion
+
+    with transaction.atomic():
+        expired = LicenseDeletion.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+        last = expired.aggregate(last=Max('change_seq'))['last']
+        if last is not None:
+            DataVersion.objects.filter(pk=1, pruned_value__lt=last).update(pruned_value=last)
+        deleted, _ = expired.delete()
+    return deleted
@@ -0,0 +1,155 @@
+"""
+Генератор синтетического реестра лицензий для нагрузочных тестов и бенчмарков.
+
+Объекты генерируются в том же виде, что и выгрузка Яндекс Карт: GeoJSON
+Feature с MultiPolygon и описанием в формате, который разбирает
+GeoJSONImporter.parse_description.
+"""
+import math
+import random
+from datetime import date, timedelta
+
+# Префикс номера лицензии -> примерный центр региона (lon, lat)
+REGION_CENTERS = {
+    'МАГ': (150.8, 59.6),
+    'КЕМ': (86.1, 55.3),
+    'ПЕМ': (56.2, 58.0),
+    'ЧИТ': (113.5, 52.0),
+    'ЮСХ': (142.7, 47.0),
+    'ИРК': (104.3, 52.3),
+    'БЛГ': (127.5, 50.3),
+    'ХАБ': (135.1, 48.5),
+    'КРР': (92.9, 56.0),
+    'УДЭ': (107.6, 51.8),
+    'ЯКУ': (129.7, 62.0),
+    'ТЮМ': (65.5, 57.2),
+    'ВЛВ': (131.9, 43.1),
+    'АБН': (91.4, 53.7),
+}
+
+LICENSE_TYPES = ['БЭ', 'БП', 'БР', 'НЭ', 'НР', 'ТЭ']
+
+MINERALS = ['Золото', 'Серебро', 'Медь', 'Уголь', 'Нефть', 'Газ', 'Железная руда', 'Олово']
+
+OWNER_FORMS = ['ООО', 'АО', 'ПАО', 'ЗАО']
+
+OWNER_NAMES = ['Северная', 'Восток', 'Сибирь', 'Недра', 'Геопоиск', 'Рудник', 'Полярная звезда', 'Ресурс']
+
+AREA_NAMES = ['Участок Лесной', 'Месторождение Южное', 'Участок Ручей Золотой', 'Площадь Верхняя',
+              'Участок Каменный', 'Месторождение Озёрное']
+
+# Цвет заливки -> статус (см. GeoJSONImporter.get_status_from_color)
+STATUS_COLORS = ['#ed4543', '#ed4543', '#ed4543', '#0e4779', '#1bad03', '#9b30ff']
+
+
+def generate_ring(rng, center, radius_deg, vertices):
+    """Неправильный звёздчатый контур вокруг центра, замкнутый по правилам GeoJSON"""
+    lon0, lat0 = center
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(vertices))
+    # Долгота сжимается к полюсам - компенсируем, чтобы контур не вытягивался
+    lon_scale = 1 / max(math.cos(math.radians(lat0)), 0.1)
+    ring = []
+    for angle in angles:
+        r = radius_deg * rng.uniform(0.6, 1.0)
+        ring.append([
+            round(lon0 + r * math.cos(angle) * lon_scale, 6),
+            round(lat0 + r * math.sin(angle), 6),
+        ])
+    ring.append(list(ring[0]))
+    return ring
+
+
+def generate_geometry(rng, center, max_polygons=3, min_vertices=20, max_vertices=200):
+    """MultiPolygon из нескольких участков рядом друг с другом"""
+    polygons = []
+    for _ in range(rng.randint(1, max_polygons)):
+        part_center = (center[0] + rng.uniform(-0.3, 0.3), center[1] + rng.uniform(-0.2, 0.2))
+        ring = generate_ring(rng, part_center, rng.uniform(0.01, 0.08), rng.randint(min_vertices, max_vertices))
+        polygons.append([ring])
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+
+def generate_description(rng, license_number):
+    """Описание в одном из форматов, которые понимает parse_description"""
+    issue = date(2000, 1, 1) + timedelta(days=rng.randint(0, 9000))
+    expiry = issue + timedelta(days=365 * rng.randint(1, 25))
+    owner = f'{rng.choice(OWNER_FORMS)} «{rng.choice(OWNER_NAMES)}-{rng.randint(1, 999)}»'
+    area_size = f'{rng.randint(1, 500)},{rng.randint(0, 99):02d}'
+    issue_label = rng.choice(['Дата выдачи', 'Выдана', 'Дата оформления'])
+    expiry_label = rng.choice(['Дата окончания', 'Действует до'])
+    parts = [
+        f'{license_number} {rng.choice(AREA_NAMES)}',
+        f'Площадь: {area_size} кв.км',
+        owner,
+        f'{issue_label}: {issue:%d.%m.%Y}',
+        f'{expiry_label}: {expiry:%d.%m.%Y}',
+        f'Полезное ископаемое: {rng.choice(MINERALS)}',
+    ]
+    return '<br/>'.join(parts)
+
+
+def generate_features(count, seed=42, max_polygons=3, min_vertices=20, max_vertices=200):
+    """
+    Генерирует count объектов GeoJSON с уникальными номерами лицензий
+
+    Args:
+        count: количество лицензий
+        seed: зерно генератора (одинаковый seed - одинаковый реестр)
+        max_polygons: максимум полигонов в MultiPolygon одной лицензии
+        min_vertices, max_vertices: диапазон количества вершин контура
+
+    Yields:
+        dict - GeoJSON Feature
+    """
+    rng = random.Random(seed)
+    prefixes = list(REGION_CENTERS)
+    for i in range(count):
+        prefix = prefixes[i % len(prefixes)]
+        # 5-6 цифр, уникальность обеспечивается порядковым номером
+        number = f'{prefix} {10000 + i // len(prefixes):05d} {rng.choice(LICENSE_TYPES)}'
+        base_lon, base_lat = REGION_CENTERS[prefix]
+        center = (base_lon + rng.uniform(-4, 4), base_lat + rng.uniform(-2.5, 2.5))
+        yield {
+            'type': 'Feature',
+            'geometry': generate_geometry(rng, center, max_polygons, min_vertices, max_vertices),
+            'properties': {
+                'description': generate_description(rng, number),
+                'fill': rng.choice(STATUS_COLORS),
+            },
+        }
+
+
+def generate_feature_collection(count, **kwargs):
+    return {'type': 'FeatureCollection', 'features': list(generate_features(count, **kwargs))}
+
+
+def create_documents(licenses, per_license=2, seed=42, batch_size=2000):
+    """
+    Создаёт записи документов для лицензий без записи файлов на диск
+
+    Файлы не создаются: поле file хранит только путь, чего достаточно
+    для API и админки, но скачивание таких документов вернёт ошибку.
+    """
+    from licenses.models import Document
+
+    rng = random.Random(seed)
+    file_types = ['license', 'report', 'map', 'other']
+    batch = []
+    created = 0
+    for license_obj in licenses:
+        for j in range(per_license):
+            file_type = rng.choice(file_types)
+            batch.append(Document(
+                license=license_obj,
+                title=f'{file_type.capitalize()} {license_obj.license_number} #{j + 1}',
+                file=f'license_documents/synthetic/{license_obj.pk}_{j + 1}.pdf',
+                file_type=file_type,
+            ))
+            if len(batch) >= batch_size:
+                Document.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+    if batch:
+        Document.objects.bulk_create(batch)
+        created += len(batch)
+    return created
@@ -1,3 +1,1662 @@
-from django.test import TestCase
+import gzip
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DataVersion, License, LicenseDeletion, LicensePolygon, Document, ImportRun, LicenseOverlap
+from . import coalescing
+from . import geometry as geo
+from . import perf
+from .overlaps import candidate_pairs, detect_overlaps
+from .profiling import ImportProfile
+from .spatial import STRTree, spatial_index
+from .archives import load_archive
+from .clusters import MAX_CLUSTER_ZOOM, cluster_index
+from .columnar import registry_columns
+from . import snapshots, views
+from .snapshots import build_snapshot, prune_snapshots, read_manifest, refresh_snapshot
+from .spreadsheets import RegistryTableImporter
+from .storage import minify_css, minify_js
+from .sync import DELETION_LOG_DAYS, prune_deletion_log
+from .synthetic import generate_features
+from .versioning import DATA_VERSION_KEY, bump_data_version, get_data_version
+from .utils import GeoJSONImporter
+
+
+# Тесты не должны писать в файловый кеш проекта
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def forget_data_version():
+    """
+    Убирает версию данных из кеша: откат транзакции теста возвращает счётчик
+    в базе назад, а кеш - нет, и следующее изменение получило бы уже
+    закешированный номер
+    """
+    cache.delete(DATA_VERSION_KEY)
+
+
+def make_license(number, **extra):
+    """Создаёт лицензию с минимальным набором обязательных полей"""
+    fields = {
+        'license_number': number,
+        'license_type': 'БЭ',
+        'owner': 'ООО Тест',
+        'region': 'Магаданская область',
+        'issue_date': date(2020, 1, 1),
+        'polygon_data': {
+            'type': 'Polygon',
+            'coordinates': [[[150.0, 60.0], [150.1, 60.0], [150.1, 60.1], [150.0, 60.0]]],
+        },
+    }
+    fields.update(extra)
+    return License.objects.create(**fields)
+
+
+class QueryBudgetMixin:
+    """
+    Проверка количества SQL-запросов: тест падает, если страница
+    выполняет больше запросов, чем заложено в бюджете
+    """
+
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            result = func(*args, **kwargs)
+        executed = len(ctx.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{i}. {q["sql"]}' for i, q in enumerate(ctx.captured_queries, 1)
+            )
+            self.fail(f'Превышен бюджет запросов: {executed} > {budget}\n{queries}')
+        return result
+
+
+class MediaRootMixin:
+    """Складывает загружаемые в тестах файлы во временный каталог"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media_root)
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryBudgetTests(MediaRootMixin, QueryBudgetMixin, TestCase):
+    """
+    Бюджеты запросов для всех страниц и API приложения licenses.
+
+    Бюджет не должен зависеть от количества строк: каждый URL проверяется
+    на маленьком и на увеличенном наборе данных с одним и тем же лимитом,
+    поэтому любой N+1 сразу роняет тест.
+    """
+
+    # Имя URL -> максимальное число запросов
+    PUBLIC_BUDGETS = {
+        'map': 0,
+        'analytics': 0,
+        'help': 0,
+        'licenses_json': 3,
+        'licenses_all_json': 2,
+        'licenses_version': 1,
+        'licenses_stats': 3,
+    }
+
+    def setUp(self):
+        registry_columns.reset()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.license = make_license('МАГ 00001 БЭ', expiry_date=date.today() - timedelta(days=1))
+        cls.document = Document.objects.create(
+            license=cls.license,
+            title='Лицензия',
+            file=ContentFile(b'data', name='doc.txt'),
+            uploaded_by=cls.admin,
+        )
+
+    def grow_registry(self, count=10):
+        """Добавляет лицензии с документами, чтобы выявить запросы на каждую строку"""
+        start = License.objects.count()
+        for i in range(start, start + count):
+            license_obj = make_license(f'МАГ {10000 + i} БП', expiry_date=date.today() - timedelta(days=i + 1))
+            for j in range(2):
+                Document.objects.create(
+                    license=license_obj,
+                    title=f'Документ {j}',
+                    file=ContentFile(b'data', name=f'doc_{i}_{j}.txt'),
+                    uploaded_by=self.admin,
+                )
+
+    def check_budget(self, budget, path, login=False):
+        if login:
+            self.client.force_login(self.admin)
+        for grow in (False, True):
+            if grow:
+                self.grow_registry()
+            with self.subTest(path=path, grown=grow):
+                response = self.assertQueryBudget(budget, self.client.get, path)
+                self.assertEqual(response.status_code, 200)
+
+    def test_public_pages(self):
+        for name, budget in self.PUBLIC_BUDGETS.items():
+            self.check_budget(budget, reverse(name))
+
+    def test_license_detail(self):
+        # Лицензия + документы (prefetch) + обновление просроченного статуса
+        self.check_budget(3, reverse('license_detail', args=[self.license.id]))
+
+    def test_license_batch(self):
+        # Лицензии + документы (prefetch) + обновление просроченных статусов
+        self.grow_registry()
+        ids = ','.join(str(pk) for pk in License.objects.values_list('id', flat=True))
+        self.check_budget(3, f'{reverse("licenses_batch")}?ids={ids}')
+
+    def test_exports(self):
+        # Сессия + пользователь + массовое обновление статусов + выборка
+        self.check_budget(4, reverse('export_licenses_excel'), login=True)
+        self.check_budget(4, reverse('export_licenses_pdf'), login=True)
+
+    def test_upload_geojson_page(self):
+        self.check_budget(2, reverse('upload_geojson'), login=True)
+
+    def test_admin_license_pages(self):
+        self.check_budget(9, reverse('admin:licenses_license_changelist'), login=True)
+        self.check_budget(5, reverse('admin:licenses_license_change', args=[self.license.id]), login=True)
+        self.check_budget(2, reverse('admin:licenses_import_geojson'), login=True)
+        self.check_budget(2, reverse('admin:licenses_map_benchmark'), login=True)
+
+    def test_admin_document_pages(self):
+        self.check_budget(7, reverse('admin:licenses_document_changelist'), login=True)
+        self.check_budget(7, reverse('admin:licenses_document_change', args=[self.document.id]), login=True)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PERF_FLUSH_INTERVAL=0)
+class PerformanceMiddlewareTests(TestCase):
+
+    def setUp(self):
+        perf.rolling_stats.reset()
+        registry_columns.reset()
+        make_license('МАГ 00001 БЭ')
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('licenses_all_json'))
+        timing = response['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_report_collects_samples(self):
+        for _ in range(3):
+            self.client.get(reverse('licenses_all_json'))
+        self.client.get(reverse('licenses_json'))
+
+        report = {row['view']: row for row in perf.build_report()}
+        self.assertEqual(report['licenses_all_json']['count'], 3)
+        self.assertEqual(report['licenses_json']['count'], 1)
+        self.assertGreater(report['licenses_all_json']['avg_sql_count'], 0)
+        self.assertGreater(report['licenses_all_json']['avg_bytes'], 0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(perf.percentile(values, 50), 50)
+        self.assertEqual(perf.percentile(values, 95), 95)
+        self.assertEqual(perf.percentile(values, 100), 100)
+        self.assertEqual(perf.percentile([], 95), 0.0)
+
+
+class SyntheticRegistryTests(TestCase):
+
+    def test_descriptions_are_parsed(self):
+        importer = GeoJSONImporter()
+        numbers = set()
+        for feature in generate_features(50):
+            parsed = importer.parse_description(feature['properties']['description'])
+            self.assertTrue(parsed['license_number'])
+            self.assertTrue(parsed['owner'].startswith(('ООО', 'АО', 'ПАО', 'ЗАО')))
+            self.assertIsNotNone(parsed['issue_date'])
+            self.assertIsNotNone(parsed['expiry_date'])
+            self.assertTrue(parsed['mineral_type'])
+            self.assertNotEqual(importer.extract_region(parsed['license_number']), 'Регион не определён')
+            numbers.add(parsed['license_number'])
+
+            polygons = feature['geometry']['coordinates']
+            self.assertEqual(feature['geometry']['type'], 'MultiPolygon')
+            for polygon in polygons:
+                self.assertEqual(polygon[0][0], polygon[0][-1])
+        self.assertEqual(len(numbers), 50)
+
+    def test_generation_is_deterministic(self):
+        self.assertEqual(list(generate_features(5, seed=1)), list(generate_features(5, seed=1)))
+
+    def test_generate_registry_command(self):
+        call_command('generate_registry', 20, '--documents', '1', stdout=StringIO())
+        self.assertEqual(License.objects.count(), 20)
+        self.assertEqual(Document.objects.count(), 20)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BenchmarkCommandTests(TestCase):
+
+    def test_results_written_and_rolled_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            call_command(
+                'benchmark', '--sizes', '20', '--repeat', '1', '--detail-samples', '5',
+                '--output', output, stdout=StringIO(),
+            )
+            with open(output, encoding='utf-8') as f:
+                report = json.load(f)
+
+        names = {r['name'] for r in report['results']}
+        self.assertEqual(names, {
+            'import_geojson', 'update_license_statuses', 'licenses_json',
+            'licenses_all_json', 'license_detail', 'export_excel', 'export_pdf',
+        })
+        self.assertIn('timestamp', report['meta'])
+        # Синтетические данные не остаются в базе
+        self.assertFalse(License.objects.exists())
+        self.assertFalse(User.objects.filter(username='benchmark').exists())
+
+
+class GeometryTests(TestCase):
+
+    SQUARE = [[0.0, 0.0], [2.0, 0.0], [2.0, 2.0], [0.0, 2.0], [0.0, 0.0]]
+
+    def test_square_centroid_and_bbox(self):
+        stats = geo.measure({'type': 'Polygon', 'coordinates': [self.SQUARE]})
+        self.assertAlmostEqual(stats['center'][0], 1.0)
+        self.assertAlmostEqual(stats['center'][1], 1.0)
+        self.assertEqual(stats['bbox'], [0.0, 0.0, 2.0, 2.0])
+        # 2x2 градуса у экватора ~ 222 x 222 км, долгота масштабируется по широте центра
+        expected = 4 * geo.KM_PER_DEGREE ** 2 * math.cos(math.radians(1.0))
+        self.assertAlmostEqual(stats['area_km2'], expected, places=3)
+
+    def test_dense_edge_does_not_bias_centroid(self):
+        # Много вершин на нижней стороне квадрата сместили бы среднее вершин вниз
+        dense = [[i / 50, 0.0] for i in range(100)] + [[2.0, 0.0], [2.0, 2.0], [0.0, 2.0], [0.0, 0.0]]
+        stats = geo.measure({'type': 'Polygon', 'coordinates': [dense]})
+        self.assertAlmostEqual(stats['center'][1], 1.0)
+
+    def test_orientation_and_unclosed_ring(self):
+        clockwise = list(reversed(self.SQUARE))[:-1]
+        stats = geo.measure({'type': 'Polygon', 'coordinates': [clockwise]})
+        self.assertAlmostEqual(stats['center'][0], 1.0)
+        self.assertGreater(stats['area_km2'], 0)
+
+    def test_hole_is_subtracted(self):
+        hole = [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0], [0.0, 0.0]]
+        full = geo.measure({'type': 'Polygon', 'coordinates': [self.SQUARE]})
+        holed = geo.measure({'type': 'Polygon', 'coordinates': [self.SQUARE, hole]})
+        self.assertAlmostEqual(holed['area_km2'] / full['area_km2'], 0.75, places=2)
+        self.assertGreater(holed['center'][0], 1.0)
+        self.assertGreater(holed['center'][1], 1.0)
+
+    def test_combine_matches_merged_measure(self):
+        other = [[[x + 10, y + 5] for x, y in self.SQUARE]]
+        first = geo.measure({'type': 'Polygon', 'coordinates': [self.SQUARE]})
+        second = geo.measure({'type': 'Polygon', 'coordinates': other})
+        merged = geo.measure({'type': 'MultiPolygon', 'coordinates': [[self.SQUARE], other]})
+        combined = geo.combine(first, second)
+        self.assertAlmostEqual(combined['area_km2'], merged['area_km2'], places=6)
+        self.assertAlmostEqual(combined['center'][0], merged['center'][0], places=6)
+        self.assertAlmostEqual(combined['center'][1], merged['center'][1], places=6)
+        self.assertEqual(combined['bbox'], merged['bbox'])
+
+    def test_empty_and_degenerate(self):
+        self.assertIsNone(geo.measure(None))
+        self.assertIsNone(geo.measure({'type': 'MultiPolygon', 'coordinates': []}))
+        line = [[0.0, 0.0], [1.0, 1.0], [2.0, 2.0], [0.0, 0.0]]
+        stats = geo.measure({'type': 'Polygon', 'coordinates': [line]})
+        self.assertEqual(stats['area_km2'], 0.0)
+        self.assertAlmostEqual(stats['center'][0], 1.0)
+
+    def test_importer_stores_stats_and_merges(self):
+        def feature(coords):
+            return {
+                'type': 'Feature',
+                'geometry': {'type': 'Polygon', 'coordinates': [coords]},
+                'properties': {'description': 'МАГ 00001 БЭ Участок<br/>ООО «Тест»', 'fill': '#ed4543'},
+            }
+
+        other = [[x + 10, y] for x, y in self.SQUARE]
+        GeoJSONImporter().import_from_file({'features': [feature(self.SQUARE), feature(other)]})
+
+        license_obj = License.objects.get()
+        self.assertAlmostEqual(float(license_obj.longitude), 6.0, places=5)
+        self.assertAlmostEqual(float(license_obj.latitude), 1.0, places=5)
+        self.assertEqual([license_obj.min_lon, license_obj.max_lon], [0.0, 12.0])
+        self.assertGreater(license_obj.area_km2, 0)
+
+    def test_backfill_command(self):
+        make_license('МАГ 00001 БЭ')
+        call_command('backfill_geometry', stdout=StringIO())
+        license_obj = License.objects.get()
+        self.assertAlmostEqual(license_obj.min_lat, 60.0)
+        self.assertAlmostEqual(license_obj.max_lat, 60.1)
+        self.assertIsNotNone(license_obj.area_km2)
+
+
+class BBoxQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        def square(number, lon, lat, size=1.0):
+            ring = [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+            license_obj = make_license(number, polygon_data={'type': 'Polygon', 'coordinates': [ring]})
+            license_obj.apply_geometry_stats(geo.measure(license_obj.polygon_data))
+            license_obj.save()
+            return license_obj
+
+        cls.magadan = square('МАГ 00001 БЭ', 150.0, 59.0)
+        cls.chukotka = square('МАГ 00002 БЭ', 179.5, 65.0)
+        cls.kemerovo = square('КЕМ 00001 БЭ', 86.0, 55.0)
+        cls.point_only = make_license(
+            'ИРК 00001 БЭ', polygon_data=None, latitude=52.3, longitude=104.3,
+        )
+
+    def setUp(self):
+        registry_columns.reset()
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.json()}
+
+    def test_intersecting_licenses_only(self):
+        response = self.client.get(reverse('licenses_all_json'), {'bbox': '149.5,58.5,150.5,59.5'})
+        self.assertEqual(self.ids(response), {self.magadan.id})
+
+    def test_point_licenses_without_polygon(self):
+        response = self.client.get(reverse('licenses_all_json'), {'bbox': '100,50,110,55'})
+        self.assertEqual(self.ids(response), {self.point_only.id})
+
+    def test_antimeridian(self):
+        response = self.client.get(reverse('licenses_all_json'), {'bbox': '179,64,-179,66'})
+        self.assertEqual(self.ids(response), {self.chukotka.id})
+        # Долготы за пределами [-180, 180] (карта прокручена через меридиан)
+        response = self.client.get(reverse('licenses_all_json'), {'bbox': '179,64,181,66'})
+        self.assertEqual(self.ids(response), {self.chukotka.id})
+
+    def test_paginated_api(self):
+        response = self.client.get(reverse('licenses_json'), {'bbox': '80,50,155,60'})
+        ids = {row['id'] for row in response.json()['results']}
+        self.assertEqual(ids, {self.magadan.id, self.kemerovo.id, self.point_only.id})
+
+    def test_invalid_bbox(self):
+        for value in ('1,2,3', 'a,b,c,d', '0,10,1,5', 'nan,0,1,1'):
+            response = self.client.get(reverse('licenses_all_json'), {'bbox': value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+def square_license(number, lon, lat, size=1.0):
+    """Лицензия с квадратным участком и рассчитанным охватом"""
+    ring = [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+    license_obj = make_license(number, polygon_data={'type': 'Polygon', 'coordinates': [ring]})
+    license_obj.apply_geometry_stats(geo.measure(license_obj.polygon_data))
+    license_obj.save()
+    return license_obj
+
+
+class STRTreeTests(TestCase):
+
+    def test_matches_brute_force(self):
+        import numpy as np
+
+        rng = np.random.default_rng(1)
+        lows = rng.uniform([30, 40], [170, 75], size=(3000, 2))
+        boxes = np.hstack([lows, lows + rng.uniform(0.01, 1.0, size=(3000, 2))])
+        tree = STRTree(np.arange(3000), boxes)
+
+        for query in ([100, 50, 101, 51], [30, 40, 170, 80], [0, 0, 1, 1], [150.5, 60.2, 150.5, 60.2]):
+            min_lon, min_lat, max_lon, max_lat = query
+            expected = set(np.nonzero(
+                (boxes[:, 0] <= max_lon) & (boxes[:, 2] >= min_lon)
+                & (boxes[:, 1] <= max_lat) & (boxes[:, 3] >= min_lat)
+            )[0].tolist())
+            self.assertEqual(set(tree.query(*query).tolist()), expected, query)
+
+    def test_empty_tree(self):
+        import numpy as np
+
+        self.assertEqual(len(STRTree([], np.empty((0, 4))).query(0, 0, 1, 1)), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SpatialApiTests(TestCase):
+
+    def setUp(self):
+        forget_data_version()
+        spatial_index.reset()
+        self.first = square_license('МАГ 00001 БЭ', 150.0, 60.0)
+        self.second = square_license('МАГ 00002 БЭ', 152.0, 60.0)
+        # Полигон с дырой: точка в дыре не принадлежит лицензии
+        outer = [[160.0, 60.0], [162.0, 60.0], [162.0, 62.0], [160.0, 62.0], [160.0, 60.0]]
+        hole = [[160.5, 60.5], [161.5, 60.5], [161.5, 61.5], [160.5, 61.5], [160.5, 60.5]]
+        self.holed = make_license('МАГ 00003 БЭ', polygon_data={'type': 'Polygon', 'coordinates': [outer, hole]})
+        self.holed.apply_geometry_stats(geo.measure(self.holed.polygon_data))
+        self.holed.save()
+
+    def get_ids(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_point_in_polygon(self):
+        self.assertEqual(self.get_ids('licenses_at_point', lon=150.5, lat=60.5), [self.first.id])
+        self.assertEqual(self.get_ids('licenses_at_point', lon=151.5, lat=60.5), [])
+        self.assertEqual(self.get_ids('licenses_at_point', lon=161.0, lat=61.0), [])
+        self.assertEqual(self.get_ids('licenses_at_point', lon=160.2, lat=61.0), [self.holed.id])
+
+    def test_radius_sorted_by_distance(self):
+        # Точка между участками, ближе к первому (~17 км и ~39 км)
+        response = self.client.get(reverse('licenses_within_radius'), {'lon': 151.3, 'lat': 60.5, 'radius_km': 100})
+        results = response.json()['results']
+        self.assertEqual([row['id'] for row in results], [self.first.id, self.second.id])
+        self.assertLess(results[0]['distance_km'], results[1]['distance_km'])
+        self.assertEqual(self.get_ids('licenses_within_radius', lon=151.3, lat=60.5, radius_km=5), [])
+
+    def test_nearest(self):
+        self.assertEqual(self.get_ids('licenses_nearest', lon=170.0, lat=61.0, limit=1), [self.holed.id])
+        self.assertEqual(len(self.get_ids('licenses_nearest', lon=151.5, lat=60.5, limit=3)), 3)
+
+    def test_nearest_loads_only_closest_polygons(self):
+        for number in range(30):
+            square_license(f'МАГ {number + 100:05d} БЭ', 100.0 + number, 50.0)
+        with mock.patch.object(spatial_index, '_with_distances', wraps=spatial_index._with_distances) as loaded:
+            found = spatial_index.nearest(170.0, 61.0, limit=2)
+        self.assertEqual([license_obj.id for distance, license_obj in found], [self.holed.id, self.second.id])
+        # Полигоны загружены только для двух кандидатов с ближайшими охватами
+        self.assertEqual(sum(len(call.args[0]) for call in loaded.call_args_list), 2)
+
+    def test_invalid_parameters(self):
+        for name, params in (
+            ('licenses_at_point', {'lon': 'x', 'lat': 1}),
+            ('licenses_at_point', {'lon': 200, 'lat': 1}),
+            ('licenses_within_radius', {'lon': 1, 'lat': 1, 'radius_km': 10000}),
+            ('licenses_nearest', {'lon': 1, 'lat': 1, 'limit': 0}),
+        ):
+            self.assertEqual(self.client.get(reverse(name), params).status_code, 400)
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.get_ids('licenses_at_point', lon=150.5, lat=60.5), [self.first.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = square_license('МАГ 00004 БЭ', 150.2, 60.2, size=0.1)
+            self.second.delete()
+        self.assertEqual(
+            sorted(self.get_ids('licenses_at_point', lon=150.25, lat=60.25)),
+            sorted([self.first.id, moved.id]),
+        )
+        self.assertEqual(self.get_ids('licenses_at_point', lon=152.5, lat=60.5), [])
+
+    def test_sync_from_other_process(self):
+        self.get_ids('licenses_at_point', lon=150.5, lat=60.5)
+        # Удаление "в другом процессе": обработчик сигнала не выполняется
+        # (on_commit не вызывается), индекс узнаёт о нём только по версии данных
+        self.first.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            License.objects.expire_overdue()
+            make_license('МАГ 00009 БЭ', expiry_date=date(2000, 1, 1))
+        self.assertEqual(self.get_ids('licenses_at_point', lon=150.5, lat=60.5), [])
+
+    def test_sync_after_late_commit(self):
+        self.get_ids('licenses_at_point', lon=150.5, lat=60.5)
+        # Транзакция другого процесса зафиксирована намного позже отметки
+        # updated_at: изменение всё равно попадает в индекс по номеру
+        late = square_license('МАГ 00010 БЭ', 150.2, 60.2, size=0.1)
+        License.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(minutes=10))
+        bump_data_version()
+        self.assertEqual(
+            sorted(self.get_ids('licenses_at_point', lon=150.25, lat=60.25)),
+            sorted([self.first.id, late.id]),
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OverlapTests(TestCase):
+
+    def setUp(self):
+        self.first = square_license('МАГ 00001 БЭ', 150.0, 60.0)
+        # Перекрывает четверть первого участка
+        self.second = square_license('МАГ 00002 БЭ', 150.5, 60.5)
+        # Только касается первого участка по стороне
+        self.touching = square_license('МАГ 00003 БЭ', 151.0, 59.0)
+        self.far = square_license('МАГ 00004 БЭ', 160.0, 60.0)
+
+    def test_candidates_and_exact_intersection(self):
+        pairs = candidate_pairs()
+        self.assertIn((self.first.id, self.second.id), pairs)
+        self.assertNotIn(self.far.id, {license_id for pair in pairs for license_id in pair})
+
+        overlaps = detect_overlaps()
+        self.assertEqual([(o.license_a_id, o.license_b_id) for o in overlaps], [(self.first.id, self.second.id)])
+        overlap = overlaps[0]
+        self.assertAlmostEqual(overlap.share_a, 0.25, places=2)
+        self.assertAlmostEqual(overlap.area_km2, self.first.area_km2 / 4, delta=self.first.area_km2 * 0.01)
+
+    def test_command_replaces_results(self):
+        call_command('detect_overlaps', stdout=StringIO())
+        self.assertEqual(LicenseOverlap.objects.count(), 1)
+        call_command('detect_overlaps', stdout=StringIO())
+        self.assertEqual(LicenseOverlap.objects.count(), 1)
+
+        self.second.delete()
+        call_command('detect_overlaps', stdout=StringIO())
+        self.assertFalse(LicenseOverlap.objects.exists())
+
+    def test_import_check(self):
+        ring = [[159.5, 60.5], [160.5, 60.5], [160.5, 61.5], [159.5, 61.5], [159.5, 60.5]]
+        importer = GeoJSONImporter(check_overlaps=True)
+        result = importer.import_from_file({'type': 'FeatureCollection', 'features': [{
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': {'description': 'МАГ 00005 БЭ Участок<br/>ООО «Тест»<br/>Дата выдачи: 01.01.2020'},
+        }]})
+        self.assertEqual([(o['license_a'], o['license_b']) for o in result['overlaps']],
+                         [('МАГ 00004 БЭ', 'МАГ 00005 БЭ')])
+        self.assertEqual(LicenseOverlap.objects.get().license_b.license_number, 'МАГ 00005 БЭ')
+        # Без флага проверка не выполняется
+        self.assertNotIn('overlaps', GeoJSONImporter().import_from_file({'features': []}))
+
+    def test_admin_changelist(self):
+        call_command('detect_overlaps', stdout=StringIO())
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        response = self.client.get(reverse('admin:licenses_licenseoverlap_changelist'),
+                                   {'license_a__region__exact': self.first.region})
+        self.assertContains(response, 'МАГ 00002 БЭ')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PolygonTableTests(TestCase):
+
+    FIRST = [[150.0, 60.0], [150.1, 60.0], [150.1, 60.1], [150.0, 60.1], [150.0, 60.0]]
+    SECOND = [[151.0, 60.0], [151.1, 60.0], [151.1, 60.1], [151.0, 60.1], [151.0, 60.0]]
+
+    def collection(self, *rings):
+        return {'type': 'FeatureCollection', 'features': [{
+            'type': 'Feature',
+            'geometry': {'type': 'MultiPolygon', 'coordinates': [[ring] for ring in rings]},
+            'properties': {'description': 'МАГ 00001 БЭ Участок<br/>ООО «Тест»<br/>Дата выдачи: 01.01.2020'},
+        }]}
+
+    def test_reimport_is_idempotent(self):
+        result = GeoJSONImporter().import_from_file(self.collection(self.FIRST, self.FIRST))
+        self.assertEqual(result['imported'], 1)
+        license_obj = License.objects.get()
+        self.assertEqual(license_obj.polygons.count(), 1)
+        area = license_obj.area_km2
+
+        result = GeoJSONImporter().import_from_file(self.collection(self.FIRST))
+        self.assertEqual((result['updated'], result['unchanged']), (0, 1))
+        license_obj.refresh_from_db()
+        self.assertEqual(len(license_obj.polygon_data['coordinates']), 1)
+        self.assertEqual(license_obj.area_km2, area)
+
+    def test_only_new_polygons_are_added(self):
+        GeoJSONImporter().import_from_file(self.collection(self.FIRST))
+        result = GeoJSONImporter().import_from_file(self.collection(self.FIRST, self.SECOND))
+        self.assertEqual(result['updated'], 1)
+
+        license_obj = License.objects.get()
+        polygons = list(license_obj.polygons.all())
+        self.assertEqual([p.position for p in polygons], [0, 1])
+        self.assertEqual(polygons[1].min_lon, 151.0)
+        self.assertEqual(len(license_obj.polygon_data['coordinates']), 2)
+        self.assertAlmostEqual(license_obj.area_km2, sum(p.area_km2 for p in polygons))
+
+    def test_hash_ignores_closure_and_precision(self):
+        unclosed = [list(point) for point in self.FIRST[:-1]]
+        noisy = [[x + 1e-12, y] for x, y in self.FIRST]
+        self.assertEqual(geo.polygon_hash([self.FIRST]), geo.polygon_hash([unclosed]))
+        self.assertEqual(geo.polygon_hash([self.FIRST]), geo.polygon_hash([noisy]))
+        self.assertNotEqual(geo.polygon_hash([self.FIRST]), geo.polygon_hash([self.SECOND]))
+
+    def test_migration_hash_matches_import(self):
+        # Миграция 0006 хранит свою копию хеша: при смене алгоритма в
+        # licenses.geometry нужна миграция, пересчитывающая хеши
+        from importlib import import_module
+
+        migration = import_module('licenses.migrations.0006_license_polygon')
+        unclosed = [list(point) for point in self.FIRST[:-1]]
+        for polygon in ([self.FIRST], [unclosed], [self.SECOND, self.FIRST], [[[0, 0], [1, 1]]]):
+            self.assertEqual(migration.polygon_hash(polygon), geo.polygon_hash(polygon))
+
+    def test_list_endpoints_skip_geometry(self):
+        registry_columns.reset()
+        GeoJSONImporter().import_from_file(self.collection(self.FIRST))
+        for name in ('licenses_json', 'licenses_all_json'):
+            response = self.client.get(reverse(name))
+            rows = response.json()
+            rows = rows['results'] if isinstance(rows, dict) else rows
+            self.assertNotIn('polygon_data', rows[0])
+
+            response = self.client.get(reverse(name), {'geometry': 1})
+            rows = response.json()
+            rows = rows['results'] if isinstance(rows, dict) else rows
+            self.assertEqual(rows[0]['polygon_data']['type'], 'MultiPolygon')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DiffImportTests(MediaRootMixin, TestCase):
+
+    def feature(self, number, lon, owner='Тест'):
+        ring = [[lon, 60.0], [lon + 0.1, 60.0], [lon + 0.1, 60.1], [lon, 60.1], [lon, 60.0]]
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': {
+                'description': f'{number} Участок<br/>ООО «{owner}»<br/>Дата выдачи: 01.01.2020',
+                'fill': '#ed4543',
+            },
+        }
+
+    def setUp(self):
+        self.features = [self.feature(f'МАГ 0000{i} БЭ', 150.0 + i) for i in range(1, 4)]
+        GeoJSONImporter().import_from_file({'features': self.features})
+
+    def test_diff_reports_changes(self):
+        features = [
+            self.features[0],
+            self.feature('МАГ 00002 БЭ', 152.0, owner='Новый владелец'),
+            self.feature('МАГ 00009 БЭ', 159.0),
+        ]
+        diff = GeoJSONImporter().diff({'features': features})
+        self.assertEqual(diff['new'], ['МАГ 00009 БЭ'])
+        self.assertEqual(diff['changed'], ['МАГ 00002 БЭ'])
+        self.assertEqual(diff['unchanged'], ['МАГ 00001 БЭ'])
+        self.assertEqual(diff['removed'], ['МАГ 00003 БЭ'])
+        self.assertEqual(License.objects.count(), 3)
+
+    def test_import_writes_only_changed(self):
+        features = list(self.features)
+        features[1] = self.feature('МАГ 00002 БЭ', 152.0, owner='Новый владелец')
+        with CaptureQueriesContext(connection) as ctx:
+            result = GeoJSONImporter().import_from_file({'features': features})
+        self.assertEqual((result['updated'], result['unchanged']), (1, 2))
+        self.assertEqual(License.objects.get(license_number='МАГ 00002 БЭ').owner, 'ООО Новый владелец')
+        # Неизменённые лицензии не запрашиваются по одной
+        self.assertLess(len(ctx.captured_queries), 12)
+
+        result = GeoJSONImporter().import_from_file({'features': features})
+        self.assertEqual((result['updated'], result['unchanged']), (0, 3))
+
+    def test_reimport_keeps_manual_status_and_first_feature_fields(self):
+        # Статус изменён вручную в админке
+        License.objects.filter(license_number='МАГ 00002 БЭ').update(status='suspended')
+        features = [
+            self.features[0],
+            self.feature('МАГ 00002 БЭ', 152.0, owner='Новый владелец'),
+            self.feature('МАГ 00002 БЭ', 152.5, owner='Другой владелец'),
+            self.features[2],
+        ]
+        result = GeoJSONImporter().import_from_file({'features': features})
+        self.assertEqual(result['updated'], 1)
+        license_obj = License.objects.get(license_number='МАГ 00002 БЭ')
+        self.assertEqual((license_obj.owner, license_obj.status), ('ООО Новый владелец', 'suspended'))
+        self.assertEqual(license_obj.polygons.count(), 2)
+
+    def test_reimport_without_source_hash_keeps_fields(self):
+        # Лицензия заведена вручную: хеша источника нет, сведения не перезаписываются
+        License.objects.filter(license_number='МАГ 00001 БЭ').update(source_hash='', owner='ООО Ручной')
+        GeoJSONImporter().import_from_file({'features': [self.feature('МАГ 00001 БЭ', 151.0, owner='Новый')]})
+        self.assertEqual(License.objects.get(license_number='МАГ 00001 БЭ').owner, 'ООО Ручной')
+
+    def test_dry_run_command_and_upload(self):
+        path = os.path.join(self._media_root, 'dump.geojson')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'features': [self.feature('МАГ 00009 БЭ', 159.0)]}, f, ensure_ascii=False)
+        out = StringIO()
+        call_command('import_geojson', path, '--dry-run', stdout=out)
+        self.assertIn('Новые: 1', out.getvalue())
+        self.assertIn('Нет в файле: 3', out.getvalue())
+
+        User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.login(username='staff', password='password')
+        with open(path, 'rb') as f:
+            response = self.client.post(reverse('upload_geojson'), {'geojson_file': f, 'dry_run': '1'})
+        self.assertContains(response, 'Предпросмотр импорта')
+        self.assertFalse(License.objects.filter(license_number='МАГ 00009 БЭ').exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResumableImportTests(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(self._media_root, 'registry.geojson')
+        features = list(generate_features(7, seed=3, max_vertices=30))
+        # Вторая часть лицензии в другой пачке
+        features.append(dict(features[0], geometry={
+            'type': 'Polygon',
+            'coordinates': [[[10.0, 10.0], [10.1, 10.0], [10.1, 10.1], [10.0, 10.0]]],
+        }))
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f, ensure_ascii=False)
+
+    def test_resume_after_crash(self):
+        process = GeoJSONImporter._process_feature
+        calls = []
+
+        def crash_on_fifth(importer, feature, parsed=None, **kwargs):
+            calls.append(feature)
+            if len(calls) == 5:
+                raise KeyboardInterrupt()
+            return process(importer, feature, parsed, **kwargs)
+
+        with mock.patch.object(GeoJSONImporter, '_process_feature', crash_on_fifth):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('import_geojson', self.path, '--batch-size', '2', stdout=StringIO())
+
+        run = ImportRun.objects.get()
+        self.assertEqual(run.status, 'failed')
+        # Объекты идут по номерам лицензий, и пачка не разрывает части одной
+        # лицензии: вторая пачка - с третьего по пятый объект, и сбой откатывает её
+        self.assertEqual((run.status, run.next_index, run.imported), ('failed', 2, 2))
+        # Пачка с упавшим объектом откатилась целиком
+        self.assertEqual(License.objects.count(), 2)
+
+        out = StringIO()
+        call_command('import_geojson', '--resume', str(run.pk), stdout=out)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.next_index), ('completed', 8))
+        # Вторая часть лицензии, созданной этим же импортом, не считается обновлением
+        self.assertEqual((run.imported, run.updated), (7, 0))
+        self.assertEqual(License.objects.count(), 7)
+        self.assertEqual(LicensePolygon.objects.filter(position__gt=0, coordinates__0__0__0=10.0).count(), 1)
+
+        # Повторный импорт файла ничего не меняет
+        call_command('import_geojson', self.path, stdout=StringIO())
+        self.assertEqual(ImportRun.objects.first().unchanged, 8)
+
+    def test_resume_rejects_other_file(self):
+        call_command('import_geojson', self.path, stdout=StringIO())
+        run = ImportRun.objects.get()
+        run.status = 'failed'
+        run.save()
+        other = os.path.join(self._media_root, 'other.geojson')
+        with open(other, 'w', encoding='utf-8') as f:
+            json.dump({'features': []}, f)
+        with self.assertRaises(CommandError):
+            call_command('import_geojson', other, '--resume', str(run.pk), stdout=StringIO())
+
+
+def shifted_collection(numbers, dx):
+    """Объекты с заданными номерами, контуры сдвинуты на dx градусов"""
+    features = []
+    for i, number in enumerate(numbers):
+        lon = 150.0 + i + dx
+        ring = [[lon, 60.0], [lon + 0.05, 60.0], [lon + 0.05, 60.05], [lon, 60.05], [lon, 60.0]]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': {'description': f'{number} Участок<br/>ООО «Тест»<br/>Дата выдачи: 01.01.2020'},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConcurrentImportTests(TestCase):
+
+    def test_concurrent_create_becomes_append(self):
+        # Параллельный импорт создаёт лицензию между проверкой существования и вставкой
+        apply = License.apply_geometry_stats
+        competing = {'done': False}
+
+        def apply_and_compete(license_obj, stats):
+            if not competing['done'] and license_obj.pk is None:
+                competing['done'] = True
+                GeoJSONImporter().import_from_file(shifted_collection(['МАГ 00001 БЭ'], 0.5))
+            return apply(license_obj, stats)
+
+        with mock.patch.object(License, 'apply_geometry_stats', apply_and_compete):
+            result = GeoJSONImporter().import_from_file(shifted_collection(['МАГ 00001 БЭ'], 0.0))
+
+        self.assertEqual((result['imported'], result['updated'], result['skipped']), (0, 1, 0))
+        license_obj = License.objects.get()
+        self.assertEqual(license_obj.polygons.count(), 2)
+        self.assertEqual(len(license_obj.polygon_data['coordinates']), 2)
+
+    def test_features_grouped_by_license(self):
+        importer = GeoJSONImporter()
+        data = shifted_collection(['МАГ 00002 БЭ', 'МАГ 00001 БЭ', 'МАГ 00002 БЭ', 'МАГ 00001 БЭ'], 0.0)
+        entries, hashes = importer.plan(data['features'])
+        entries.sort(key=lambda entry: entry[1]['license_number'])
+        # Пачка не разрывает объекты одной лицензии
+        self.assertEqual(list(importer.batches(entries, 0, 1)), [(0, 2), (2, 4)])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(CACHES=LOCMEM_CACHES)
+class ParallelImportStressTests(TransactionTestCase):
+    """Несколько импортов одновременно дополняют одни и те же лицензии (PostgreSQL)"""
+
+    WORKERS = 6
+    LICENSES = 40
+
+    def test_no_polygons_lost(self):
+        numbers = [f'МАГ {i:05d} БЭ' for i in range(1, self.LICENSES + 1)]
+        barrier = threading.Barrier(self.WORKERS)
+        errors = []
+
+        def worker(index):
+            try:
+                barrier.wait()
+                # У каждого процесса свой порядок номеров и свои полигоны
+                ordered = numbers[index:] + numbers[:index]
+                result = GeoJSONImporter().import_from_file(shifted_collection(ordered, index * 0.001))
+                errors.extend(result['errors'])
+            except Exception as e:
+                errors.append(repr(e))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(License.objects.count(), self.LICENSES)
+        for license_obj in License.objects.all():
+            self.assertEqual(license_obj.polygons.count(), self.WORKERS, license_obj.license_number)
+            self.assertEqual(len(license_obj.polygon_data['coordinates']), self.WORKERS)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GeometryCleanupTests(TestCase):
+
+    # По часовой стрелке, с повтором, точкой на стороне, «иглой» и без замыкания
+    RAW = [[150.00000012, 60.0], [150.0, 60.1], [150.1, 60.1], [150.1, 60.1],
+           [150.2, 60.1], [150.1, 60.1], [150.1, 60.05], [150.1, 60.0]]
+    CLEAN = [[150.0, 60.0], [150.1, 60.0], [150.1, 60.1], [150.0, 60.1], [150.0, 60.0]]
+
+    def feature(self, coordinates, owner='Тест'):
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'MultiPolygon', 'coordinates': coordinates},
+            'properties': {'description': f'МАГ 00001 БЭ Участок<br/>ООО «{owner}»<br/>Дата выдачи: 01.01.2020'},
+        }
+
+    def test_clean_polygon(self):
+        self.assertEqual(geo.clean_polygon([self.RAW]), [self.CLEAN])
+        # Дыра ориентируется по часовой стрелке, вырожденная дыра отбрасывается
+        hole = [[150.02, 60.02], [150.08, 60.02], [150.08, 60.08], [150.02, 60.08]]
+        cleaned = geo.clean_polygon([self.CLEAN, hole, [[150.0, 60.0], [150.05, 60.0], [150.0, 60.0]]])
+        self.assertEqual(len(cleaned), 2)
+        self.assertEqual(cleaned[1][1], [150.02, 60.08])
+        self.assertIsNone(geo.clean_polygon([[[0, 0], [1, 1], [2, 2], [0, 0]]]))
+        self.assertEqual(geo.clean_polygon([[[0.1234567, 0], [1, 0], [1, 1]]], precision=3)[0][0], [0.123, 0.0])
+
+    def test_import_stores_clean_geometry(self):
+        degenerate = [[[151.0, 60.0], [151.0, 60.0], [151.0, 60.0]]]
+        GeoJSONImporter().import_from_file({'features': [self.feature([[self.RAW], degenerate])]})
+        license_obj = License.objects.get()
+        self.assertEqual(license_obj.polygon_data['coordinates'], [[self.CLEAN]])
+        self.assertEqual(license_obj.polygons.get().coordinates, [self.CLEAN])
+
+    def test_compact_command_and_reimport(self):
+        # Контур, загруженный до появления очистки
+        license_obj = make_license('МАГ 00001 БЭ', polygon_data={'type': 'MultiPolygon', 'coordinates': [[self.RAW]]})
+        LicensePolygon.objects.create(license=license_obj, coordinates=[self.RAW],
+                                      content_hash=geo.polygon_hash([self.RAW]))
+        # Изменённое описание, тот же полигон: несжатый полигон распознаётся по исходному хешу
+        GeoJSONImporter().import_from_file({'features': [self.feature([[self.RAW]], owner='Другой')]})
+        self.assertEqual(license_obj.polygons.count(), 1)
+
+        out = StringIO()
+        call_command('compact_geometry', stdout=out)
+        self.assertIn('изменено: 1', out.getvalue())
+        license_obj.refresh_from_db()
+        self.assertEqual(license_obj.polygon_data['coordinates'], [[self.CLEAN]])
+        self.assertEqual(license_obj.polygons.get().content_hash, geo.polygon_hash([self.CLEAN]))
+        self.assertIsNotNone(license_obj.area_km2)
+
+        GeoJSONImporter().import_from_file({'features': [self.feature([[self.RAW]], owner='Третий')]})
+        self.assertEqual(license_obj.polygons.count(), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TableImportTests(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.login(username='staff', password='password')
+        self.polygon = make_license('МАГ 00001 БЭ', expiry_date=date(2040, 1, 1))
+        self.polygon.apply_geometry_stats(geo.measure(self.polygon.polygon_data))
+        self.polygon.save()
+        make_license('МАГ 00002 БЭ', polygon_data=None, latitude=60, longitude=150)
+
+    def test_excel_round_trip(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse('export_licenses_excel'))
+        workbook = load_workbook(BytesIO(response.content))
+        sheet = workbook.active
+        rows = list(sheet.iter_rows(min_row=2))
+        # Правим выгрузку: владелец, статус, координаты и новая строка
+        first = next(row for row in rows if row[0].value == 'МАГ 00001 БЭ')
+        second = next(row for row in rows if row[0].value == 'МАГ 00002 БЭ')
+        first[2].value = 'ООО Новый владелец'
+        first[8].value = 'Приостановлена'
+        first[9].value = 10.5
+        second[9].value = 61.25
+        sheet.append(['МАГ 00003 БЭ', 'БЭ', 'ООО Третий', '', '', '01.02.2021', '', '', 'Действующая'])
+        output = BytesIO()
+        workbook.save(output)
+        output.seek(0)
+
+        result = RegistryTableImporter().import_file(output, 'licenses.xlsx')
+        self.assertEqual((result['imported'], result['updated'], result['skipped']), (1, 2, 0), result['errors'])
+        first = License.objects.get(license_number='МАГ 00001 БЭ')
+        self.assertEqual((first.owner, first.status), ('ООО Новый владелец', 'suspended'))
+        # Центр лицензии с контуром таблица не меняет
+        self.assertEqual(float(first.latitude), self.polygon.latitude)
+        self.assertEqual(first.expiry_date, date(2040, 1, 1))
+        self.assertEqual(float(License.objects.get(license_number='МАГ 00002 БЭ').latitude), 61.25)
+        third = License.objects.get(license_number='МАГ 00003 БЭ')
+        self.assertEqual((third.region, third.issue_date), ('Магаданская область', date(2021, 2, 1)))
+
+        # Повторная загрузка той же таблицы ничего не меняет
+        output.seek(0)
+        result = RegistryTableImporter().import_file(output, 'licenses.xlsx')
+        self.assertEqual((result['updated'], result['unchanged']), (0, 3))
+
+    def test_csv_upload_in_batches(self):
+        lines = ['Номер лицензии;Недропользователь;Дата выдачи;Дата окончания;Статус;Широта']
+        lines += [f'МАГ {i:05d} БЭ;ООО {i};01.01.2020;;Действующая;60,5' for i in range(2, 12)]
+        lines.append('МАГ 00099 БЭ;ООО Ошибка;32.13.2020;;;')
+        lines.append('МАГ 00098 БЭ;ООО Ошибка;01.01.2020;;;nan')
+        lines.append('МАГ 00001 БЭ;ООО Старый;;01.01.2021;Действующая;')
+        path = os.path.join(self._media_root, 'registry.csv')
+        with open(path, 'w', encoding='cp1251', newline='') as f:
+            f.write('\r\n'.join(lines))
+
+        with open(path, 'rb') as f:
+            response = self.client.post(reverse('upload_geojson'), {'geojson_file': f})
+        self.assertContains(response, 'Импорт таблицы registry.csv')
+        result = response.context['result']
+        self.assertEqual((result['imported'], result['updated'], result['skipped']), (9, 2, 2))
+        self.assertIn('Строка 12', result['errors'][0])
+        self.assertIn('Строка 13: некорректная координата «nan»', result['errors'][1])
+        self.assertEqual(License.objects.get(license_number='МАГ 00002 БЭ').longitude, 150)
+        self.assertEqual(float(License.objects.get(license_number='МАГ 00011 БЭ').latitude), 60.5)
+        # Истёкший срок переводит лицензию в статус «Истекла»
+        self.assertEqual(License.objects.get(license_number='МАГ 00001 БЭ').status, 'expired')
+
+        out = StringIO()
+        call_command('import_registry', path, '--batch-size', '3', stdout=out)
+        self.assertIn('Без изменений: 11', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('import_registry', os.path.join(self._media_root, 'missing.csv'), stdout=out)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArchiveImportTests(MediaRootMixin, TestCase):
+
+    def feature(self, number, lon):
+        ring = [[lon, 60.0], [lon + 0.1, 60.0], [lon + 0.1, 60.1], [lon, 60.1], [lon, 60.0]]
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': {'description': f'{number} Участок<br/>ООО «Тест»<br/>Дата выдачи: 01.01.2020'},
+        }
+
+    def make_archive(self):
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            # Лицензия МАГ 00001 БЭ разбита на два файла
+            zf.writestr('b/second.geojson', json.dumps({'features': [
+                self.feature('МАГ 00001 БЭ', 151.0), self.feature('МАГ 00003 БЭ', 153.0)]}))
+            zf.writestr('a/first.json', json.dumps({'features': [
+                self.feature('МАГ 00001 БЭ', 150.0), self.feature('МАГ 00002 БЭ', 152.0)]}))
+            zf.writestr('broken.geojson', '{"features": [')
+            zf.writestr('__MACOSX/._first.json', 'x')
+            zf.writestr('readme.txt', 'x')
+        archive.seek(0)
+        return archive
+
+    def test_load_archive_is_deterministic(self):
+        data, members = load_archive(self.make_archive(), workers=1)
+        self.assertEqual([m['name'] for m in members], ['a/first.json', 'b/second.geojson', 'broken.geojson'])
+        self.assertEqual([m['features'] for m in members], [2, 2, 0])
+        self.assertIn('корректным GeoJSON', members[2]['error'])
+        for workers in (2, 4):
+            self.assertEqual(load_archive(self.make_archive(), workers=workers), (data, members))
+        with self.assertRaises(ValueError):
+            load_archive(BytesIO(b'not a zip'))
+        # Архив разбирается в память целиком - распакованный размер ограничен
+        with override_settings(IMPORT_ARCHIVE_MAX_SIZE=100), self.assertRaisesMessage(ValueError, 'допустимый размер'):
+            load_archive(self.make_archive())
+
+    def test_command_and_upload(self):
+        path = os.path.join(self._media_root, 'registry.zip')
+        with open(path, 'wb') as f:
+            f.write(self.make_archive().read())
+        out = StringIO()
+        call_command('import_geojson', path, stdout=out)
+        self.assertIn('Файлов в архиве: 3', out.getvalue())
+        self.assertIn('Создано новых: 3', out.getvalue())
+        self.assertIn('broken.geojson: файл не является', out.getvalue())
+        merged = License.objects.get(license_number='МАГ 00001 БЭ')
+        # Полигоны объединены в порядке файлов архива
+        self.assertEqual([p[0][0][0] for p in merged.polygon_data['coordinates']], [150.0, 151.0])
+        self.assertEqual(ImportRun.objects.get().status, 'completed')
+
+        User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.login(username='staff', password='password')
+        with open(path, 'rb') as f:
+            response = self.client.post(reverse('upload_geojson'), {'geojson_file': f})
+        result = response.context['result']
+        self.assertEqual((result['unchanged'], len(result['members'])), (4, 3))
+        self.assertContains(response, 'Файлы архива: 3')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImportProfileTests(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(self._media_root, 'registry.geojson')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'features': list(generate_features(5, seed=2, max_vertices=20))}, f, ensure_ascii=False)
+
+    def test_nested_stages_are_exclusive(self):
+        profile = ImportProfile(trace_memory=False)
+        with profile.measure():
+            with profile.stage('orm'):
+                with profile.stage('geometry'):
+                    License.objects.count()
+                License.objects.count()
+        report = profile.report()
+        stages = {row['name']: row for row in report['stages']}
+        self.assertEqual(report['sql_count'], 2)
+        self.assertEqual((stages['orm']['calls'], stages['geometry']['calls']), (1, 1))
+        self.assertAlmostEqual(sum(row['seconds'] for row in report['stages']), report['total_seconds'], delta=0.01)
+        self.assertIsNone(report['peak_memory_mb'])
+
+    def test_command_profile(self):
+        output = os.path.join(self._media_root, 'profile.json')
+        out = StringIO()
+        call_command('import_geojson', self.path, '--profile-output', output, stdout=out)
+        self.assertIn('Профиль импорта', out.getvalue())
+        self.assertIn('Разбор описаний (parse_description)', out.getvalue())
+        with open(output, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(report['features'], 5)
+        self.assertGreater(report['sql_count'], 0)
+        self.assertGreater(report['peak_memory_mb'], 0)
+        self.assertEqual(report['source_size'], os.path.getsize(self.path))
+        stages = {row['name']: row['calls'] for row in report['stages']}
+        self.assertEqual((stages['json'], stages['geometry'], stages['orm']), (1, 5, 5))
+
+    def test_admin_profile(self):
+        User.objects.create_superuser('admin', password='password')
+        self.client.login(username='admin', password='password')
+        with open(self.path, 'rb') as f:
+            response = self.client.post(reverse('admin:licenses_import_geojson'), {'geojson_file': f, 'profile': '1'})
+        self.assertContains(response, 'Профиль импорта registry.geojson')
+        self.assertEqual(response.context['profile']['features'], 5)
+        self.assertEqual(License.objects.count(), 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ClusterTests(TestCase):
+
+    def setUp(self):
+        forget_data_version()
+        cluster_index.reset()
+        # Две группы лицензий: у Магадана и у Иркутска, и одна на Чукотке
+        for i in range(5):
+            make_license(f'МАГ {i:05d} БЭ', polygon_data=None, longitude=150 + i * 0.1, latitude=59.5,
+                         status='suspended' if i == 0 else 'active')
+        for i in range(3):
+            make_license(f'ИРК {i:05d} БЭ', polygon_data=None, longitude=104 + i * 0.1, latitude=52.3)
+        self.single = make_license('МАГ 09999 БЭ', polygon_data=None, longitude=179.5, latitude=66.0)
+
+    def get(self, **params):
+        response = self.client.get(reverse('licenses_clusters'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_clusters_by_zoom(self):
+        data = self.get(zoom=3)
+        self.assertTrue(data['clustered'])
+        clusters = sorted(data['clusters'], key=lambda c: -c['count'])
+        self.assertEqual([c['count'] for c in clusters], [5, 3, 1])
+        self.assertEqual(clusters[0]['statuses'], {'active': 4, 'suspended': 1})
+        self.assertEqual(clusters[0]['bbox'], [150.0, 59.5, 150.4, 59.5])
+        self.assertEqual((clusters[2]['id'], clusters[2]['license_number']), (self.single.id, 'МАГ 09999 БЭ'))
+        self.assertNotIn('id', clusters[0])
+
+        # На крупном масштабе кластеры распадаются, а за MAX_CLUSTER_ZOOM - отдельные лицензии
+        self.assertEqual(len(self.get(zoom=MAX_CLUSTER_ZOOM)['clusters']), 9)
+        data = self.get(zoom=MAX_CLUSTER_ZOOM + 1, bbox='103,52,105,53')
+        self.assertFalse(data['clustered'])
+        self.assertEqual(len(data['licenses']), 3)
+        # Без прямоугольника ответом был бы весь реестр
+        response = self.client.get(reverse('licenses_clusters'), {'zoom': MAX_CLUSTER_ZOOM + 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bbox_and_cache_by_version(self):
+        data = self.get(zoom=4, bbox='170,60,-170,70')
+        self.assertEqual([c['count'] for c in data['clusters']], [1])
+        # Повторный запрос не перечитывает лицензии из базы
+        with CaptureQueriesContext(connection) as ctx:
+            self.get(zoom=2)
+        self.assertFalse(any('licenses_license"."license_number' in q['sql'] for q in ctx.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.single.delete()
+        self.assertEqual(self.get(zoom=4, bbox='170,60,-170,70')['clusters'], [])
+        self.assertEqual(self.client.get(reverse('licenses_clusters'), {'zoom': 'x'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DeltaSyncTests(TestCase):
+
+    def setUp(self):
+        forget_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kept = make_license('МАГ 00001 БЭ')
+            self.changed = make_license('МАГ 00002 БЭ')
+            self.removed = make_license('МАГ 00003 БЭ')
+            self.expired = make_license('МАГ 00005 БЭ', expiry_date=date(2021, 1, 1))
+        # Версия, на которой клиент загрузил реестр
+        self.since = str(get_data_version())
+
+    def get(self, since):
+        response = self.client.get(reverse('licenses_all_json'), {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_and_tombstones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.changed.owner = 'ООО Новый'
+            self.changed.save()
+            removed_id = self.removed.id
+            self.removed.delete()
+            created = make_license('МАГ 00004 БЭ')
+        # Транзакция зафиксирована намного позже отметки updated_at
+        License.objects.filter(pk=self.changed.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        # Статусы обновляются до выборки (вне теста - с фиксацией и номером изменения)
+        with self.captureOnCommitCallbacks(execute=True):
+            License.objects.expire_overdue()
+        data = self.get(self.since)
+        self.assertFalse(data['full'])
+        # Просроченная лицензия попадает в изменения после смены статуса
+        self.assertEqual(
+            sorted(item['license_number'] for item in data['licenses']),
+            ['МАГ 00002 БЭ', 'МАГ 00004 БЭ', 'МАГ 00005 БЭ'])
+        self.assertEqual(data['deleted'], [removed_id])
+        self.assertEqual(LicenseDeletion.objects.get().license_number, 'МАГ 00003 БЭ')
+        self.assertEqual(next(item for item in data['licenses'] if item['id'] == created.id)['owner'], 'ООО Тест')
+
+        # Следующий запрос с next_since не видит уже полученных изменений
+        data = self.get(data['next_since'])
+        self.assertEqual((data['licenses'], data['deleted'], data['full']), ([], [], False))
+
+    def test_unknown_since_returns_full_registry(self):
+        # Клиент без копии и отметки времени от прежней версии клиента
+        for since in ('0', (timezone.now() - timedelta(hours=1)).isoformat(), str(timezone.now().timestamp())):
+            data = self.get(since)
+            self.assertTrue(data['full'])
+            self.assertEqual(len(data['licenses']), 4)
+            self.assertEqual(data['next_since'], get_data_version())
+        self.assertEqual(self.client.get(reverse('licenses_all_json'), {'since': 'вчера'}).status_code, 400)
+
+    def test_prune_deletion_log(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.removed.delete()
+        LicenseDeletion.objects.update(deleted_at=timezone.now() - timedelta(days=DELETION_LOG_DAYS + 1))
+        pruned_version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kept.delete()
+        self.assertEqual(prune_deletion_log(), 1)
+        self.assertEqual(list(LicenseDeletion.objects.values_list('license_number', flat=True)), ['МАГ 00001 БЭ'])
+        self.assertEqual(DataVersion.objects.get().pruned_value, pruned_version)
+        # Удаление из очищенной части журнала клиент с версией до неё не узнает
+        self.assertTrue(self.get(self.since)['full'])
+        self.assertFalse(self.get(str(pruned_version))['full'])
+
+    def test_version_endpoint(self):
+        version = self.client.get(reverse('licenses_version')).json()['version']
+        self.assertEqual(self.client.get(reverse('licenses_version')).json()['version'], version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kept.delete()
+        self.assertGreater(self.client.get(reverse('licenses_version')).json()['version'], version)
+
+
+
+class StaticPipelineTests(TestCase):
+
+    def test_minify_js_keeps_strings_and_regexes(self):
+        source = (
+            "// комментарий\n"
+            "const url = 'http://example.com/*x*/';  /* блок */\n"
+            "    const text = `a // b ${ {n: 1}.n } ${`вложенная ${url}`}`;\n"
+            "\n"
+            "const re = /[/]\\/+/g, half = 10 / 2;\n"
+            "if (re.test(url)) return\n"
+            "next()\n")
+        self.assertEqual(minify_js(source), (
+            "const url = 'http://example.com/*x*/';\n"
+            "const text = `a // b ${ {n: 1}.n } ${`вложенная ${url}`}`;\n"
+            "const re = /[/]\\/+/g, half = 10 / 2;\n"
+            "if (re.test(url)) return\n"
+            "next()\n"))
+
+    def test_minify_css(self):
+        self.assertEqual(
+            minify_css('/* шапка */\n.a ,\n.b > p {\n    color: red;\n    content: "  ;  ";\n}\n'),
+            '.a,.b>p{color: red;content: "  ;  "}')
+
+    def test_collectstatic_builds_hashed_compressed_files(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'licenses.storage.CompressedManifestStaticFilesStorage'},
+        }
+        with override_settings(STATIC_ROOT=static_root, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            with open(os.path.join(static_root, 'staticfiles.json')) as manifest:
+                hashed = json.load(manifest)['paths']['licenses/js/map.js']
+            self.assertRegex(hashed, r'^licenses/js/map\.[0-9a-f]{12}\.js$')
+            with open(os.path.join(static_root, hashed), 'rb') as minified:
+                content = minified.read()
+            with open(os.path.join(static_root, hashed + '.gz'), 'rb') as compressed:
+                self.assertEqual(gzip.decompress(compressed.read()), content)
+            with open(os.path.join(static_root, 'licenses/js/map.js'), 'rb') as original:
+                self.assertLess(len(content), len(original.read()))
+            self.assertNotIn('Настройки страницы из шаблона'.encode(), content)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RegistrySnapshotTests(TestCase):
+
+    def setUp(self):
+        forget_data_version()
+        make_license('МАГ 00001 БЭ')
+        make_license('МАГ 00002 БЭ', status='suspended')
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(REGISTRY_SNAPSHOT_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def read(self, url, suffix=''):
+        with open(os.path.join(self.root, os.path.basename(url) + suffix), 'rb') as f:
+            return f.read()
+
+    def test_snapshot_matches_api(self):
+        manifest = build_snapshot()
+        self.assertEqual(manifest['version'], get_data_version())
+        self.assertEqual(read_manifest(), manifest)
+        self.assertRegex(manifest['files']['registry'], r'^/snapshots/registry\.[0-9a-f]{12}\.json$')
+        # Те же байты, что отдаёт API
+        registry = self.read(manifest['files']['registry'])
+        self.assertEqual(registry, self.client.get(reverse('licenses_all_json')).content)
+        self.assertEqual(
+            self.read(manifest['files']['registry_geometry']),
+            self.client.get(reverse('licenses_all_json'), {'geometry': 1}).content)
+        self.assertEqual(gzip.decompress(self.read(manifest['files']['registry'], '.gz')), registry)
+        stats = json.loads(self.read(manifest['files']['stats']))
+        self.assertEqual((stats['total'], stats['status']), (2, {'active': 1, 'suspended': 1}))
+
+    def test_refresh_only_when_outdated(self):
+        first = build_snapshot()
+        self.assertIsNone(refresh_snapshot())
+        with self.captureOnCommitCallbacks(execute=True):
+            make_license('МАГ 00003 БЭ')
+        second = refresh_snapshot()
+        self.assertGreater(second['version'], first['version'])
+        self.assertNotEqual(second['files']['registry'], first['files']['registry'])
+        # Файлы прошлого снимка остаются для клиентов со старым манифестом
+        self.assertTrue(self.read(first['files']['registry']))
+        prune_snapshots(self.root, {os.path.basename(url) for url in second['files'].values()}, max_age=-1)
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.root) if name.endswith('.json')),
+            sorted([os.path.basename(url) for url in second['files'].values()] + ['manifest.json']))
+
+    def test_schedule_after_admin_save(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        license = License.objects.get(license_number='МАГ 00001 БЭ')
+        with override_settings(REGISTRY_SNAPSHOTS=True), mock.patch('licenses.snapshots.refresh_snapshot') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('admin:licenses_license_delete', args=[license.pk]), {'post': 'yes'})
+            # Сборка идёт в фоновом потоке
+            worker = snapshots._worker
+            if worker is not None:
+                worker.join(5)
+        refresh.assert_called_once_with()
+
+    def test_command(self):
+        out = StringIO()
+        call_command('build_registry_snapshot', stdout=out)
+        self.assertIn('/snapshots/registry-geometry.', out.getvalue())
+        call_command('build_registry_snapshot', '--if-outdated', stdout=out)
+        self.assertIn('Снимок реестра актуален', out.getvalue())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DataVersionTests(TransactionTestCase):
+
+    def setUp(self):
+        forget_data_version()
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_bumps_get_distinct_versions(self):
+        # Параллельная запись в одну таблицу - только на сервере БД (PostgreSQL)
+        start = get_data_version()
+        barrier = threading.Barrier(8)
+        versions = []
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(5):
+                    versions.append(bump_data_version())
+            except Exception as e:
+                errors.append(repr(e))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(versions), list(range(start + 1, start + 41)))
+
+    def test_version_survives_cache_loss(self):
+        version = bump_data_version()
+        forget_data_version()
+        self.assertEqual(get_data_version(), version)
+        self.assertEqual(DataVersion.objects.get().value, version)
+
+    def test_one_bump_per_transaction(self):
+        start = get_data_version()
+        with transaction.atomic():
+            for number in range(5):
+                make_license(f'МАГ {number:05d} БЭ')
+            License.objects.filter(license_number='МАГ 00000 БЭ').delete()
+        self.assertEqual(get_data_version(), start + 1)
+        self.assertEqual(set(License.objects.values_list('change_seq', flat=True)), {start + 1})
+
+        # Откаченная транзакция не увеличивает версию, следующая - увеличивает
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            make_license('МАГ 00010 БЭ')
+            raise RuntimeError
+        self.assertEqual(get_data_version(), start + 1)
+        make_license('МАГ 00011 БЭ')
+        self.assertEqual(get_data_version(), start + 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RequestCoalescingTests(TransactionTestCase):
+    """Нагрузочный тест: толпа одновременных запросов не умножает запросы к базе"""
+
+    HERDS = (1, 8, 24)
+
+    def setUp(self):
+        for i in range(1, 4):
+            make_license(f'МАГ {i:05d} БЭ')
+
+    def run_herd(self, size, target):
+        barrier = threading.Barrier(size)
+        results = [None] * size
+        queries = [0] * size
+        errors = []
+
+        def worker(index):
+            try:
+                barrier.wait()
+                with CaptureQueriesContext(connection) as ctx:
+                    results[index] = target()
+                queries[index] = len(ctx.captured_queries)
+            except Exception as e:
+                errors.append(repr(e))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results, sum(queries)
+
+    def test_thundering_herd_keeps_db_load_flat(self):
+        factory = RequestFactory()
+        real_license_data = views.license_data
+        joined = threading.Event()
+        expected_waiters = [0]
+        waiters = []
+        waiters_lock = threading.Lock()
+
+        class CountingEvent(threading.Event):
+            """Событие завершения вычисления, отмечающее присоединившиеся потоки"""
+
+            def wait(self, timeout=None):
+                with waiters_lock:
+                    waiters.append(1)
+                    if len(waiters) == expected_waiters[0]:
+                        joined.set()
+                return super().wait(timeout)
+
+        class Flight(coalescing._Flight):
+            def __init__(self):
+                super().__init__()
+                self.done = CountingEvent()
+
+        def held_license_data(*args, **kwargs):
+            # Вычисляющий поток ждёт, пока к нему присоединится вся толпа
+            self.assertTrue(joined.wait(10))
+            return real_license_data(*args, **kwargs)
+
+        def request():
+            response = views.licenses_all_json(factory.get(reverse('licenses_all_json'), {'geometry': '1'}))
+            self.assertEqual(response.status_code, 200)
+            return response.content
+
+        load = {}
+        with mock.patch('licenses.views.license_data', side_effect=held_license_data) as serialized, \
+                mock.patch.object(coalescing, '_Flight', Flight):
+            for size in self.HERDS:
+                # Каждая толпа - на новой версии данных
+                bump_data_version()
+                serialized.reset_mock()
+                waiters.clear()
+                expected_waiters[0] = size - 1
+                joined.clear()
+                if size == 1:
+                    joined.set()
+                results, load[size] = self.run_herd(size, request)
+                self.assertEqual(len(set(results)), 1)
+                self.assertEqual(len(json.loads(results[0])), 3)
+                self.assertEqual(serialized.call_count, 3, size)
+        # Статусы + выборка лицензий, сколько бы пользователей ни пришло
+        self.assertEqual(load, {size: load[1] for size in self.HERDS})
+        self.assertLessEqual(load[1], 2)
+
+    def test_workers_share_result_through_cache(self):
+        # Воркеры разных процессов: минуем объединение внутри процесса
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return b'payload'
+
+        results, _ = self.run_herd(6, lambda: coalescing._shared('herd', compute, timeout=5))
+        self.assertEqual(results, [b'payload'] * 6)
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(cache.get(coalescing.KEY_PREFIX + 'herd:lock'))
+
+    def test_file_cache_coalesces_within_process_only(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+        with override_settings(CACHES=file_cache), mock.patch.object(coalescing, '_shared') as shared:
+            self.assertEqual(coalescing.single_flight('file', lambda: b'payload'), b'payload')
+        shared.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LicenseBatchTests(MediaRootMixin, QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='password')
+        self.licenses = [make_license(f'МАГ {i:05d} БЭ') for i in range(1, 6)]
+        for license_obj in self.licenses[:3]:
+            Document.objects.create(
+                license=license_obj, title=f'Документ {license_obj.pk}',
+                file=ContentFile(b'data', name='doc.txt'), uploaded_by=self.user)
+
+    def get(self, ids, **params):
+        return self.client.get(reverse('licenses_batch'), {'ids': ids, **params})
+
+    def test_details_in_two_queries(self):
+        ids = [self.licenses[4].pk, self.licenses[0].pk, 999999, self.licenses[0].pk]
+        response = self.assertQueryBudget(2, self.get, ','.join(map(str, ids)))
+        data = response.json()
+        self.assertEqual([item['id'] for item in data['licenses']], [self.licenses[4].pk, self.licenses[0].pk])
+        self.assertEqual(data['missing'], [999999])
+        self.assertEqual(data['licenses'][0]['documents'], [])
+        self.assertEqual(data['licenses'][1]['documents'][0]['title'], f'Документ {self.licenses[0].pk}')
+        self.assertNotIn('polygon_data', data['licenses'][0])
+        # Детали те же, что у /api/licenses/<id>/
+        detail = self.client.get(reverse('license_detail', args=[self.licenses[0].pk])).json()
+        with_geometry = self.get(str(self.licenses[0].pk), geometry='1').json()['licenses'][0]
+        self.assertEqual(with_geometry, detail)
+
+    def test_expired_status_updated(self):
+        overdue = make_license('МАГ 00099 БЭ', expiry_date=date.today() - timedelta(days=1))
+        data = self.get(f'{overdue.pk},{self.licenses[0].pk}').json()
+        self.assertEqual([item['status'] for item in data['licenses']], ['expired', 'active'])
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.status, 'expired')
+
+    def test_invalid_ids(self):
+        for ids in ('', 'abc', ','.join(str(i) for i in range(1, views.MAX_BATCH_IDS + 2))):
+            with self.subTest(ids=ids[:20]):
+                self.assertEqual(self.get(ids).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ColumnarRegistryTests(TestCase):
+
+    def setUp(self):
+        forget_data_version()
+        registry_columns.reset()
+        self.magadan = square_license('МАГ 00001 БЭ', 150.0, 59.0)
+        self.chukotka = square_license('МАГ 00002 БЭ', 179.5, 65.0)
+        self.point_only = make_license(
+            'ИРК 00001 ТП', polygon_data=None, latitude=52.3, longitude=104.3, owner='АО «Сибирь»',
+            region='Иркутская область', license_type='ТП', mineral_type='Золото', status='suspended')
+        self.no_location = make_license(
+            'КЕМ 00001 БР', polygon_data=None, latitude=0, longitude=None, area_km2=12.5,
+            region='Кемеровская область', mineral_type='Уголь', expiry_date=date(2040, 1, 1))
+
+    def get(self, name='licenses_json', **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_rows_match_orm(self):
+        rows = self.get(page_size=100)['results']
+        self.assertEqual(rows, [views.license_data(license) for license in License.objects.all()])
+        no_location = next(row for row in rows if row['id'] == self.no_location.id)
+        self.assertEqual((no_location['latitude'], no_location['area_km2']), (None, 12.5))
+
+        rows = self.get(page_size=100, geometry=1)['results']
+        self.assertEqual(rows, [views.license_data(license, True) for license in License.objects.all()])
+
+    def test_filters_match_orm(self):
+        cases = [
+            ({'status': 'suspended'}, License.objects.filter(status='suspended')),
+            ({'region': 'Магаданская область', 'type': 'БЭ'},
+             License.objects.filter(region='Магаданская область', license_type='БЭ')),
+            ({'mineral': 'Уголь'}, License.objects.filter(mineral_type='Уголь')),
+            ({'status': 'нет такого'}, License.objects.none()),
+            # Без учёта регистра и для кириллицы (icontains в SQLite учитывает регистр не-ASCII)
+            ({'search': 'сибирь'}, License.objects.filter(owner='АО «Сибирь»')),
+            ({'search': '0000'}, License.objects.filter(license_number__icontains='0000')),
+            ({'bbox': '80,50,155,60'}, License.objects.in_bbox(80, 50, 155, 60)),
+            ({'bbox': '179,64,-179,66'}, License.objects.in_bbox(179, 64, -179, 66)),
+        ]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                data = self.get(page_size=100, **params)
+                self.assertEqual([row['id'] for row in data['results']], list(expected.values_list('id', flat=True)))
+                self.assertEqual(data['pagination']['total_count'], expected.count())
+
+    def test_pagination(self):
+        data = self.get(page_size=3, page=2)
+        self.assertEqual(data['pagination'], {
+            'current_page': 2, 'total_pages': 2, 'total_count': 4, 'has_next': False,
+            'has_previous': True, 'next_page': None, 'previous_page': 1,
+        })
+        self.assertEqual([row['id'] for row in data['results']], [self.magadan.id])
+        # Как у Paginator: неверная страница - первая, слишком большая - последняя
+        self.assertEqual(self.get(page_size=3, page='x')['pagination']['current_page'], 1)
+        self.assertEqual(self.get(page_size=3, page=9)['pagination']['current_page'], 2)
+
+    def test_stats(self):
+        registry = [views.license_data(license) for license in License.objects.all()]
+        self.assertEqual(self.get('licenses_stats'), json.loads(json.dumps(snapshots.registry_stats(registry))))
+        data = self.get('licenses_stats', region='Магаданская область')
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['status'], {'active': 2})
+        self.assertEqual(self.client.get(reverse('licenses_stats'), {'bbox': '1,2'}).status_code, 400)
+
+    def test_no_queries_until_version_changes(self):
+        self.get()
+        with self.assertNumQueries(0):
+            self.get(status='active')
+            self.get('licenses_stats', search='маг')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chukotka.delete()
+        self.assertEqual(self.get('licenses_stats')['total'], 3)
+
+    def test_overdue_expired_once(self):
+        overdue = make_license('МАГ 00099 БЭ', polygon_data=None, expiry_date=date.today() - timedelta(days=1))
+        self.assertEqual(self.get('licenses_stats', status='expired')['total'], 1)
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.status, 'expired')
+        with self.assertNumQueries(0):
+            self.get()
 
-# Create your tests here.
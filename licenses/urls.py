@@ -7,6 +7,13 @@ urlpatterns = [
     path('help/', views.help_page, name='help'),
     path('api/licenses/', views.licenses_json, name='licenses_json'),
     path('api/licenses/all/', views.licenses_all_json, name='licenses_all_json'),
+    path('api/licenses/version/', views.licenses_version, name='licenses_version'),
+    path('api/licenses/batch/', views.licenses_batch, name='licenses_batch'),
+    path('api/licenses/stats/', views.licenses_stats, name='licenses_stats'),
+    path('api/licenses/at/', views.licenses_at_point, name='licenses_at_point'),
+    path('api/licenses/within/', views.licenses_within_radius, name='licenses_within_radius'),
+    path('api/licenses/nearest/', views.licenses_nearest, name='licenses_nearest'),
+    path('api/licenses/clusters/', views.licenses_clusters, name='licenses_clusters'),
     path('api/licenses/<int:license_id>/', views.license_detail, name='license_detail'),
     path('api/licenses/<int:license_id>/upload/', views.upload_document, name='upload_document'),
     path('api/licenses/export/excel/', views.export_licenses_excel, name='export_licenses_excel'),
@@ -1,7 +1,19 @@
+import hashlib
 import json
 import re
 from datetime import date, datetime
-from licenses.models import License
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from licenses.models import License, LicensePolygon
+from licenses import geometry as geo
+from licenses.profiling import stage
+from licenses.versioning import registry_changed
+
+# Объектов в одной транзакции импорта
+IMPORT_BATCH_SIZE = 500
+
+# Сколько сообщений об ошибках хранить в ImportRun
+MAX_RUN_ERRORS = 1000
 
 
 class GeoJSONImporter:
@@ -9,55 +21,291 @@ class GeoJSONImporter:
     Утилита для импорта лицензий из GeoJSON файлов
     """
 
-    def __init__(self):
+    def __init__(self, check_overlaps=False, profile=None):
+        """
+        Args:
+            check_overlaps: после импорта искать пересечения контуров
+                созданных и обновлённых лицензий с остальным реестром
+            profile: licenses.profiling.ImportProfile - замерять этапы импорта
+        """
         self.imported_count = 0
         self.skipped_count = 0
         self.updated_count = 0
+        # Лицензии, все полигоны которых уже были загружены ранее
+        self.unchanged_count = 0
         self.errors = []
+        self.check_overlaps = check_overlaps
+        self.precision = settings.GEOMETRY_PRECISION
+        self.profile = profile
+        # Созданные и обновлённые лицензии (для проверки пересечений)
+        self.touched_ids = set()
 
-    def import_from_file(self, file_content):
+    def import_from_file(self, file_content, run=None):
         """
         Импортирует лицензии из GeoJSON файла
         
         Args:
             file_content: содержимое GeoJSON файла (строка или dict)
+            run: ImportRun - обрабатывать пачками с контрольными точками,
+                начиная с run.next_index
         
         Returns:
             dict с результатами импорта
         """
         # Парсим JSON, если передана строка
         if isinstance(file_content, str):
-            data = json.loads(file_content)
+            with stage(self.profile, 'json'):
+                data = json.loads(file_content)
         else:
             data = file_content
 
         features = data.get('features', [])
+        if self.profile is not None:
+            self.profile.features += len(features)
+
+        # Лицензии, объекты которых не изменились с прошлого импорта,
+        # пропускаются без обращения к базе
+        entries, license_hashes = self.plan(features)
+        stored = self.stored_hashes(license_hashes)
+        failed = set()
+
+        # Объекты одной лицензии идут подряд (порядок внутри лицензии
+        # сохраняется) и всегда попадают в одну пачку. Лицензия фиксируется
+        # целиком, а параллельные импорты блокируют строки лицензий в одном
+        # и том же порядке - по номеру, что исключает взаимные блокировки
+        entries.sort(key=lambda entry: entry[1]['license_number'] if entry[1] else '')
+
+        start = 0
+        batch_size = IMPORT_BATCH_SIZE
+        if run is not None:
+            start = run.next_index
+            batch_size = run.batch_size
+            self.imported_count = run.imported
+            self.updated_count = run.updated
+            self.unchanged_count = run.unchanged
+            self.skipped_count = run.skipped
+            self.errors = list(run.errors)
+
+        for batch_start, batch_end in self.batches(entries, start, batch_size):
+            batch_numbers = set()
+            with transaction.atomic():
+                for feature, parsed in entries[batch_start:batch_end]:
+                    number = parsed['license_number'] if parsed else None
+                    if number and stored.get(number) == license_hashes[number]:
+                        self.unchanged_count += 1
+                        continue
+                    # Сведения лицензии обновляются, только если её источник
+                    # изменился с прошлого импорта, и только по первому её объекту:
+                    # объекты одной лицензии с разными описаниями не перезаписывают
+                    # друг друга
+                    refresh_fields = bool(stored.get(number)) and number not in batch_numbers
+                    batch_numbers.add(number)
+                    try:
+                        # Точка сохранения: ошибка в одном объекте не прерывает транзакцию пачки
+                        with transaction.atomic(), stage(self.profile, 'orm'):
+                            self._process_feature(feature, parsed, refresh_fields=refresh_fields)
+                    except Exception as e:
+                        self.errors.append(f'Ошибка обработки объекта: {str(e)}')
+                        self.skipped_count += 1
+                        failed.add(number)
+
+                self.save_source_hashes({
+                    number: license_hashes[number]
+                    for number in batch_numbers - failed if number
+                })
+                if batch_numbers - failed:
+                    # Одно увеличение версии данных на пачку, а не на каждый объект
+                    registry_changed()
+                if run is not None:
+                    self.checkpoint(run, batch_end)
 
-        for feature in features:
-            try:
-                self._process_feature(feature)
-            except Exception as e:
-                self.errors.append(f'Ошибка обработки объекта: {str(e)}')
-                self.skipped_count += 1
-
-        return {
+        result = {
             'imported': self.imported_count,
             'updated': self.updated_count,
+            'unchanged': self.unchanged_count,
             'skipped': self.skipped_count,
             'total':
-            self.imported_count + self.updated_count + self.skipped_count,
+            self.imported_count + self.updated_count + self.unchanged_count + self.skipped_count,
             'errors': self.errors
         }
+        if self.check_overlaps:
+            result['overlaps'] = self.find_overlaps()
+        return result
+
+    @staticmethod
+    def batches(entries, start, batch_size):
+        """
+        Границы пачек (start, end) по отсортированным объектам: пачка
+        продлевается до конца группы объектов текущей лицензии
+        """
+        def number(index):
+            parsed = entries[index][1]
+            return parsed['license_number'] if parsed else ''
+
+        batch_start = start
+        while batch_start < len(entries):
+            batch_end = min(batch_start + batch_size, len(entries))
+            while batch_end < len(entries) and number(batch_end) and number(batch_end) == number(batch_end - 1):
+                batch_end += 1
+            yield batch_start, batch_end
+            batch_start = batch_end
+
+    def checkpoint(self, run, next_index):
+        """Сохраняет прогресс импорта в той же транзакции, что и пачку"""
+        run.next_index = next_index
+        run.imported = self.imported_count
+        run.updated = self.updated_count
+        run.unchanged = self.unchanged_count
+        run.skipped = self.skipped_count
+        run.errors = self.errors[:MAX_RUN_ERRORS]
+        run.save()
+
+    def plan(self, features):
+        """
+        Разбирает описания и считает хеши содержимого
+
+        Хеш объекта строится по нормализованным описанию, цвету и хешам
+        полигонов (порядок полигонов не важен); хеш лицензии - по
+        отсортированным хешам всех её объектов в файле.
+
+        Returns:
+            (список (feature, parsed), dict номер лицензии -> хеш)
+        """
+        entries = []
+        feature_hashes = {}
+        for feature in features:
+            try:
+                properties = feature.get('properties') or {}
+                description = properties.get('description', '')
+                with stage(self.profile, 'parse_description'):
+                    parsed = self.parse_description(description)
+                number = parsed['license_number']
+                if number:
+                    with stage(self.profile, 'hashing'):
+                        canonical = json.dumps({
+                            'description': ' '.join(description.replace('<br/>', '\n').split()),
+                            'fill': str(properties.get('fill', '')).lower(),
+                            'polygons': sorted(
+                                geo.polygon_hash(polygon) for polygon in geo.iter_polygons(feature.get('geometry'))
+                            ),
+                        }, ensure_ascii=False, sort_keys=True)
+                        feature_hashes.setdefault(number, []).append(
+                            hashlib.sha256(canonical.encode()).hexdigest())
+            except Exception:
+                # Ошибку сообщит _process_feature
+                parsed = None
+            entries.append((feature, parsed))
+
+        license_hashes = {
+            number: hashlib.sha256(''.join(sorted(hashes)).encode()).hexdigest()
+            for number, hashes in feature_hashes.items()
+        }
+        return entries, license_hashes
+
+    def stored_hashes(self, numbers, chunk_size=500):
+        """Сохранённые хеши источника для номеров лицензий (пачками)"""
+        numbers = list(numbers)
+        stored = {}
+        for start in range(0, len(numbers), chunk_size):
+            stored.update(License.objects.filter(
+                license_number__in=numbers[start:start + chunk_size],
+            ).values_list('license_number', 'source_hash'))
+        return stored
+
+    def save_source_hashes(self, hashes, chunk_size=500):
+        """Запоминает хеши источника загруженных лицензий"""
+        numbers = list(hashes)
+        for start in range(0, len(numbers), chunk_size):
+            ids = License.objects.filter(
+                license_number__in=numbers[start:start + chunk_size],
+            ).values_list('id', 'license_number')
+            License.objects.bulk_update(
+                [License(id=license_id, source_hash=hashes[number]) for license_id, number in ids],
+                ['source_hash'],
+            )
+
+    def diff(self, file_content):
+        """
+        Сравнивает файл с реестром без записи в базу
+
+        Удалёнными считаются лицензии тех же регионов (префиксов номера),
+        что встречаются в файле, которых в файле нет.
+
+        Returns:
+            dict со списками номеров new, changed, unchanged, removed,
+            количеством объектов без номера (skipped) и всего (total)
+        """
+        if isinstance(file_content, str):
+            data = json.loads(file_content)
+        else:
+            data = file_content
+
+        features = data.get('features', [])
+        entries, license_hashes = self.plan(features)
+        stored = self.stored_hashes(license_hashes)
+
+        result = {'new': [], 'changed': [], 'unchanged': [], 'removed': []}
+        for number, value in sorted(license_hashes.items()):
+            if number not in stored:
+                result['new'].append(number)
+            elif stored[number] == value:
+                result['unchanged'].append(number)
+            else:
+                result['changed'].append(number)
 
-    def _process_feature(self, feature):
-        """Обрабатывает один объект из GeoJSON"""
+        prefixes = {number[:3] for number in license_hashes}
+        for prefix in sorted(prefixes):
+            for number in License.objects.filter(license_number__startswith=prefix).values_list(
+                    'license_number', flat=True).order_by('license_number'):
+                if number not in license_hashes:
+                    result['removed'].append(number)
+
+        result['skipped'] = sum(1 for feature, parsed in entries if not parsed or not parsed['license_number'])
+        result['total'] = len(features)
+        return result
+
+    def find_overlaps(self):
+        """
+        Ищет пересечения затронутых импортом лицензий с реестром и сохраняет их
+
+        Returns:
+            список словарей license_a, license_b, area_km2 (по убыванию площади)
+        """
+        from licenses.overlaps import detect_overlaps, save_overlaps
+
+        if not self.touched_ids:
+            return []
+        overlaps = detect_overlaps(self.touched_ids)
+        save_overlaps(overlaps, self.touched_ids)
+        numbers = dict(License.objects.filter(
+            id__in={o.license_a_id for o in overlaps} | {o.license_b_id for o in overlaps},
+        ).values_list('id', 'license_number'))
+        return [
+            {
+                'license_a': numbers[overlap.license_a_id],
+                'license_b': numbers[overlap.license_b_id],
+                'area_km2': round(overlap.area_km2, 3),
+            }
+            for overlap in sorted(overlaps, key=lambda o: -o.area_km2)
+        ]
+
+    def _process_feature(self, feature, parsed=None, retry=False, refresh_fields=False):
+        """
+        Обрабатывает один объект из GeoJSON
+
+        Новая лицензия создаётся со сведениями из описания. У существующей
+        добавляются недостающие полигоны, а сведения из описания
+        обновляются, только если refresh_fields.
+        """
         geometry = feature['geometry']
         properties = feature.get('properties', {})
         description = properties.get('description', '')
         fill_color = properties.get('fill', '')
 
         # Парсим описание
-        parsed = self.parse_description(description)
+        if parsed is None:
+            with stage(self.profile, 'parse_description'):
+                parsed = self.parse_description(description)
 
         if not parsed['license_number']:
             self.errors.append(
@@ -68,67 +316,180 @@ class GeoJSONImporter:
         # Определяем статус по цвету
         status = self.get_status_from_color(fill_color, description)
 
-        # Вычисляем центр полигона
-        center = self.calculate_polygon_center(geometry['coordinates'],
-                                               geometry.get('type', 'Polygon'))
+        # Полигоны объекта с хешами; повторы внутри объекта отбрасываются
+        with stage(self.profile, 'geometry'):
+            parts = self.split_polygons(geometry)
 
         # Определяем регион по префиксу номера лицензии
         region = self.extract_region(parsed['license_number'])
 
+        # Поля лицензии из описания
+        fields = self.license_fields(parsed, description, status)
+
         # Проверяем, существует ли лицензия
         try:
-            license_obj = License.objects.get(license_number=parsed['license_number'])
-            # Лицензия существует - объединяем полигоны
-            merged_geometry = self.merge_polygons(license_obj.polygon_data, geometry)
-            license_obj.polygon_data = merged_geometry
-            
-            # Пересчитываем центр для нового объединённого полигона
-            new_center = self.calculate_polygon_center(
-                merged_geometry['coordinates'],
-                merged_geometry.get('type', 'Polygon')
-            )
-            if new_center:
-                license_obj.latitude = new_center[1]
-                license_obj.longitude = new_center[0]
-            
-            license_obj.save()
-            self.updated_count += 1
+            # Строка блокируется до конца транзакции пачки: параллельный импорт
+            # той же лицензии дождётся её и прочитает уже дополненный контур.
+            # Контур загружается, только если действительно нужно его дополнить
+            license_obj = License.objects.select_for_update().defer('polygon_data').get(
+                license_number=parsed['license_number'])
+            # Лицензия существует - добавляем только полигоны, которых у неё ещё нет
+            known = set(license_obj.polygons.values_list('content_hash', flat=True))
+            new_parts = [part for part in parts if part.content_hash not in known and part.raw_hash not in known]
+
+            # Обновляем сведения, изменившиеся в источнике; отсутствующие
+            # в описании даты и ископаемое не затираются. Статус импорт не
+            # меняет: его могли задать вручную, а истечение срока отмечает
+            # LicenseQuerySet.expire_overdue
+            changed_fields = []
+            if refresh_fields:
+                changed_fields = [
+                    name for name, value in fields.items()
+                    if name != 'status' and value is not None and getattr(license_obj, name) != value
+                ]
+            if not new_parts and not changed_fields:
+                self.unchanged_count += 1
+                return
+            for name in changed_fields:
+                setattr(license_obj, name, fields[name])
+
+            if new_parts:
+                # Отложенный контур загружается до замера слияния
+                existing_geometry = license_obj.polygon_data
+                with stage(self.profile, 'merge'):
+                    existing_stats = license_obj.geometry_stats()
+                    if existing_stats is None:
+                        existing_stats = geo.measure(existing_geometry)
+                    new_geometry = {'type': 'MultiPolygon', 'coordinates': [part.coordinates for part in new_parts]}
+                    merged_geometry = self.merge_polygons(existing_geometry, new_geometry)
+                    license_obj.polygon_data = merged_geometry
+                    
+                    # Центр объединённого полигона - средневзвешенный по площади,
+                    # без повторного обхода всех вершин
+                    merged_stats = existing_stats
+                    for part in new_parts:
+                        merged_stats = geo.combine(merged_stats, part.stats)
+                    if merged_stats:
+                        license_obj.apply_geometry_stats(merged_stats)
+                
+                license_obj.save()
+                self.save_polygons(license_obj, new_parts, start=len(known))
+            else:
+                license_obj.save(update_fields=changed_fields + ['updated_at'])
+            # Лицензия считается один раз, сколько бы её объектов ни было
+            # в файле; созданная этим же импортом уже посчитана в imported_count
+            if license_obj.id not in self.touched_ids:
+                self.updated_count += 1
+            self.touched_ids.add(license_obj.id)
         except License.DoesNotExist:
-            # Парсим даты из строк в date объекты
-            issue_date_obj = date.today()  # По умолчанию - сегодня
-            if parsed['issue_date']:
-                try:
-                    issue_date_obj = datetime.strptime(parsed['issue_date'], '%d.%m.%Y').date()
-                except ValueError:
-                    pass  # Оставляем значение по умолчанию
-
-            expiry_date_obj = None
-            if parsed['expiry_date']:
-                try:
-                    expiry_date_obj = datetime.strptime(parsed['expiry_date'], '%d.%m.%Y').date()
-                except ValueError:
-                    pass
-
-            # Вид полезного ископаемого - используем из описания или значение по умолчанию
-            mineral_type_str = parsed['mineral_type'] if parsed['mineral_type'] else 'Не указано'
-
-            # Создаём новую лицензию
-            license_obj = License.objects.create(
+            # В контур попадают очищенные полигоны без повторов
+            if parts:
+                geometry = self.assemble_geometry(geometry, parts)
+
+            # Создаём новую лицензию; без даты выдачи в описании - сегодня,
+            # без вида полезного ископаемого - значение по умолчанию
+            if fields['issue_date'] is None:
+                fields['issue_date'] = date.today()
+            if fields['mineral_type'] is None:
+                fields['mineral_type'] = 'Не указано'
+            license_obj = License(
                 license_number=parsed['license_number'],
-                license_type=parsed['license_type'],
-                owner=parsed['owner'],
-                latitude=center[1] if center else None,
-                longitude=center[0] if center else None,
                 polygon_data=geometry,
                 region=region,
-                area=parsed['area_name'],
-                issue_date=issue_date_obj,
-                expiry_date=expiry_date_obj,
-                mineral_type=mineral_type_str,
-                status=status,
-                description=description.replace('<br/>', '\n'),
+                **fields,
             )
+            stats = None
+            for part in parts:
+                stats = geo.combine(stats, part.stats)
+            license_obj.apply_geometry_stats(stats)
+            try:
+                with transaction.atomic():
+                    license_obj.save(force_insert=True)
+            except IntegrityError:
+                # Лицензию с этим номером только что создал параллельный
+                # импорт - обрабатываем объект как дополнение к ней
+                if retry:
+                    raise
+                return self._process_feature(feature, parsed, retry=True, refresh_fields=refresh_fields)
+            self.save_polygons(license_obj, parts)
             self.imported_count += 1
+            self.touched_ids.add(license_obj.id)
+
+    def license_fields(self, parsed, description, status):
+        """
+        Значения полей лицензии из разобранного описания
+
+        Даты и вид полезного ископаемого равны None, если их нет в описании.
+        Лицензия с истёкшим сроком остаётся истёкшей, даже если цвет на
+        карте не менялся (как в LicenseQuerySet.expire_overdue).
+        """
+        # Парсим даты из строк в date объекты
+        issue_date_obj = None
+        if parsed['issue_date']:
+            try:
+                issue_date_obj = datetime.strptime(parsed['issue_date'], '%d.%m.%Y').date()
+            except ValueError:
+                pass
+
+        expiry_date_obj = None
+        if parsed['expiry_date']:
+            try:
+                expiry_date_obj = datetime.strptime(parsed['expiry_date'], '%d.%m.%Y').date()
+            except ValueError:
+                pass
+
+        if status == 'active' and expiry_date_obj and expiry_date_obj < date.today():
+            status = 'expired'
+
+        return {
+            'license_type': parsed['license_type'],
+            'owner': parsed['owner'],
+            'area': parsed['area_name'],
+            'issue_date': issue_date_obj,
+            'expiry_date': expiry_date_obj,
+            'mineral_type': parsed['mineral_type'] or None,
+            'status': status,
+            'description': description.replace('<br/>', '\n'),
+        }
+
+    def split_polygons(self, geometry):
+        """
+        Разбивает геометрию на несохранённые LicensePolygon с хешами и
+        характеристиками (атрибут stats - результат geo.measure полигона)
+
+        Полигоны очищаются (geo.clean_polygon с точностью
+        settings.GEOMETRY_PRECISION), пустые отбрасываются. Атрибут raw_hash -
+        хеш полигона до очистки: по нему распознаются полигоны, загруженные
+        до появления очистки и ещё не сжатые командой compact_geometry.
+        """
+        parts = []
+        seen = set()
+        for polygon in geo.iter_polygons(geometry):
+            cleaned = geo.clean_polygon(polygon, self.precision)
+            if not cleaned:
+                continue
+            stats = geo.measure({'type': 'Polygon', 'coordinates': cleaned})
+            part = LicensePolygon.build(cleaned, stats)
+            if part.content_hash in seen:
+                continue
+            seen.add(part.content_hash)
+            part.stats = stats
+            part.raw_hash = geo.polygon_hash(polygon)
+            parts.append(part)
+        return parts
+
+    def assemble_geometry(self, geometry, parts):
+        """Контур из полигонов split_polygons; Polygon из одного полигона остаётся Polygon"""
+        if geometry.get('type') == 'Polygon' and len(parts) == 1:
+            return {'type': 'Polygon', 'coordinates': parts[0].coordinates}
+        return {'type': 'MultiPolygon', 'coordinates': [part.coordinates for part in parts]}
+
+    def save_polygons(self, license_obj, parts, start=0):
+        """Сохраняет полигоны лицензии, продолжая нумерацию с start"""
+        for position, part in enumerate(parts, start):
+            part.license = license_obj
+            part.position = position
+        LicensePolygon.objects.bulk_create(parts)
 
     def parse_description(self, description):
         """Парсит описание лицензии"""
@@ -279,36 +640,14 @@ class GeoJSONImporter:
 
     def calculate_polygon_center(self, coordinates, geom_type='Polygon'):
         """
-        Вычисляет центр полигона или мультиполигона
-        Для MultiPolygon учитывает все полигоны
+        Вычисляет центр масс полигона или мультиполигона
+        Для MultiPolygon - средневзвешенный по площади центр всех полигонов
         """
         if not coordinates or len(coordinates) == 0:
             return None
 
-        all_points = []
-        
-        if geom_type == 'MultiPolygon':
-            # Для MultiPolygon собираем точки из всех полигонов
-            for polygon_coords in coordinates:
-                if polygon_coords and len(polygon_coords) > 0:
-                    # Берём внешний контур каждого полигона
-                    outer_ring = polygon_coords[0]
-                    if outer_ring and len(outer_ring) > 0:
-                        all_points.extend(outer_ring)
-        else:
-            # Для Polygon берём внешний контур
-            outer_ring = coordinates[0]
-            if outer_ring and len(outer_ring) > 0:
-                all_points.extend(outer_ring)
-
-        if not all_points:
-            return None
-
-        lon_sum = sum(coord[0] for coord in all_points)
-        lat_sum = sum(coord[1] for coord in all_points)
-        count = len(all_points)
-
-        return [lon_sum / count, lat_sum / count]
+        stats = geo.measure({'type': geom_type, 'coordinates': coordinates})
+        return stats['center'] if stats else None
 
     def merge_polygons(self, existing_geometry, new_geometry):
         """
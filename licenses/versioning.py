@@ -0,0 +1,98 @@
+"""
+Версия данных реестра.
+
+Номер версии увеличивается при каждом изменении лицензий (сигналы
+post_save/post_delete, массовые операции). По нему процессы узнают, что
+их внутренние индексы и снимки устарели.
+
+Счётчик хранится в базе (модель DataVersion) и увеличивается атомарным
+UPDATE value = value + 1: одновременные изменения в разных воркерах
+получают разные номера, и два разных состояния данных никогда не делят
+одну версию. Инкремент в кеше Django для этого не годится - у файлового
+кеша incr - это чтение и запись без блокировки. Для чтения версия
+копируется в общий кеш, поэтому горячие запросы не обращаются к базе.
+
+Вместе с увеличением счётчика, под той же блокировкой его строки,
+изменённые лицензии (License.change_seq пуст) и записи журнала удалений
+получают новый номер.
+Номера проставляются в порядке версий, поэтому «изменения после версии N»
+- это лицензии с change_seq > N или ещё без номера, независимо от того,
+когда зафиксировалась транзакция с изменением (отметка updated_at
+ставится до фиксации и для этого не годится).
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+DATA_VERSION_KEY = 'licenses:data_version'
+
+
+def get_data_version():
+    """Текущая версия данных реестра"""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        from licenses.models import DataVersion
+
+        # Кеш очищен или ещё не заполнен: берём версию из базы. add не
+        # затирает версию, которую успел записать bump_data_version
+        version = DataVersion.objects.values_list('value', flat=True).filter(pk=1).first()
+        if version is None:
+            return bump_data_version()
+        cache.add(DATA_VERSION_KEY, version, None)
+        version = cache.get(DATA_VERSION_KEY, version)
+    return version
+
+
+def bump_data_version():
+    """Отмечает изменение реестра и возвращает новую версию"""
+    from licenses.models import DataVersion, License, LicenseDeletion
+
+    with transaction.atomic():
+        if not DataVersion.objects.filter(pk=1).update(value=F('value') + 1):
+            # Строку создаёт миграция; после очистки таблицы (тесты) создаём заново
+            DataVersion.objects.get_or_create(pk=1, defaults={'value': int(time.time() * 1000)})
+            DataVersion.objects.filter(pk=1).update(value=F('value') + 1)
+        version = DataVersion.objects.values_list('value', flat=True).get(pk=1)
+        License.objects.filter(change_seq__isnull=True).update(change_seq=version)
+        LicenseDeletion.objects.filter(change_seq__isnull=True).update(change_seq=version)
+    # Номера уникальны: даже если запись в кеш от параллельного изменения
+    # придёт позже и вернёт меньший номер, он отличается от всех прочитанных
+    cache.set(DATA_VERSION_KEY, version, None)
+    return version
+
+
+class PendingBump:
+    """
+    Увеличение версии после фиксации транзакции, общее для всех изменений
+    в ней: каждое изменение регистрирует его в on_commit, но версия
+    увеличивается только при первом вызове
+    """
+
+    def __init__(self):
+        self.done = False
+
+    def __call__(self):
+        if not self.done:
+            self.done = True
+            bump_data_version()
+
+
+def registry_changed():
+    """
+    Отмечает изменение реестра: сохранение и удаление лицензий (сигналы
+    модели), массовые update и bulk_update. Версия увеличивается после
+    фиксации транзакции, чтобы другие процессы не прочитали её раньше
+    самих данных, и один раз на транзакцию, сколько бы лицензий в ней ни
+    изменилось.
+
+    Отложенное увеличение хранится в соединении. Если транзакция
+    откатывается, Django отбрасывает её обработчики on_commit, а
+    невыполненное увеличение достаётся следующей транзакции.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(connection, 'licenses_pending_bump', None)
+    if pending is None or pending.done:
+        pending = connection.licenses_pending_bump = PendingBump()
+    transaction.on_commit(pending)
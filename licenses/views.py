@@ -6,12 +6,19 @@ from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import FileSystemStorage
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.serializers.json import DjangoJSONEncoder
 from .models import License, Document
+from . import perf
+from .coalescing import request_key, single_flight
+from .archives import archive_errors, is_archive, load_archive
+from .spreadsheets import REGISTRY_COLUMNS, STATUS_LABELS, RegistryTableImporter, is_table_file
+from .snapshots import schedule_snapshot
+from .sync import changes_since, parse_since
 import json
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from io import BytesIO
-from datetime import datetime
+from datetime import date, datetime
 
 
 def map_view(request):
@@ -19,8 +26,10 @@ def map_view(request):
     Главная страница с интерактивной картой
     """
     from django.conf import settings
+    from .clusters import MAX_CLUSTER_ZOOM
     return render(request, 'licenses/map.html', {
-        'yandex_maps_api_key': settings.YANDEX_MAPS_API_KEY
+        'yandex_maps_api_key': settings.YANDEX_MAPS_API_KEY,
+        'cluster_max_zoom': MAX_CLUSTER_ZOOM,
     })
 
 
@@ -38,18 +47,143 @@ def help_page(request):
     return render(request, 'licenses/help.html')
 
 
+def parse_bbox(value):
+    """
+    Разбирает параметр ?bbox=min_lon,min_lat,max_lon,max_lat (порядок GeoJSON)
+    
+    Долготы приводятся к диапазону [-180, 180]; если после этого
+    min_lon > max_lon, прямоугольник пересекает 180-й меридиан.
+    
+    Raises:
+        ValueError: неверный формат или координаты вне допустимого диапазона
+    """
+    import math
+    
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError(value)
+    min_lon, min_lat, max_lon, max_lat = parts
+    if not -90 <= min_lat <= max_lat <= 90:
+        raise ValueError(value)
+    if max_lon - min_lon >= 360:
+        return -180.0, min_lat, 180.0, max_lat
+    min_lon = (min_lon + 180) % 360 - 180
+    max_lon = (max_lon + 180) % 360 - 180
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def filter_by_bbox(request, licenses):
+    """
+    Применяет к выборке параметр ?bbox=, если он передан
+    
+    Raises:
+        ValueError: неверный параметр bbox
+    """
+    bbox = request.GET.get('bbox')
+    if not bbox:
+        return licenses
+    return licenses.in_bbox(*parse_bbox(bbox))
+
+
+def wants_geometry(request):
+    """Запрошены ли контуры лицензий (?geometry=1); по умолчанию списки отдаются без них"""
+    return request.GET.get('geometry', '').lower() in ('1', 'true', 'yes')
+
+
+def license_data(license, include_geometry=False):
+    """Лицензия в формате API списка лицензий (контуры - только с include_geometry)"""
+    data = {
+        'id': license.id,
+        'license_number': license.license_number,
+        'license_type': license.license_type,
+        'owner': license.owner,
+        'latitude': float(license.latitude) if license.latitude else None,
+        'longitude': float(license.longitude) if license.longitude else None,
+        'region': license.region,
+        'area': license.area,
+        'area_km2': license.area_km2,
+        'issue_date': license.issue_date.strftime('%Y-%m-%d'),
+        'expiry_date': license.expiry_date.strftime('%Y-%m-%d') if license.expiry_date else None,
+        'mineral_type': license.mineral_type,
+        'status': license.status,
+        'description': license.description,
+    }
+    if include_geometry:
+        data['polygon_data'] = license.polygon_data
+    return data
+
+
+BBOX_ERROR = 'Неверный параметр bbox. Формат: min_lon,min_lat,max_lon,max_lat'
+SINCE_ERROR = 'Неверный параметр since. Формат: next_since из прошлого ответа (версия данных)'
+
+
+def registry_filters(request):
+    """
+    Фильтры списка из параметров запроса (как в экспорте в Excel)
+    
+    Returns:
+        (filters, search, bbox): filters - {поле: значение} для status,
+        region, type, mineral; search - подстрока номера или
+        недропользователя; bbox - прямоугольник карты или None
+    
+    Raises:
+        ValueError: неверный параметр bbox
+    """
+    from .columnar import FILTER_PARAMS
+    
+    filters = {field: request.GET[param] for param, field in FILTER_PARAMS.items() if request.GET.get(param)}
+    search = request.GET.get('search', '').strip()
+    bbox = parse_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+    return filters, search, bbox
+
+
+def registry_snapshot():
+    """
+    Колоночный снимок реестра (licenses.columnar) с актуальными статусами
+    
+    UPDATE истекших лицензий выполняется, только если они есть в снимке,
+    поэтому обычный запрос не обращается к базе вовсе.
+    """
+    from .columnar import registry_columns
+    
+    columns = registry_columns.snapshot()
+    if columns.has_overdue():
+        with perf.stage('status'):
+            if License.objects.expire_overdue():
+                # Версия данных сменится после фиксации транзакции, а этот
+                # процесс должен увидеть новые статусы сразу
+                registry_columns.reset()
+        columns = registry_columns.snapshot()
+    return columns
+
+
 def licenses_json(request):
     """
     API endpoint для получения списка лицензий в формате JSON с пагинацией
+    
+    Параметр ?bbox=min_lon,min_lat,max_lon,max_lat ограничивает выборку
+    лицензиями, пересекающими видимую область карты; ?status=, ?region=,
+    ?type=, ?mineral= и ?search= - как в экспорте. Контуры (polygon_data)
+    включаются в ответ только с параметром ?geometry=1
+    
+    Список отбирается из колоночного снимка реестра в памяти процесса
+    (licenses.columnar); из базы читаются только контуры страницы.
     """
-    licenses = License.objects.all()
+    try:
+        filters, search, bbox = registry_filters(request)
+    except ValueError:
+        return JsonResponse({'error': BBOX_ERROR}, status=400)
+    
+    columns = registry_snapshot()
+    with perf.stage('filter'):
+        positions = columns.select(filters, search, bbox)
     
     # Получаем параметры пагинации
     page_number = request.GET.get('page', 1)
     page_size = int(request.GET.get('page_size', 12))
     
-    # Создаем пагинатор
-    paginator = Paginator(licenses, page_size)
+    # Создаем пагинатор по номерам строк снимка
+    paginator = Paginator(positions, page_size)
     
     try:
         page_obj = paginator.page(page_number)
@@ -58,111 +192,381 @@ def licenses_json(request):
     except EmptyPage:
         page_obj = paginator.page(paginator.num_pages)
     
-    data = []
-    for license in page_obj:
-        # Проверяем и обновляем статус, если срок истек
-        license.update_status_if_expired()
-
-        data.append({
-            'id': license.id,
-            'license_number': license.license_number,
-            'license_type': license.license_type,
-            'owner': license.owner,
-            'latitude': float(license.latitude) if license.latitude else None,
-            'longitude': float(license.longitude) if license.longitude else None,
-            'polygon_data': license.polygon_data,
-            'region': license.region,
-            'area': license.area,
-            'issue_date': license.issue_date.strftime('%Y-%m-%d'),
-            'expiry_date': license.expiry_date.strftime('%Y-%m-%d') if license.expiry_date else None,
-            'mineral_type': license.mineral_type,
-            'status': license.status,
-            'description': license.description,
-        })
+    data = columns.rows(page_obj.object_list)
+    
+    # Контуры - основная часть объёма строки, читаем их только для страницы
+    if wants_geometry(request):
+        polygons = dict(License.objects.filter(id__in=[row['id'] for row in data]).values_list('id', 'polygon_data'))
+        for row in data:
+            row['polygon_data'] = polygons.get(row['id'])
     
     # Возвращаем данные с метаинформацией о пагинации
-    return JsonResponse({
-        'results': data,
-        'pagination': {
-            'current_page': page_obj.number,
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count,
-            'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous(),
-            'next_page': page_obj.next_page_number() if page_obj.has_next() else None,
-            'previous_page': page_obj.previous_page_number() if page_obj.has_previous() else None,
-        }
-    })
+    with perf.stage('serialize'):
+        response = JsonResponse({
+            'results': data,
+            'pagination': {
+                'current_page': page_obj.number,
+                'total_pages': paginator.num_pages,
+                'total_count': paginator.count,
+                'has_next': page_obj.has_next(),
+                'has_previous': page_obj.has_previous(),
+                'next_page': page_obj.next_page_number() if page_obj.has_next() else None,
+                'previous_page': page_obj.previous_page_number() if page_obj.has_previous() else None,
+            }
+        })
+    return response
+
+
+def licenses_stats(request):
+    """
+    Сводка по реестру: всего лицензий и их число по статусам, регионам,
+    видам пользования и полезным ископаемым (формат stats снимка реестра)
+    
+    Принимает те же фильтры, что и /api/licenses/ (bbox, status, region,
+    type, mineral, search), и считается по колоночному снимку без запросов
+    к базе.
+    """
+    try:
+        filters, search, bbox = registry_filters(request)
+    except ValueError:
+        return JsonResponse({'error': BBOX_ERROR}, status=400)
+    
+    columns = registry_snapshot()
+    with perf.stage('filter'):
+        stats = columns.stats(columns.select(filters, search, bbox))
+    with perf.stage('serialize'):
+        response = JsonResponse(stats)
+    return response
 
 
 def licenses_all_json(request):
     """
     API endpoint для получения ВСЕХ лицензий без пагинации (для статистики и графиков)
+    
+    Поддерживает параметры ?bbox= и ?geometry=1 (см. licenses_json).
+    С параметром ?since= (next_since из прошлого ответа) возвращает только
+    изменения: {"licenses": [...], "deleted": [id, ...], "full": false,
+    "next_since": <версия данных>}, см. licenses.sync
+    
+    Одновременные одинаковые запросы (карта и аналитика у многих
+    пользователей сразу) вычисляются один раз, см. licenses.coalescing
     """
-    licenses = License.objects.all()
-    data = []
+    from .versioning import get_data_version
     
-    for license in licenses:
-        # Проверяем и обновляем статус, если срок истек
-        license.update_status_if_expired()
-
-        data.append({
-            'id': license.id,
-            'license_number': license.license_number,
-            'license_type': license.license_type,
-            'owner': license.owner,
-            'latitude': float(license.latitude) if license.latitude else None,
-            'longitude': float(license.longitude) if license.longitude else None,
-            'polygon_data': license.polygon_data,
-            'region': license.region,
-            'area': license.area,
-            'issue_date': license.issue_date.strftime('%Y-%m-%d'),
-            'expiry_date': license.expiry_date.strftime('%Y-%m-%d') if license.expiry_date else None,
-            'mineral_type': license.mineral_type,
-            'status': license.status,
-            'description': license.description,
-        })
+    # Только лицензии в видимой области карты
+    try:
+        licenses = filter_by_bbox(request, License.objects.all())
+    except ValueError:
+        return JsonResponse({'error': BBOX_ERROR}, status=400)
+    
+    # Отметка времени от прежней версии клиента разбирается в None (весь реестр)
+    delta = 'since' in request.GET
+    since = None
+    if delta:
+        try:
+            since = parse_since(request.GET['since'])
+        except ValueError:
+            return JsonResponse({'error': SINCE_ERROR}, status=400)
+    
+    # Контуры - основная часть объёма строки, без них не читаем их из базы
+    include_geometry = wants_geometry(request)
+    if not include_geometry:
+        licenses = licenses.defer('polygon_data')
     
-    return JsonResponse(data, safe=False)
+    def render():
+        # Обновляем статусы истекших лицензий одним запросом, а не построчно
+        with perf.stage('status'):
+            License.objects.expire_overdue()
+        
+        selected = licenses
+        changes = None
+        if delta:
+            changes = changes_since(licenses, since)
+            selected = changes['licenses']
+        
+        data = [license_data(license, include_geometry) for license in selected]
+        
+        if changes is not None:
+            data = {
+                'licenses': data,
+                'deleted': changes['deleted'],
+                'full': changes['full'],
+                'next_since': changes['next_since'],
+            }
+        
+        with perf.stage('serialize'):
+            return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+    
+    with perf.stage('coalesce'):
+        content = single_flight(request_key(request, get_data_version()), render)
+    return HttpResponse(content, content_type='application/json')
+
+
+def licenses_version(request):
+    """
+    Текущая версия данных реестра
+
+    Клиентский кеш реестра (IndexedDB) сверяет с ней свою копию и
+    запрашивает изменения (?since=) только при расхождении.
+    """
+    from .versioning import get_data_version
+
+    # Истёкшие лицензии меняют версию, как и в licenses_all_json
+    with perf.stage('status'):
+        License.objects.expire_overdue()
+    response = JsonResponse({'version': get_data_version()})
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def license_detail_data(license, include_geometry=True):
+    """Лицензия с документами в формате API детальной информации"""
+    data = license_data(license, include_geometry)
+    data['documents'] = [
+        {
+            'id': doc.id,
+            'title': doc.title,
+            'file_type': doc.file_type,
+            'file_url': doc.file.url if doc.file else None,
+            'uploaded_at': doc.uploaded_at.strftime('%Y-%m-%d %H:%M'),
+        }
+        for doc in license.documents.all()
+    ]
+    return data
 
 
 def license_detail(request, license_id):
     """
     Получение детальной информации о лицензии
     """
-    license = get_object_or_404(License, id=license_id)
+    license = get_object_or_404(License.objects.prefetch_related('documents'), id=license_id)
     # Проверяем и обновляем статус, если срок истек
-    license.update_status_if_expired()
-    documents = license.documents.all()
+    with perf.stage('status'):
+        license.update_status_if_expired()
+    
+    data = license_detail_data(license)
+    
+    with perf.stage('serialize'):
+        response = JsonResponse(data)
+    return response
+
+
+# Сколько лицензий можно запросить в /api/licenses/batch/ за раз
+MAX_BATCH_IDS = 200
+IDS_ERROR = f'Укажите идентификаторы лицензий: ?ids=1,2,3 (не более {MAX_BATCH_IDS})'
+
+
+def parse_ids(value):
+    """
+    Идентификаторы из параметра ?ids=1,2,3 без повторов, в порядке запроса
+
+    Raises:
+        ValueError: пустой список, не число или больше MAX_BATCH_IDS
+    """
+    ids = list(dict.fromkeys(int(part) for part in (value or '').split(',') if part.strip()))
+    if not ids or len(ids) > MAX_BATCH_IDS:
+        raise ValueError(value)
+    return ids
+
+
+def licenses_batch(request):
+    """
+    Детальная информация о нескольких лицензиях за один запрос
+    
+    ?ids=1,2,3 - лицензии с документами в порядке запроса (как
+    /api/licenses/<id>/), ненайденные идентификаторы - в "missing".
+    Контуры включаются только с ?geometry=1. Два запроса к базе независимо
+    от числа лицензий: лицензии и их документы; третий - только если среди
+    них есть просроченные действующие.
+    """
+    try:
+        ids = parse_ids(request.GET.get('ids'))
+    except ValueError:
+        return JsonResponse({'error': IDS_ERROR}, status=400)
+    
+    include_geometry = wants_geometry(request)
+    licenses = License.objects.filter(id__in=ids).prefetch_related('documents')
+    if not include_geometry:
+        licenses = licenses.defer('polygon_data')
+    found = {license.id: license for license in licenses}
+    
+    # Статусы просроченных - одним UPDATE только по ним, как в license_detail
+    today = date.today()
+    overdue = [
+        license for license in found.values()
+        if license.status == 'active' and license.expiry_date and license.expiry_date < today
+    ]
+    if overdue:
+        with perf.stage('status'):
+            License.objects.filter(id__in=[license.id for license in overdue]).expire_overdue()
+        for license in overdue:
+            license.status = 'expired'
     
+    data = {
+        'licenses': [license_detail_data(found[pk], include_geometry) for pk in ids if pk in found],
+        'missing': [pk for pk in ids if pk not in found],
+    }
+    
+    with perf.stage('serialize'):
+        response = JsonResponse(data)
+    return response
+
+
+def parse_point(request):
+    """
+    Координаты точки из параметров ?lon=&lat=
+    
+    Raises:
+        ValueError: параметры отсутствуют или вне допустимого диапазона
+    """
+    import math
+    
+    lon = float(request.GET.get('lon', ''))
+    lat = float(request.GET.get('lat', ''))
+    if not (math.isfinite(lon) and math.isfinite(lat) and -180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError((lon, lat))
+    return lon, lat
+
+
+def spatial_result(license, distance_km=None):
+    """Краткие сведения о лицензии для ответов пространственного API"""
     data = {
         'id': license.id,
         'license_number': license.license_number,
         'license_type': license.license_type,
         'owner': license.owner,
-        'latitude': float(license.latitude) if license.latitude else None,
-        'longitude': float(license.longitude) if license.longitude else None,
-        'polygon_data': license.polygon_data,
         'region': license.region,
-        'area': license.area,
-        'issue_date': license.issue_date.strftime('%Y-%m-%d'),
-        'expiry_date': license.expiry_date.strftime('%Y-%m-%d') if license.expiry_date else None,
-        'mineral_type': license.mineral_type,
         'status': license.status,
-        'description': license.description,
-        'documents': [
-            {
-                'id': doc.id,
-                'title': doc.title,
-                'file_type': doc.file_type,
-                'file_url': doc.file.url if doc.file else None,
-                'uploaded_at': doc.uploaded_at.strftime('%Y-%m-%d %H:%M'),
-            }
-            for doc in documents
-        ]
+        'latitude': float(license.latitude) if license.latitude else None,
+        'longitude': float(license.longitude) if license.longitude else None,
     }
+    if distance_km is not None:
+        data['distance_km'] = round(distance_km, 3)
+    return data
+
+
+POINT_ERROR = 'Укажите координаты точки: ?lon=<долгота>&lat=<широта>'
+
+# Ограничения пространственных запросов
+MAX_RADIUS_KM = 500
+MAX_NEAREST = 50
+
+
+def licenses_at_point(request):
+    """
+    Лицензии, участок которых содержит точку (?lon=&lat=)
+    """
+    from .spatial import spatial_index
+    
+    try:
+        lon, lat = parse_point(request)
+    except ValueError:
+        return JsonResponse({'error': POINT_ERROR}, status=400)
+    
+    licenses = spatial_index.at_point(lon, lat)
+    return JsonResponse({'results': [spatial_result(license, 0.0) for license in licenses]})
+
+
+def licenses_within_radius(request):
+    """
+    Лицензии не дальше radius_km от точки (?lon=&lat=&radius_km=10),
+    отсортированные по расстоянию до границы участка
+    """
+    from .spatial import spatial_index
+    
+    try:
+        lon, lat = parse_point(request)
+        radius_km = float(request.GET.get('radius_km', 10))
+        if not 0 <= radius_km <= MAX_RADIUS_KM:
+            raise ValueError(radius_km)
+    except ValueError:
+        return JsonResponse({
+            'error': f'{POINT_ERROR}&radius_km=<от 0 до {MAX_RADIUS_KM}>'
+        }, status=400)
+    
+    found = spatial_index.within_radius(lon, lat, radius_km)
+    return JsonResponse({
+        'results': [spatial_result(license, distance) for distance, license in found]
+    })
+
+
+def licenses_nearest(request):
+    """
+    Ближайшие к точке лицензии (?lon=&lat=&limit=5)
+    """
+    from .spatial import spatial_index
+    
+    try:
+        lon, lat = parse_point(request)
+        limit = int(request.GET.get('limit', 5))
+        if not 1 <= limit <= MAX_NEAREST:
+            raise ValueError(limit)
+    except ValueError:
+        return JsonResponse({
+            'error': f'{POINT_ERROR}&limit=<от 1 до {MAX_NEAREST}>'
+        }, status=400)
+    
+    found = spatial_index.nearest(lon, lat, limit)
+    return JsonResponse({
+        'results': [spatial_result(license, distance) for distance, license in found]
+    })
+
+
+MAX_ZOOM = 23
+
+
+def licenses_clusters(request):
+    """
+    Метки лицензий для масштаба карты (?zoom=5&bbox=min_lon,min_lat,max_lon,max_lat)
+    
+    До масштаба MAX_CLUSTER_ZOOM включительно лицензии объединяются в
+    кластеры с числом лицензий по статусам (см. licenses.clusters), на
+    более крупных масштабах возвращаются отдельные лицензии в прямоугольнике
+    (bbox обязателен, иначе ответом был бы весь реестр)
+    """
+    from .clusters import MAX_CLUSTER_ZOOM, cluster_index
+    
+    try:
+        zoom = int(request.GET.get('zoom', ''))
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValueError(zoom)
+    except ValueError:
+        return JsonResponse({'error': f'Укажите масштаб карты: ?zoom=<от 0 до {MAX_ZOOM}>'}, status=400)
+    try:
+        bbox = parse_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+    except ValueError:
+        return JsonResponse({'error': BBOX_ERROR}, status=400)
+    if bbox is None and zoom > MAX_CLUSTER_ZOOM:
+        return JsonResponse({
+            'error': f'На масштабах крупнее {MAX_CLUSTER_ZOOM} нужен параметр bbox=min_lon,min_lat,max_lon,max_lat'
+        }, status=400)
+    
+    # Обновляем статусы истекших лицензий одним запросом, а не построчно
+    with perf.stage('status'):
+        License.objects.expire_overdue()
     
-    return JsonResponse(data)
+    if zoom <= MAX_CLUSTER_ZOOM:
+        clusters = cluster_index.clusters(zoom, bbox)
+        with perf.stage('serialize'):
+            response = JsonResponse({
+                'zoom': zoom,
+                'clustered': True,
+                'max_cluster_zoom': MAX_CLUSTER_ZOOM,
+                'clusters': clusters,
+            })
+        return response
+    
+    licenses = License.objects.filter(latitude__isnull=False, longitude__isnull=False).in_bbox(*bbox)
+    licenses = licenses.only(
+        'id', 'license_number', 'license_type', 'owner', 'region', 'status', 'latitude', 'longitude')
+    with perf.stage('serialize'):
+        response = JsonResponse({
+            'zoom': zoom,
+            'clustered': False,
+            'max_cluster_zoom': MAX_CLUSTER_ZOOM,
+            'licenses': [spatial_result(license) for license in licenses],
+        })
+    return response
 
 
 @login_required
@@ -304,26 +708,60 @@ def upload_geojson(request):
         
         geojson_file = request.FILES['geojson_file']
         
+        # Таблицы Excel/CSV в формате выгрузки реестра
+        if is_table_file(geojson_file.name):
+            try:
+                result = RegistryTableImporter().import_file(geojson_file, geojson_file.name)
+                schedule_snapshot()
+            except Exception as e:
+                return render(request, 'licenses/upload_geojson.html', {
+                    'error': f'Ошибка при обработке файла: {str(e)}'
+                })
+            return render(request, 'licenses/upload_geojson.html', {
+                'success': f'Импорт таблицы {geojson_file.name} завершён успешно!',
+                'result': result
+            })
+        
         # Проверяем расширение файла
-        if not geojson_file.name.endswith('.geojson') and not geojson_file.name.endswith('.json'):
+        if (not geojson_file.name.endswith('.geojson') and not geojson_file.name.endswith('.json')
+                and not is_archive(geojson_file.name)):
             return render(request, 'licenses/upload_geojson.html', {
-                'error': 'Неверный формат файла. Поддерживаются только .geojson и .json файлы'
+                'error': 'Неверный формат файла. Поддерживаются .geojson, .json, .zip, .xlsx и .csv файлы'
             })
         
         try:
-            # Читаем содержимое файла
-            file_content = geojson_file.read().decode('utf-8')
+            # Читаем содержимое файла; ZIP-архив GeoJSON файлов
+            # импортируется целиком, с общим отчётом по архиву
+            members = None
+            if is_archive(geojson_file.name):
+                file_content, members = load_archive(geojson_file)
+            else:
+                file_content = geojson_file.read().decode('utf-8')
             
             # Импортируем данные
             from .utils import GeoJSONImporter
-            importer = GeoJSONImporter()
+            importer = GeoJSONImporter(check_overlaps=bool(request.POST.get('check_overlaps')))
+            
+            # Предпросмотр: только сравнение с реестром, без записи
+            if request.POST.get('dry_run'):
+                return render(request, 'licenses/upload_geojson.html', {
+                    'diff': importer.diff(file_content),
+                    'file_name': geojson_file.name,
+                    'members': members,
+                })
+            
             result = importer.import_from_file(file_content)
+            schedule_snapshot()
+            if members is not None:
+                result['members'] = members
+                result['errors'] = archive_errors(members) + result['errors']
             
             # Формируем сообщение об успехе
             success_message = f"""
                 Импорт завершён успешно!
                 Создано новых лицензий: {result['imported']}
                 Обновлено существующих: {result['updated']}
+                Без изменений: {result['unchanged']}
                 Пропущено: {result['skipped']}
                 Всего обработано: {result['total']}
             """
@@ -357,6 +795,9 @@ def export_licenses_excel(request):
     mineral_filter = request.GET.get('mineral', '')
     search_text = request.GET.get('search', '')
     
+    # Обновляем статусы истекших лицензий одним запросом перед экспортом
+    License.objects.expire_overdue()
+    
     # Начинаем с всех лицензий
     licenses = License.objects.all()
     
@@ -394,11 +835,8 @@ def export_licenses_excel(request):
     )
     
     # Заголовки столбцов
-    headers = [
-        'Номер лицензии', 'Вид пользования', 'Недропользователь', 
-        'Регион', 'Участок недр', 'Дата выдачи', 'Дата окончания',
-        'Полезное ископаемое', 'Статус', 'Широта', 'Долгота', 'Описание'
-    ]
+    # Те же столбцы читает импорт таблиц (licenses.spreadsheets)
+    headers = [header for header, field in REGISTRY_COLUMNS]
     
     ws.append(headers)
     
@@ -412,15 +850,7 @@ def export_licenses_excel(request):
     
     # Заполняем данные
     for license in licenses:
-        # Обновляем статус перед экспортом
-        license.update_status_if_expired()
-        
-        status_text = {
-            'active': 'Действующая',
-            'expired': 'Истекла',
-            'suspended': 'Приостановлена',
-            'terminated': 'Прекращена'
-        }.get(license.status, license.status)
+        status_text = STATUS_LABELS.get(license.status, license.status)
         
         row_data = [
             license.license_number,
@@ -557,6 +987,9 @@ def export_licenses_pdf(request):
     mineral_filter = request.GET.get('mineral', '')
     search_text = request.GET.get('search', '')
     
+    # Обновляем статусы истекших лицензий одним запросом перед экспортом
+    License.objects.expire_overdue()
+    
     # Начинаем с всех лицензий
     licenses = License.objects.all()
     
@@ -634,9 +1067,6 @@ def export_licenses_pdf(request):
             c.setFont(font_name, 9)
             row_num = 0
         
-        # Обновляем статус перед экспортом
-        license.update_status_if_expired()
-        
         # Статусы (всегда на русском)
         status_text = {
             'active': 'Действующая',
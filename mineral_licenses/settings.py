@@ -76,6 +76,29 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Инструментирование запросов (SQL, этапы, размер ответа, Server-Timing)
+# Отключается переменной окружения PERF_INSTRUMENTATION=false
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', 'true').lower() in ('true', '1', 'yes')
+if PERF_INSTRUMENTATION:
+    # Ставим первым, чтобы замер включал работу остальных middleware
+    MIDDLEWARE.insert(0, 'licenses.middleware.PerformanceMiddleware')
+
+# Сколько последних замеров хранить по каждому представлению
+PERF_STATS_WINDOW = int(os.getenv('PERF_STATS_WINDOW', '500'))
+# Как часто (в секундах) воркер сбрасывает накопленные замеры в кеш
+PERF_FLUSH_INTERVAL = float(os.getenv('PERF_FLUSH_INTERVAL', '5'))
+
+# Точность координат контуров при импорте (знаков после запятой;
+# 6 знаков - около 10 см), см. licenses.geometry.clean_polygon
+GEOMETRY_PRECISION = int(os.getenv('GEOMETRY_PRECISION', '6'))
+
+# Потоков для чтения файлов ZIP-архива при импорте, см. licenses.archives
+IMPORT_ARCHIVE_WORKERS = int(os.getenv('IMPORT_ARCHIVE_WORKERS', '4'))
+
+# Предел суммарного размера распакованных GeoJSON файлов архива, МБ: архив
+# целиком разбирается в память воркера, объекты Python в несколько раз больше JSON
+IMPORT_ARCHIVE_MAX_SIZE = int(os.getenv('IMPORT_ARCHIVE_MAX_SIZE_MB', '100')) * 1024 * 1024
+
 ROOT_URLCONF = 'mineral_licenses.urls'
 
 TEMPLATES = [
@@ -134,6 +157,22 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Файловый кеш общий для всех воркеров gunicorn на одном сервере.
+# Для нескольких серверов укажите CACHE_BACKEND/CACHE_LOCATION (например, Redis).
+# Объединение одинаковых запросов между воркерами (licenses.coalescing) требует
+# атомарного cache.add - Redis или Memcached; с файловым кешем оно работает
+# только внутри воркера.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -174,15 +213,58 @@ LOGIN_REDIRECT_URL = '/'
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Сборка статики для продакшена (licenses.storage): минификация скриптов
+# и стилей, хеш содержимого в именах файлов и заранее сжатые .gz/.br.
+# Требует collectstatic; по умолчанию включена при DEBUG=False
+STATIC_PIPELINE = os.getenv('STATIC_PIPELINE', str(not DEBUG)).lower() in ('true', '1', 'yes')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'licenses.storage.CompressedManifestStaticFilesStorage' if STATIC_PIPELINE
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
 # Media files
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Готовые снимки реестра для отдачи веб-сервером по адресу /snapshots/
+# (licenses.snapshots). REGISTRY_SNAPSHOTS включает их пересборку после
+# импорта, сохранений в админке и проверки статусов; по умолчанию - при DEBUG=False
+REGISTRY_SNAPSHOTS = os.getenv('REGISTRY_SNAPSHOTS', str(not DEBUG)).lower() in ('true', '1', 'yes')
+REGISTRY_SNAPSHOT_ROOT = os.getenv('REGISTRY_SNAPSHOT_ROOT', str(BASE_DIR / 'snapshots'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Logging
+# Метрики запросов пишутся в логгер 'licenses.perf' по одной JSON-строке
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'licenses.perf': {
+            'handlers': ['console'],
+            'level': os.getenv('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -25,5 +25,8 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
+    from licenses.snapshots import SNAPSHOT_URL
+
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+    urlpatterns += static(SNAPSHOT_URL, document_root=settings.REGISTRY_SNAPSHOT_ROOT)